@@ -0,0 +1,160 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from logging_config import logger
+from ohlcv import OHLCV_FIELDS, OHLCVArrays, empty_ohlcv, grid_offset_ms, timeframe_ms
+
+# Per open bar: open, high, low, close, volume, ts of the earliest trade, ts of the latest trade.
+_OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _FIRST_TS, _LAST_TS = range(7)
+
+ClosedBarCallback = Callable[[str, str, OHLCVArrays], Any]
+
+
+class TradeBarAggregator:
+    """
+    Builds OHLCV bars for every configured timeframe at once from a stream of trades.
+
+    Trades arrive in batches of NumPy arrays. A batch is sorted once (only if it is out of order),
+    then for each timeframe the per-bar first/max/min/last/sum are taken with one vectorised
+    reduceat pass, so the work per trade per timeframe is constant. Bars stay open until the
+    watermark (latest trade time minus `lateness_ms`) passes their close, which lets late and
+    out-of-order trades inside that window still land in the right bar. Trades older than an
+    already emitted bar are dropped and counted.
+    """
+
+    def __init__(self, symbol: str, timeframes: List[str], lateness_ms: int = 2_000,
+                 on_close: Optional[ClosedBarCallback] = None, fill_gaps: bool = True):
+        """
+        Args:
+            symbol (str): Symbol the trades belong to (passed through to on_close).
+            timeframes (List[str]): Timeframes built simultaneously, e.g. ['1m', '5m', '1h'].
+            lateness_ms (int): How long a bar waits past its close for late trades.
+            on_close (Optional[ClosedBarCallback]): Called with (symbol, timeframe, closed bars) per batch.
+            fill_gaps (bool): Emit flat zero-volume bars for intervals without trades, as exchanges do.
+        """
+        self.symbol = symbol
+        self.timeframes = list(timeframes)
+        self.steps = {tf: timeframe_ms(tf) for tf in self.timeframes}
+        self.offsets = {tf: grid_offset_ms(tf) for tf in self.timeframes}  # weekly bars open on Monday
+        self.lateness_ms = lateness_ms
+        self.on_close = on_close
+        self.fill_gaps = fill_gaps
+        self._open: Dict[str, Dict[int, List[float]]] = {tf: {} for tf in self.timeframes}
+        self._emitted: Dict[str, Optional[int]] = {tf: None for tf in self.timeframes}  # last closed bar index
+        self._last_close: Dict[str, Optional[float]] = {tf: None for tf in self.timeframes}
+        self.max_ts: Optional[int] = None
+        self.stats = {'trades': 0, 'late_dropped': 0, 'bars_closed': 0}
+
+    def add_trades(self, timestamp: Any, price: Any, size: Any) -> Dict[str, OHLCVArrays]:
+        """
+        Applies one batch of trades (epoch ms, price, size) and returns the bars that closed, per timeframe.
+        """
+        ts = np.asarray(timestamp, dtype=np.int64)
+        px = np.asarray(price, dtype=np.float64)
+        qty = np.asarray(size, dtype=np.float64)
+        if len(ts) == 0:
+            return {}
+        if len(ts) > 1 and (ts[1:] < ts[:-1]).any():
+            order = np.argsort(ts, kind='stable')
+            ts, px, qty = ts[order], px[order], qty[order]
+        self.stats['trades'] += len(ts)
+
+        for tf in self.timeframes:
+            self._apply(tf, ts, px, qty)
+        batch_max = int(ts[-1])
+        self.max_ts = batch_max if self.max_ts is None else max(self.max_ts, batch_max)
+        return self.advance(self.max_ts)
+
+    def _apply(self, tf: str, ts: np.ndarray, px: np.ndarray, qty: np.ndarray):
+        bucket = (ts - self.offsets[tf]) // self.steps[tf]
+        emitted = self._emitted[tf]
+        if emitted is not None and bucket[0] <= emitted:
+            keep = int(np.searchsorted(bucket, emitted, side='right'))
+            self.stats['late_dropped'] += keep
+            ts, px, qty, bucket = ts[keep:], px[keep:], qty[keep:], bucket[keep:]
+            if len(ts) == 0:
+                return
+        starts = np.concatenate(([0], np.flatnonzero(bucket[1:] != bucket[:-1]) + 1))
+        ends = np.append(starts[1:], len(ts)) - 1
+        highs = np.maximum.reduceat(px, starts)
+        lows = np.minimum.reduceat(px, starts)
+        volumes = np.add.reduceat(qty, starts)
+
+        bars = self._open[tf]
+        for i, b in enumerate(bucket[starts].tolist()):
+            s, e = starts[i], ends[i]
+            bar = bars.get(b)
+            if bar is None:
+                bars[b] = [px[s], highs[i], lows[i], px[e], volumes[i], ts[s], ts[e]]
+                continue
+            if ts[s] < bar[_FIRST_TS]:
+                bar[_OPEN], bar[_FIRST_TS] = px[s], ts[s]
+            if ts[e] >= bar[_LAST_TS]:
+                bar[_CLOSE], bar[_LAST_TS] = px[e], ts[e]
+            bar[_HIGH] = max(bar[_HIGH], highs[i])
+            bar[_LOW] = min(bar[_LOW], lows[i])
+            bar[_VOLUME] += volumes[i]
+
+    def advance(self, now_ms: int) -> Dict[str, OHLCVArrays]:
+        """
+        Closes every bar whose end is at or before `now_ms - lateness_ms`. Call it with the wall clock
+        during quiet periods so bars close even when no trades arrive.
+        """
+        watermark = now_ms - self.lateness_ms
+        closed = {}
+        for tf in self.timeframes:
+            step, offset = self.steps[tf], self.offsets[tf]
+            last_closable = (watermark - offset) // step - 1
+            bars = self._open[tf]
+            ready = sorted(b for b in bars if b <= last_closable)
+            rows = []
+            for b in ready:
+                bar = bars.pop(b)
+                rows.extend(self._flat_bars(tf, b))
+                rows.append((b * step + offset, bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE], bar[_VOLUME]))
+                self._emitted[tf] = b
+                self._last_close[tf] = bar[_CLOSE]
+            if self.fill_gaps and self._emitted[tf] is not None and self._emitted[tf] < last_closable:
+                rows.extend(self._flat_bars(tf, last_closable + 1))
+                self._emitted[tf] = last_closable
+            if not rows:
+                continue
+            columns = np.array(rows, dtype=np.float64).T
+            closed[tf] = OHLCVArrays(columns[0].astype(np.int64), *columns[1:])
+            self.stats['bars_closed'] += len(rows)
+
+        if self.on_close is not None:
+            for tf, bars in closed.items():
+                try:
+                    self.on_close(self.symbol, tf, bars)
+                except Exception as e:
+                    logger.error(f"Closed-bar callback failed for {self.symbol} {tf}: {e}", exc_info=True)
+        return closed
+
+    def _flat_bars(self, tf: str, until: int) -> List[tuple]:
+        """Zero-volume bars at the last close for the trade-less intervals before bar `until`."""
+        previous, flat = self._emitted[tf], self._last_close[tf]
+        if not self.fill_gaps or previous is None or flat is None:
+            return []
+        step, offset = self.steps[tf], self.offsets[tf]
+        return [(g * step + offset, flat, flat, flat, flat, 0.0) for g in range(previous + 1, until)]
+
+    def open_bar(self, timeframe: str) -> OHLCVArrays:
+        """The currently forming bar(s) of a timeframe (more than one only inside the lateness window)."""
+        bars = self._open[timeframe]
+        if not bars:
+            return empty_ohlcv()
+        step, offset = self.steps[timeframe], self.offsets[timeframe]
+        rows = [(b * step + offset, *bars[b][:_FIRST_TS]) for b in sorted(bars)]
+        columns = np.array(rows, dtype=np.float64).T
+        return OHLCVArrays(columns[0].astype(np.int64), *columns[1:])
+
+
+def storage_sink(db_manager: Any) -> ClosedBarCallback:
+    """on_close callback that writes closed bars to a storage backend (DatabaseManager, LocalBarStore, ...)."""
+    def write(symbol: str, timeframe: str, bars: OHLCVArrays):
+        import pandas as pd
+        df = pd.DataFrame({f: getattr(bars, f) for f in OHLCV_FIELDS})
+        db_manager.write_ohlcv_data(measurement=timeframe, data=df, symbol=symbol)
+    return write
@@ -0,0 +1,239 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from logging_config import logger
+from ohlcv import OHLCV_FIELDS, grid_offset_ms, timeframe_ms
+
+Range = Tuple[int, int]  # inclusive [first missing bar, last missing bar] timestamps
+
+
+@dataclass
+class Coverage:
+    """Integrity of one (symbol, timeframe) series: what is stored, and which bars are missing or off-grid."""
+    symbol: str
+    timeframe: str
+    step_ms: int
+    bars: int = 0
+    first: Optional[int] = None
+    last: Optional[int] = None
+    gaps: List[Range] = field(default_factory=list)
+    duplicates: List[int] = field(default_factory=list)
+    misaligned: List[int] = field(default_factory=list)
+    unrepairable: List[Range] = field(default_factory=list)  # gaps the exchange has no data for
+    checked_at: float = field(default_factory=time.time)
+
+    @property
+    def missing(self) -> int:
+        return sum((end - start) // self.step_ms + 1 for start, end in self.gaps)
+
+    @property
+    def ratio(self) -> float:
+        """Share of grid bars between first and last that are stored."""
+        expected = self.bars + self.missing
+        return self.bars / expected if expected else 1.0
+
+    def gaps_in(self, start: int, end: int) -> List[Range]:
+        """Gaps overlapping the window [start, end]."""
+        return [(s, e) for s, e in self.gaps if s <= end and e >= start]
+
+    def is_clean(self, start: Optional[int] = None, end: Optional[int] = None) -> bool:
+        """True if the window (default: whole series) has no gaps, duplicates or off-grid bars."""
+        start = self.first if start is None else start
+        end = self.last if end is None else end
+        if start is None or end is None:
+            return True
+        in_window = lambda ts: [t for t in ts if start <= t <= end]
+        return not (self.gaps_in(start, end) or in_window(self.duplicates) or in_window(self.misaligned))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'symbol': self.symbol, 'timeframe': self.timeframe, 'bars': self.bars, 'first': self.first,
+                'last': self.last, 'missing': self.missing, 'ratio': round(self.ratio, 6),
+                'gaps': [list(g) for g in self.gaps], 'duplicates': self.duplicates, 'misaligned': self.misaligned,
+                'unrepairable': [list(g) for g in self.unrepairable], 'checked_at': self.checked_at}
+
+
+def inspect_timestamps(timestamps: Any, timeframe: str, symbol: str = '') -> Coverage:
+    """
+    Diffs bar timestamps against the timeframe grid in a few vectorised passes: off-grid bars,
+    repeated timestamps, and runs of missing grid points between consecutive stored bars.
+    """
+    step = timeframe_ms(timeframe)
+    coverage = Coverage(symbol, timeframe, step)
+    ts = np.sort(np.asarray(timestamps, dtype=np.int64))
+    if len(ts) == 0:
+        return coverage
+    off_grid = (ts - grid_offset_ms(timeframe)) % step != 0
+    repeated = np.concatenate(([False], ts[1:] == ts[:-1]))
+    aligned = np.unique(ts[~off_grid])
+    holes = np.flatnonzero(np.diff(aligned) > step)
+
+    coverage.bars = len(aligned)
+    coverage.first, coverage.last = int(ts[0]), int(ts[-1])
+    coverage.gaps = list(zip((aligned[holes] + step).tolist(), (aligned[holes + 1] - step).tolist()))
+    coverage.duplicates = np.unique(ts[repeated]).tolist()
+    coverage.misaligned = ts[off_grid].tolist()
+    return coverage
+
+
+class GapRepairer:
+    """
+    Background integrity scanner for stored series. Each pass reads every configured series' timestamps
+    from the storage backend, finds the holes (e.g. left by downtime longer than the 500-bar fetch
+    window) and fetches only the missing ranges, page by page, on a single thread so the exchange rate
+    limit is respected. Gaps the exchange has no data for are remembered and not requested again.
+    """
+
+    def __init__(self, db_manager: Any, exchange: Any, series: List[Tuple[str, str]],
+                 time_range_start: str = '-365d', page_limit: int = 1000, interval: float = 3600.0,
+                 owns: Optional[Callable[[Tuple[str, str]], bool]] = None):
+        """
+        Args:
+            db_manager: Storage backend (DatabaseManager, LocalBarStore or CachedDatabaseManager).
+            exchange: ccxt exchange used for the repair requests.
+            series (List[Tuple[str, str]]): (symbol, timeframe) pairs to keep complete.
+            time_range_start (str): How far back each pass checks, Flux-style ('-365d').
+            page_limit (int): Maximum bars per exchange request.
+            interval (float): Seconds between passes.
+            owns (Optional[Callable]): When sharded, ShardCoordinator.owns; each pass only repairs the
+                series this instance currently holds.
+        """
+        self.db_manager = db_manager
+        self.exchange = exchange
+        self.series = list(series)
+        self.time_range_start = time_range_start
+        self.page_limit = page_limit
+        self.interval = interval
+        self.owns = owns
+        self._coverage: Dict[Tuple[str, str], Coverage] = {}
+        self._unrepairable: Dict[Tuple[str, str], Set[Range]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # ccxt throttles itself when enableRateLimit is on; otherwise pace requests by its rateLimit (ms).
+        self._pause = 0.0 if getattr(exchange, 'enableRateLimit', False) else getattr(exchange, 'rateLimit', 0) / 1000
+
+    def scan(self, symbol: str, timeframe: str) -> Coverage:
+        arrays = self.db_manager.query_ohlcv_arrays(measurement=timeframe, symbol=symbol,
+                                                    time_range_start=self.time_range_start)
+        coverage = inspect_timestamps(arrays.timestamp, timeframe, symbol)
+        with self._lock:
+            coverage.unrepairable = sorted(self._unrepairable.get((symbol, timeframe), set()) & set(coverage.gaps))
+            self._coverage[(symbol, timeframe)] = coverage
+        return coverage
+
+    def _fetch_range(self, symbol: str, timeframe: str, start: int, end: int) -> int:
+        """Fetches [start, end] in pages and stores it; returns the bars written."""
+        import pandas as pd
+        step = timeframe_ms(timeframe)
+        since, written = start, 0
+        while since <= end:
+            limit = int(min(self.page_limit, (end - since) // step + 1))
+            rows = [r for r in self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+                    if since <= r[0] <= end]
+            if not rows:
+                break
+            self.db_manager.write_ohlcv_data(measurement=timeframe, symbol=symbol,
+                                             data=pd.DataFrame(rows, columns=list(OHLCV_FIELDS)))
+            written += len(rows)
+            since = int(rows[-1][0]) + step
+            if self._pause:
+                time.sleep(self._pause)
+        if since <= end:
+            with self._lock:
+                self._unrepairable.setdefault((symbol, timeframe), set()).add((since, end))
+        return written
+
+    def repair(self, symbol: str, timeframe: str) -> int:
+        """Scans one series and fills its repairable gaps; returns the number of bars written."""
+        coverage = self.scan(symbol, timeframe)
+        written = 0
+        for start, end in coverage.gaps:
+            if (start, end) in coverage.unrepairable:
+                continue
+            written += self._fetch_range(symbol, timeframe, start, end)
+        if written:
+            coverage = self.scan(symbol, timeframe)
+            logger.info(f"Repaired {written} bars of {symbol} {timeframe}; "
+                        f"{coverage.missing} still missing ({coverage.ratio:.2%} coverage).")
+        if coverage.duplicates or coverage.misaligned:
+            logger.warning(f"{symbol} {timeframe} has {len(coverage.duplicates)} duplicated and "
+                           f"{len(coverage.misaligned)} off-grid bars.")
+        return written
+
+    def run_once(self) -> int:
+        total = 0
+        for symbol, timeframe in self.series:
+            if self._stop.is_set():
+                break
+            if self.owns is not None and not self.owns((symbol, timeframe)):
+                continue
+            try:
+                total += self.repair(symbol, timeframe)
+            except Exception as e:
+                logger.error(f"Integrity check failed for {symbol} {timeframe}: {e}", exc_info=True)
+        return total
+
+    def coverage(self, symbol: str, timeframe: str) -> Optional[Coverage]:
+        with self._lock:
+            return self._coverage.get((symbol, timeframe))
+
+    def covers(self, symbol: str, timeframe: str) -> bool:
+        return (symbol, timeframe) in self.series and (self.owns is None or self.owns((symbol, timeframe)))
+
+    def is_unrepairable(self, symbol: str, timeframe: str, gap: Range) -> bool:
+        """True once a repair attempt found no exchange data for (a range containing) `gap`."""
+        with self._lock:
+            known = self._unrepairable.get((symbol, timeframe), ())
+            return any(start <= gap[0] and gap[1] <= end for start, end in known)
+
+    def coverage_map(self) -> Dict[str, Dict[str, Any]]:
+        """JSON-friendly coverage of every checked series, keyed 'symbol|timeframe'."""
+        with self._lock:
+            return {f"{s}|{tf}": c.to_dict() for (s, tf), c in self._coverage.items()}
+
+    def run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name='gap-repair', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+class GapLedger:
+    """
+    Remembers which gaps and off-grid bars of each series analysis has already been told about, so a
+    defect is reported once rather than on every cycle. With a GapRepairer attached, a gap is "awaiting
+    repair" until a repair pass finds the exchange has no data for it; without one (or for series the
+    repairer does not cover) nothing will ever fill it, so it is never awaiting repair.
+    """
+
+    def __init__(self, repairer: Optional[GapRepairer] = None):
+        self.repairer = repairer
+        self._seen: Dict[Tuple[str, str], Set[Range]] = {}
+        self._lock = threading.Lock()
+
+    def new_defects(self, coverage: Coverage) -> Tuple[List[Range], List[int]]:
+        """The gaps and off-grid bars of `coverage` not reported before; marks them as reported."""
+        with self._lock:
+            seen = self._seen.setdefault((coverage.symbol, coverage.timeframe), set())
+            gaps = [g for g in coverage.gaps if g not in seen]
+            misaligned = [t for t in coverage.misaligned if (t, t) not in seen]
+            seen.update(gaps)
+            seen.update((t, t) for t in misaligned)
+        return gaps, misaligned
+
+    def awaiting_repair(self, coverage: Coverage) -> List[Range]:
+        """Gaps of `coverage` a running repairer may still fill."""
+        repairer = self.repairer
+        if repairer is None or not repairer.covers(coverage.symbol, coverage.timeframe):
+            return []
+        return [g for g in coverage.gaps if not repairer.is_unrepairable(coverage.symbol, coverage.timeframe, g)]
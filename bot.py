@@ -1,14 +1,200 @@
+import argparse
+import asyncio
+import functools
+import signal
+import sys
 import time
+from typing import Any, Dict, List, Optional
 import schedule
 from config import config
 from simple_data_processor import SimpleDataProcessor
 from signal_detector import SignalDetector
+from chan_window import create_chan_windows
+from center_index import CenterIndexRegistry
+from confluence import ConfluenceEngine
+from ohlcv import OHLCVArrays
+from bar_integrity import GapLedger, GapRepairer, inspect_timestamps
 from strategy_notifier import StrategyNotifier
-from database_manager import DatabaseManager
+from strategy_channel import StrategyLog
+from local_store import create_storage
+from startup_metrics import StartupProfile
 from logging_config import logger
+# Mode-specific modules (scanner, stream/aiohttp, sharding) and the exchange, InfluxDB and Telegram
+# clients are imported on first use, so a restart only pays for what the configured mode needs.
+
+# Gaps already reported to (or refused by) check_window; main() attaches the background repairer.
+gap_ledger = GapLedger()
+
+def check_window(symbol: str, timeframe: str, ohlcv: OHLCVArrays) -> bool:
+    """
+    Flags (GAP_POLICY=flag) or refuses (GAP_POLICY=refuse) analysis windows with missing or off-grid bars.
+    Each defect is logged once. 'refuse' only holds analysis back while the gap repairer may still fill a
+    gap; gaps it found no exchange data for (or any gap when repair is off) are accepted after the warning.
+    """
+    if config.GAP_POLICY == 'off':
+        return True
+    coverage = inspect_timestamps(ohlcv.timestamp, timeframe, symbol)
+    if coverage.is_clean():
+        return True
+    gaps, misaligned = gap_ledger.new_defects(coverage)
+    if gaps or misaligned:
+        logger.warning(f"{symbol} {timeframe} window has {len(gaps)} new gap(s) "
+                       f"({sum((e - s) // coverage.step_ms + 1 for s, e in gaps)} missing bars) and "
+                       f"{len(misaligned)} new off-grid bars; Chan strokes may span the holes.")
+    if config.GAP_POLICY == 'refuse':
+        pending = gap_ledger.awaiting_repair(coverage)
+        if pending:
+            if gaps:
+                logger.warning(f"Skipping {symbol} {timeframe} analysis until {len(pending)} gap(s) are repaired.")
+            return False
+    return True
+
+def start_gap_repair(data_processor: SimpleDataProcessor, db_manager: Any, timeframes: List[str],
+                     coordinator: Optional['ShardCoordinator'] = None) -> Optional[GapRepairer]:
+    """Starts the background gap repairer (GAP_REPAIR); a failure to set it up only disables repair."""
+    try:
+        from scanner import resolve_universe
+        symbols = resolve_universe(data_processor.exchange, config.SCAN_SYMBOLS or config.SYMBOL)
+        repairer = GapRepairer(db_manager, data_processor.exchange, [(s, tf) for s in symbols for tf in timeframes],
+                               time_range_start=config.GAP_SCAN_RANGE, interval=config.GAP_REPAIR_INTERVAL_SECONDS,
+                               owns=coordinator.owns if coordinator is not None else None)
+        repairer.start()
+    except Exception as e:
+        logger.error(f"Background gap repair could not start: {e}", exc_info=True)
+        return None
+    gap_ledger.repairer = repairer
+    logger.info(f"Background gap repair enabled for {len(repairer.series)} series.")
+    return repairer
+
+def run_job(app_config: Dict[str, Any], data_processor: SimpleDataProcessor, db_manager: Any,
+            signal_detector: SignalDetector, strategy_notifier: StrategyNotifier,
+            coordinator: Optional['ShardCoordinator'] = None):
+    """The main job to be scheduled. Fetches, stores, and analyzes data."""
+    logger.info("------------------- Running Scheduled Job -------------------")
+    try:
+        timeframes = app_config['timeframes']
+        if coordinator is not None:
+            # Sharded: only the timeframes whose lease this instance holds.
+            owned = {tf for symbol, tf in coordinator.owned() if symbol == app_config['symbol']}
+            timeframes = [tf for tf in timeframes if tf in owned]
+            if not timeframes:
+                logger.info("No shards owned by this instance; nothing to do this cycle.")
+                return
+
+        # Step 1: Fetch latest data and store it in InfluxDB.
+        # This ensures our database is always up-to-date.
+        logger.info("[WORKFLOW] Step 1: Fetching and storing latest market data.")
+        data_processor.fetch_and_store_ohlcv_data(timeframes)
+
+        all_signals = {}
+        progress = []  # (timeframe, last closed bar) committed once the alerts went out
+        confluence = ConfluenceEngine(app_config['symbol'], detector=signal_detector)
+        # Step 2: For each timeframe, query a full history from the DB and analyze.
+        logger.info("[WORKFLOW] Step 2: Querying historical data and detecting signals.")
+        for timeframe in timeframes:
+            # Query a long history for more accurate analysis (e.g., 30 days).
+            # Chan theory and other indicators benefit greatly from more context.
+            # Columnar NumPy views over the query result; no row-wise copies are made downstream.
+            ohlcv = db_manager.query_ohlcv_arrays(
+                measurement=timeframe, 
+                symbol=app_config['symbol'], 
+                time_range_start="-30d"
+            )
+            
+            if len(ohlcv) < 100: # Ensure enough data for analysis
+                logger.warning(f"Not enough historical data for {timeframe} (found {len(ohlcv)}). Skipping analysis.")
+                continue
+            if not check_window(app_config['symbol'], timeframe, ohlcv):
+                continue
+            if coordinator is not None:
+                from sharding import last_closed_bar
+                bar = last_closed_bar(ohlcv.timestamp, timeframe)
+                if bar is None or not coordinator.pending(app_config['symbol'], timeframe, bar):
+                    logger.info(f"{timeframe} bar {bar} already analysed or shard lost. Skipping.")
+                    continue
+                progress.append((timeframe, bar))
+            
+            logger.info(f"Detecting signals for {timeframe} using {len(ohlcv)} data points from DB...")
+            # Indicators and Chan structures are computed lazily for the enabled detectors only.
+            signals = signal_detector.detect_all_signals(timeframe, None, ohlcv, symbol=app_config['symbol'])
+            all_signals[timeframe] = signals
+            confluence.add_timeframe(timeframe, ohlcv)
+
+        # Step 2b: Cross-timeframe resonance on a shared time axis (reuses the cached indicators).
+        if len(confluence.timeframes) > 1:
+            base_timeframe = confluence.timeframes[0]
+            all_signals[base_timeframe] = all_signals[base_timeframe] + confluence.latest_signals(base_timeframe)
+        
+        # Step 3: Generate and send notifications if any signals were found.
+        logger.info("[WORKFLOW] Step 3: Generating strategy and notifying.")
+        if any(s for s in all_signals.values() if s):
+            strategy_notifier.notify(all_signals, symbol=app_config['symbol'])
+        else:
+            logger.info("No trading signals detected across all timeframes.")
+        for timeframe, bar in progress:
+            coordinator.commit(app_config['symbol'], timeframe, bar)
+        logger.info("------------------- Scheduled Job Finished -------------------")
+
+    except Exception as e:
+        logger.error(f"An critical error occurred in the main job: {e}", exc_info=True)
+
+def run_market_scan(universe: str, scanner: 'MarketScanner', strategy_notifier: StrategyNotifier, top_n: int,
+                    coordinator: Optional['ShardCoordinator'] = None):
+    """Scanner mode: refreshes and ranks the whole symbol universe, then sends one digest."""
+    from scanner import format_digest, resolve_universe
+    logger.info("------------------- Running Market Scan -------------------")
+    try:
+        symbols = resolve_universe(scanner.exchange, universe)
+        shards = None
+        if coordinator is not None:
+            # Every instance declares the same shard set; each then scans only the shards it leases.
+            coordinator.set_shards((symbol, tf) for symbol in symbols for tf in scanner.timeframes)
+            shards = coordinator.owned()
+        results = scanner.scan(symbols, shards)
+        digest = format_digest(results, top_n)
+        if digest:
+            strategy_notifier.publish(digest, symbol='*')
+        else:
+            logger.info("Market scan found no setups.")
+        if coordinator is not None:
+            # Only now that the digest is out; a failure above leaves the bars pending for the next cycle.
+            for result in results:
+                for timeframe, bar in result.closed_bars.items():
+                    coordinator.commit(result.symbol, timeframe, bar)
+        logger.info("------------------- Market Scan Finished -------------------")
+    except Exception as e:
+        logger.error(f"An critical error occurred in the market scan: {e}", exc_info=True)
+
+def analyze_bar(signal_detector: SignalDetector, strategy_notifier: StrategyNotifier,
+                symbol: str, timeframe: str, ohlcv: OHLCVArrays):
+    """Streaming mode: analyses one series right after its candle closed (or intra-candle)."""
+    if len(ohlcv) < 100:
+        logger.warning(f"Not enough streamed history for {symbol} {timeframe} (found {len(ohlcv)}). Skipping analysis.")
+        return
+    if not check_window(symbol, timeframe, ohlcv):
+        return
+    signals = signal_detector.detect_all_signals(timeframe, None, ohlcv, symbol=symbol)
+    if signals:
+        strategy_notifier.notify({timeframe: signals}, symbol=symbol)
+
+def analyze_trade_bars(db_manager: Any, signal_detector: SignalDetector, strategy_notifier: StrategyNotifier,
+                       symbol: str, timeframe: str, bars: OHLCVArrays):
+    """Streaming mode: stores bars closed by the trade aggregator, then analyses the stored history."""
+    from bar_aggregator import storage_sink
+    storage_sink(db_manager)(symbol, timeframe, bars)
+    history = db_manager.query_ohlcv_arrays(measurement=timeframe, symbol=symbol, time_range_start="-30d")
+    analyze_bar(signal_detector, strategy_notifier, symbol, timeframe, history)
 
 def main():
     """Main function to initialize and run the trading bot."""
+    parser = argparse.ArgumentParser(description="ChanTradeBot")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="Run one polling job, print a JSON startup timeline (time, RSS, heavy imports) and exit.")
+    args = parser.parse_args()
+    profile = StartupProfile() if args.measure_startup else None
+    if profile:
+        profile.mark('imports')
+
     logger.info("=========================================================")
     logger.info("===         Starting ChanTradeBot with InfluxDB       ===")
     logger.info("=========================================================")
@@ -25,85 +211,174 @@ def main():
         'timeframes': list(config.TIMEFRAMES.keys()),
         'telegram': {
             'token': config.TELEGRAM_BOT_TOKEN,
-            'chat_id': config.TELEGRAM_CHAT_ID
+            'chat_id': config.TELEGRAM_CHAT_ID,
+            'base_url': config.TELEGRAM_API_URL
         },
         'schedule_minutes': config.SCHEDULE_MINUTES
     }
     
     try:
-        # Initialize DatabaseManager by passing config values directly (Dependency Injection).
-        db_manager = DatabaseManager(
-            url=config.INFLUXDB_URL,
-            token=config.INFLUXDB_TOKEN,
-            org=config.INFLUXDB_ORG,
-            bucket=config.INFLUXDB_BUCKET
+        # Initialize the configured storage backend by passing config values directly (Dependency Injection).
+        # STORAGE_BACKEND=local runs without InfluxDB; 'cached' puts the local store in front of it.
+        db_manager = create_storage(
+            backend=config.STORAGE_BACKEND,
+            local_path=config.LOCAL_STORE_PATH,
+            influx_settings={
+                'url': config.INFLUXDB_URL,
+                'token': config.INFLUXDB_TOKEN,
+                'org': config.INFLUXDB_ORG,
+                'bucket': config.INFLUXDB_BUCKET,
+                'tiers': config.INFLUXDB_TIERS
+            }
         )
     except ValueError as e:
         # This will catch the error if any of the required InfluxDB config values are missing from the environment.
-        logger.critical(f"CRITICAL: Failed to initialize DatabaseManager. Bot cannot start. Error: {e}")
-        logger.critical("Please ensure INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG, and INFLUXDB_BUCKET are set correctly in docker-compose.yaml.")
+        logger.critical(f"CRITICAL: Failed to initialize storage backend '{config.STORAGE_BACKEND}'. Bot cannot start. Error: {e}")
+        logger.critical("Please ensure INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG, and INFLUXDB_BUCKET are set correctly in docker-compose.yaml, or set STORAGE_BACKEND=local.")
         return
+    if profile:
+        profile.mark('storage')
 
     data_processor = SimpleDataProcessor(app_config, db_manager)
-    signal_detector = SignalDetector()
-    strategy_notifier = StrategyNotifier(app_config.get('telegram', {}))
-
-    def job():
-        """The main job to be scheduled. Fetches, stores, and analyzes data."""
-        logger.info("------------------- Running Scheduled Job -------------------")
-        try:
-            # Step 1: Fetch latest data and store it in InfluxDB.
-            # This ensures our database is always up-to-date.
-            logger.info("[WORKFLOW] Step 1: Fetching and storing latest market data.")
-            data_processor.fetch_and_store_ohlcv_data()
-
-            all_signals = {}
-            # Step 2: For each timeframe, query a full history from the DB and analyze.
-            logger.info("[WORKFLOW] Step 2: Querying historical data and detecting signals.")
-            for timeframe in app_config['timeframes']:
-                # Query a long history for more accurate analysis (e.g., 30 days).
-                # Chan theory and other indicators benefit greatly from more context.
-                historical_df = db_manager.query_ohlcv_data(
-                    measurement=timeframe, 
-                    symbol=app_config['symbol'], 
-                    time_range_start="-30d"
-                )
-                
-                if historical_df.empty or len(historical_df) < 100: # Ensure enough data for analysis
-                    logger.warning(f"Not enough historical data for {timeframe} (found {len(historical_df)}). Skipping analysis.")
-                    continue
-                
-                logger.info(f"Detecting signals for {timeframe} using {len(historical_df)} data points from DB...")
-                # Convert DataFrame to the list of lists format expected by the detector
-                ohlcv_list = historical_df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].values.tolist()
-                # NOTE: Indicator calculation is not yet implemented. We are passing an empty dict for now.
-                # The Chan analysis might still work if it calculates its own MACD internally.
-                indicators = {}
-                signals = signal_detector.detect_all_signals(timeframe, indicators)
-                all_signals[timeframe] = signals
-            
-            # Step 3: Generate and send notifications if any signals were found.
-            logger.info("[WORKFLOW] Step 3: Generating strategy and notifying.")
-            if any(s for s in all_signals.values() if s):
-                strategy_notifier.notify(all_signals, symbol=app_config['symbol'])
-            else:
-                logger.info("No trading signals detected across all timeframes.")
-            logger.info("------------------- Scheduled Job Finished -------------------")
-
-        except Exception as e:
-            logger.error(f"An critical error occurred in the main job: {e}", exc_info=True)
-
-    # --- Scheduler Setup ---
-    schedule.every(app_config['schedule_minutes']).minutes.do(job)
-    logger.info(f"Job scheduled to run every {app_config['schedule_minutes']} minutes.")
-
-    # Run the job immediately at startup, then enter the main loop.
-    logger.info("Running initial job at startup...")
-    job()
-
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    chan_windows = create_chan_windows(config.CHAN_WINDOW_CENTERS, config.CHAN_WINDOW_BARS, config.CHAN_ARCHIVE_PATH)
+    derivatives = None
+    if config.DERIVATIVES and not profile:
+        from derivatives import DerivativesIngestor
+        from scanner import resolve_universe
+        symbols = resolve_universe(data_processor.exchange, config.SCAN_SYMBOLS or config.SYMBOL)
+        derivatives = DerivativesIngestor(data_processor.exchange, db_manager, symbols, metrics=config.DERIVATIVES_METRICS,
+                                          period=config.DERIVATIVES_PERIOD, concurrency=config.DERIVATIVES_CONCURRENCY,
+                                          lookback_days=config.DERIVATIVES_LOOKBACK_DAYS,
+                                          interval=config.DERIVATIVES_REFRESH_SECONDS)
+        derivatives.start()
+        logger.info(f"Derivatives ingestion enabled for {len(symbols)} symbol(s): {', '.join(derivatives.metrics)}.")
+    recorder = None
+    if config.ORDERBOOK and not profile:
+        import threading
+        from orderbook import OrderBookRecorder
+        from scanner import resolve_universe
+        from stream import DepthStreamer
+        symbols = resolve_universe(data_processor.exchange, config.SCAN_SYMBOLS or config.SYMBOL)
+        recorder = OrderBookRecorder(symbols, app_config['timeframes'], root=config.ORDERBOOK_PATH or None,
+                                     db_manager=db_manager, band_bps=config.ORDERBOOK_BAND_BPS,
+                                     stack_multiple=config.ORDERBOOK_STACK_MULTIPLE, max_levels=config.ORDERBOOK_LEVELS,
+                                     keyframe_seconds=config.ORDERBOOK_KEYFRAME_SECONDS)
+        depth = DepthStreamer(data_processor.exchange, recorder, url=config.STREAM_URL)
+        threading.Thread(target=asyncio.run, args=(depth.run(),), name='depth-stream', daemon=True).start()
+        logger.info(f"Order book recording enabled for {len(symbols)} symbol(s).")
+    cross_asset = None
+    if config.CROSS_ASSET and not profile:
+        from cross_asset import CrossAssetTracker
+        from scanner import resolve_universe
+        symbols = resolve_universe(data_processor.exchange, config.CROSS_ASSET_SYMBOLS or config.SCAN_SYMBOLS or config.SYMBOL)
+        cross_asset = CrossAssetTracker(data_processor.exchange, db_manager, symbols, app_config['timeframes'],
+                                        benchmark=config.CROSS_ASSET_BENCHMARK, window=config.CROSS_ASSET_WINDOW,
+                                        concurrency=config.CROSS_ASSET_CONCURRENCY,
+                                        interval=config.CROSS_ASSET_REFRESH_SECONDS)
+        cross_asset.start()
+        logger.info(f"Cross-asset analytics enabled for {len(cross_asset.symbols)} symbol(s) "
+                    f"against {config.CROSS_ASSET_BENCHMARK}.")
+    journal = None
+    if config.SIGNAL_JOURNAL and not profile:
+        from signal_journal import SignalJournal
+        journal = SignalJournal(db_manager, batch_size=config.SIGNAL_JOURNAL_BATCH,
+                                flush_interval=config.SIGNAL_JOURNAL_FLUSH_SECONDS)
+        journal.start()
+        # supervisord and docker stop with SIGTERM; raise SystemExit so the final flush below still runs.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        logger.info(f"Signal journal enabled (measurement '{journal.measurement}').")
+    signal_detector = SignalDetector(enabled_detectors=config.ENABLED_DETECTORS, chan_windows=chan_windows,
+                                     derivatives=derivatives, orderbook=recorder, center_index=CenterIndexRegistry(),
+                                     cross_asset=cross_asset, journal=journal,
+                                     derivatives_timeframe=config.DERIVATIVES_TIMEFRAME or (
+                                         config.DERIVATIVES_PERIOD if config.DERIVATIVES_PERIOD in app_config['timeframes']
+                                         else app_config['timeframes'][0]))
+    channel = StrategyLog(config.STRATEGY_CHANNEL_PATH) if config.STRATEGY_CHANNEL_PATH else None
+    strategy_notifier = StrategyNotifier(app_config.get('telegram', {}), channel=channel)
+    if profile:
+        profile.mark('components')
+
+    try:
+        if config.STREAMING and not profile:
+            if config.GAP_REPAIR:
+                start_gap_repair(data_processor, db_manager, app_config['timeframes'])
+            from scanner import resolve_universe
+            from concurrent.futures import ThreadPoolExecutor
+            from stream import KlineStreamer, TradeStreamer
+            symbols = resolve_universe(data_processor.exchange, config.SCAN_SYMBOLS or config.SYMBOL)
+            on_bar = functools.partial(analyze_bar, signal_detector, strategy_notifier)
+            # One analysis thread for every streamer: the SignalDetector and its caches are shared.
+            analysis = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream-analysis')
+            streamer = KlineStreamer(data_processor.exchange, db_manager, symbols, app_config['timeframes'],
+                                     on_close=on_bar, on_update=on_bar if config.STREAM_INTRABAR_SECONDS > 0 else None,
+                                     url=config.STREAM_URL, intrabar_interval=config.STREAM_INTRABAR_SECONDS,
+                                     executor=analysis)
+            streamers = [streamer]
+            if config.STREAM_TRADE_TIMEFRAMES:
+                streamers.append(TradeStreamer(
+                    symbols, config.STREAM_TRADE_TIMEFRAMES, exchange=data_processor.exchange, url=config.STREAM_URL,
+                    on_close=functools.partial(analyze_trade_bars, db_manager, signal_detector, strategy_notifier),
+                    executor=analysis))
+            logger.info(f"Streaming mode enabled for {len(symbols)} symbol(s); analysis runs on every candle close.")
+
+            async def run_streams():
+                await asyncio.gather(*(s.run() for s in streamers))
+
+            try:
+                asyncio.run(run_streams())
+            finally:
+                analysis.shutdown(wait=True)
+            return
+
+        coordinator = None
+        if config.SHARDING:
+            from sharding import ShardCoordinator, create_lease_backend
+            coordinator = ShardCoordinator(create_lease_backend(config.SHARD_BACKEND, config.SHARD_DB_PATH),
+                                           instance_id=config.INSTANCE_ID or None, lease_ttl=config.SHARD_LEASE_SECONDS,
+                                           heartbeat_interval=config.SHARD_LEASE_SECONDS / 3)
+            coordinator.start()
+            logger.info(f"Sharding enabled as instance '{coordinator.instance_id}' ({config.SHARD_BACKEND} leases).")
+
+        if config.GAP_REPAIR and not profile:
+            # After the coordinator exists, so each instance only repairs the shards it leases.
+            start_gap_repair(data_processor, db_manager, app_config['timeframes'], coordinator)
+
+        if config.SCAN_SYMBOLS:
+            from scanner import MarketScanner
+            scanner = MarketScanner(data_processor.exchange, db_manager, signal_detector, app_config['timeframes'],
+                                    concurrency=config.SCAN_CONCURRENCY, history_limit=config.SCAN_HISTORY_LIMIT,
+                                    pending=coordinator.pending if coordinator is not None else None)
+            job = functools.partial(run_market_scan, config.SCAN_SYMBOLS, scanner, strategy_notifier, config.SCAN_TOP_N,
+                                    coordinator)
+            logger.info(f"Scanner mode enabled for universe '{config.SCAN_SYMBOLS}'.")
+        else:
+            if coordinator is not None:
+                coordinator.set_shards((config.SYMBOL, tf) for tf in app_config['timeframes'])
+            job = functools.partial(run_job, app_config, data_processor, db_manager, signal_detector, strategy_notifier,
+                                    coordinator)
+
+        if profile:
+            # Time-to-first-signal: one full fetch/analyse/notify cycle, then report and exit.
+            job()
+            profile.mark('first_job')
+            print(profile.dump())
+            return
+
+        # --- Scheduler Setup ---
+        schedule.every(app_config['schedule_minutes']).minutes.do(job)
+        logger.info(f"Job scheduled to run every {app_config['schedule_minutes']} minutes.")
+
+        # Run the job immediately at startup, then enter the main loop.
+        logger.info("Running initial job at startup...")
+        job()
+
+        while True:
+            schedule.run_pending()
+            time.sleep(1)
+    finally:
+        # Every exit path (streaming end, Ctrl-C or SIGTERM in scheduler mode) writes what the journal still buffers.
+        if journal is not None:
+            journal.stop()
 
 if __name__ == "__main__":
     main()
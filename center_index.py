@@ -0,0 +1,211 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chan import Center, Segment
+
+# ================== 中枢区间索引 ==================
+# 策略计算止损/止盈需要回答“某价格落在哪些中枢内、上下最近的 ZG/ZD 在哪里”。索引把中枢区间 [ZD, ZG]
+# 按 ZD 排序并在其上建 ZG 的最大值线段树，把全部边界价（可选包括段的高低点）排成有序数组：
+# 区间包含查询 O(log n + k)，最近边界查询 O(log n)，批量查询用 searchsorted 一次完成。
+
+
+class Level(NamedTuple):
+    """一个边界价位：kind 为 'zg'/'zd'（中枢）或 'high'/'low'（段），item 为对应的 Center/Segment"""
+    price: float
+    kind: str
+    item: Any
+
+
+def _center_key(center: Center) -> Tuple:
+    return (center.start_time, center.end_time, center.zd, center.zg, center.high, center.low)
+
+
+def _segment_key(segment: Segment) -> Tuple:
+    return (segment.start_time, segment.end_time, segment.high, segment.low)
+
+
+class CenterIndex:
+    """
+    单个 (symbol, timeframe) 的中枢区间索引。update 时按时间顺序比较新旧中枢（与段）序列，只删除、
+    插入发生变化的尾部（新形成或延伸的中枢），有序结构随之增量维护；查询用的数组与线段树在下一次
+    查询时才按需重建。
+    """
+
+    def __init__(self, include_segments: bool = False):
+        """
+        Args:
+            include_segments: 是否把段的高低点也作为边界价位
+        """
+        self.include_segments = include_segments
+        self._entries: Dict[str, List[Tuple[Tuple, int]]] = {'center': [], 'segment': []}  # 时间顺序 (key, id)
+        self._items: Dict[int, Any] = {}
+        self._intervals: List[Tuple[float, float, int]] = []  # (zd, zg, id)，按 zd 排序
+        self._levels: List[Tuple[float, int, str]] = []  # (price, id, kind)，按价格排序
+        self._next_id = 0
+        self._arrays: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    # ---------- 增量维护 ----------
+
+    def update(self, centers: Sequence[Center], segments: Sequence[Segment] = ()) -> 'CenterIndex':
+        """并入最新的中枢（与段）序列，返回自身"""
+        with self._lock:
+            self._sync('center', centers, _center_key)
+            if self.include_segments:
+                self._sync('segment', segments, _segment_key)
+        return self
+
+    def _sync(self, kind: str, items: Sequence[Any], key_of) -> None:
+        entries = self._entries[kind]
+        keys = [key_of(item) for item in items]
+        common = 0
+        for (old, _), new in zip(entries, keys):
+            if old != new:
+                break
+            common += 1
+        if common == len(entries) == len(keys):
+            return
+        for _, item_id in entries[common:]:
+            self._remove(kind, item_id)
+        del entries[common:]
+        for key, item in zip(keys[common:], items[common:]):
+            entries.append((key, self._add(kind, item)))
+        self._arrays = None
+
+    def _add(self, kind: str, item: Any) -> int:
+        item_id = self._next_id
+        self._next_id += 1
+        self._items[item_id] = item
+        if kind == 'center':
+            insort(self._intervals, (item.zd, item.zg, item_id))
+            insort(self._levels, (item.zd, item_id, 'zd'))
+            insort(self._levels, (item.zg, item_id, 'zg'))
+        else:
+            insort(self._levels, (item.low, item_id, 'low'))
+            insort(self._levels, (item.high, item_id, 'high'))
+        return item_id
+
+    def _remove(self, kind: str, item_id: int):
+        item = self._items.pop(item_id)
+        if kind == 'center':
+            self._discard(self._intervals, (item.zd, item.zg, item_id))
+            pairs = ((item.zd, 'zd'), (item.zg, 'zg'))
+        else:
+            pairs = ((item.low, 'low'), (item.high, 'high'))
+        for price, level_kind in pairs:
+            self._discard(self._levels, (price, item_id, level_kind))
+
+    @staticmethod
+    def _discard(ordered: List[Tuple], value: Tuple):
+        i = bisect_left(ordered, value)
+        if i < len(ordered) and ordered[i] == value:
+            del ordered[i]
+
+    def _build(self) -> Dict[str, Any]:
+        """查询用的数组：zd/zg（按 zd 排序）、zg 最大值线段树、有序边界价"""
+        arrays = self._arrays
+        if arrays is not None:
+            return arrays
+        with self._lock:
+            zd = np.array([i[0] for i in self._intervals], dtype=np.float64)
+            zg = np.array([i[1] for i in self._intervals], dtype=np.float64)
+            size = 1 << max(0, (len(zg) - 1).bit_length())
+            tree = np.full(2 * size, -np.inf)
+            tree[size:size + len(zg)] = zg
+            width = size
+            while width > 1:
+                width //= 2
+                tree[width:2 * width] = np.maximum(tree[2 * width:4 * width:2], tree[2 * width + 1:4 * width:2])
+            arrays = self._arrays = {
+                'zd': zd, 'zg': zg, 'tree': tree, 'size': size,
+                'centers': [self._items[i[2]] for i in self._intervals],
+                'prices': np.array([l[0] for l in self._levels], dtype=np.float64),
+                'levels': [Level(price, kind, self._items[item_id]) for price, item_id, kind in self._levels],
+            }
+        return arrays
+
+    # ---------- 查询 ----------
+
+    def containing(self, price: float) -> List[Center]:
+        """包含该价格的全部中枢（ZD <= price <= ZG），按 ZD 升序；O(log n + k)"""
+        arrays = self._build()
+        count = int(np.searchsorted(arrays['zd'], price, side='right'))
+        tree, size, hits = arrays['tree'], arrays['size'], []
+        # 在前 count 个区间（ZD <= price）中下探 ZG 最大值 >= price 的子树
+        stack = [(1, 0, size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= count or tree[node] < price:
+                continue
+            if hi - lo == 1:
+                hits.append(lo)
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return [arrays['centers'][i] for i in hits]
+
+    def nearest(self, price: float) -> Tuple[Optional[Level], Optional[Level]]:
+        """严格低于、严格高于该价格的最近边界 (below, above)，不存在时为 None；O(log n)"""
+        arrays = self._build()
+        prices, levels = arrays['prices'], arrays['levels']
+        below = int(np.searchsorted(prices, price, side='left')) - 1
+        above = int(np.searchsorted(prices, price, side='right'))
+        return (levels[below] if below >= 0 else None), (levels[above] if above < len(levels) else None)
+
+    def bounds(self, prices: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """批量最近边界：返回 (下方最近边界价, 上方最近边界价) 两个数组，缺失处为 NaN"""
+        levels = self._build()['prices']
+        prices = np.atleast_1d(np.asarray(prices, dtype=np.float64))
+        below = np.full(len(prices), np.nan)
+        above = np.full(len(prices), np.nan)
+        if len(levels):
+            b = np.searchsorted(levels, prices, side='left') - 1
+            a = np.searchsorted(levels, prices, side='right')
+            below[b >= 0] = levels[b[b >= 0]]
+            above[a < len(levels)] = levels[a[a < len(levels)]]
+        return below, above
+
+    def risk_reward(self, entries: Any, direction: Any = 'long') -> Dict[str, np.ndarray]:
+        """
+        批量盈亏比：做多以下方最近边界为止损、上方最近边界为止盈，做空相反；
+        盈亏比 = (止盈价 - 入场价) / (入场价 - 止损价)（做空取绝对值），缺少任一边界时为 NaN。
+        direction 可为单个 'long'/'short' 或与 entries 等长的数组。
+        """
+        entries = np.atleast_1d(np.asarray(entries, dtype=np.float64))
+        below, above = self.bounds(entries)
+        short = np.broadcast_to(np.asarray(direction) == 'short', entries.shape)
+        stop = np.where(short, above, below)
+        target = np.where(short, below, above)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.abs(target - entries) / np.abs(entries - stop)
+        return {'stop': stop, 'target': target, 'ratio': ratio}
+
+
+def build_center_index(centers: Sequence[Center], segments: Sequence[Segment] = (),
+                       include_segments: bool = False) -> CenterIndex:
+    """一次性构造索引（不保留续算状态）"""
+    return CenterIndex(include_segments).update(centers, segments)
+
+
+class CenterIndexRegistry:
+    """按 (symbol, timeframe) 保存 CenterIndex；可作为 SignalDetector 的 center_index"""
+
+    def __init__(self, include_segments: bool = False):
+        self.include_segments = include_segments
+        self._indexes: Dict[Tuple[str, str], CenterIndex] = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol: str, timeframe: str, centers: Sequence[Center],
+               segments: Sequence[Segment] = ()) -> CenterIndex:
+        with self._lock:
+            index = self._indexes.get((symbol, timeframe))
+            if index is None:
+                index = self._indexes[(symbol, timeframe)] = CenterIndex(self.include_segments)
+        return index.update(centers, segments)
@@ -1,7 +1,10 @@
-import pandas as pd
-from typing import List, Tuple
+import numpy as np
+from typing import Any, List, Tuple
 from dataclasses import dataclass
 
+import chan_kernels
+from ohlcv import OHLCVArrays, as_columns
+
 # ================== 数据结构定义 ==================
 
 @dataclass
@@ -65,8 +68,16 @@ class BuySellPoint:
 class ChanAnalyzer:
     """缠论核心分析器，用于识别笔、段、中枢及买卖点"""
 
-    def analyze(self, ohlcv: List[Tuple], macd_hist: List[float]) -> Tuple[List[Stroke], List[Segment], List[Center], List[BuySellPoint]]:
-        """完整的缠论分析流程，输出所有结构"""
+    def __init__(self, min_stroke_gap: int = 1):
+        """
+        Args:
+            min_stroke_gap: 成笔时顶底分型之间（合并后K线）必须超过的最小间隔
+        """
+        self.min_stroke_gap = min_stroke_gap
+
+    def analyze(self, ohlcv: Any, macd_hist: List[float]) -> Tuple[List[Stroke], List[Segment], List[Center], List[BuySellPoint]]:
+        """完整的缠论分析流程，输出所有结构。ohlcv 可为 OHLCVArrays、DataFrame、矩阵或行列表"""
+        ohlcv = as_columns(ohlcv)
         strokes = self.find_strokes(ohlcv)
         segments = self.find_segments(strokes)
         centers = self.find_centers(segments)
@@ -85,36 +96,43 @@ class ChanAnalyzer:
 
         return strokes, segments, centers, buy_sell_points
 
-    def find_strokes(self, ohlcv: List[Tuple]) -> List[Stroke]:
-        # ... (代码无变化)
-        if not ohlcv or len(ohlcv) < 5: return []
-        klines = self._merge_klines(ohlcv)
-        fractals = self._find_fractals(klines)
-        strokes = self._find_valid_strokes(fractals, klines)
+    def find_strokes(self, ohlcv: Any) -> List[Stroke]:
+        """包含处理、分型与成笔均由 chan_kernels 的数组内核完成，只为笔的端点构造 Kline/Fractal 对象"""
+        if len(ohlcv) < 5: return []
+        ohlcv = as_columns(ohlcv)
+        index, merged_high, merged_low = chan_kernels.merge_klines(
+            np.ascontiguousarray(ohlcv.high, dtype=np.float64), np.ascontiguousarray(ohlcv.low, dtype=np.float64))
+        position, kind = chan_kernels.find_fractals(merged_high, merged_low)
+        starts, ends = chan_kernels.find_strokes(position, kind, merged_high, merged_low, self.min_stroke_gap)
+
+        # 按列一次取出所有端点分型的数据；相邻两笔共用同一个分型对象
+        used = np.union1d(starts, ends)
+        merged_pos = position[used]
+        bars = index[merged_pos]
+        columns = [ohlcv.timestamp[bars].tolist()] + [getattr(ohlcv, f)[bars].tolist() for f in ('open', 'high', 'low', 'close', 'volume')]
+        fractals = {k: Fractal(kline=Kline(t, o, h, l, c, v, mh, ml), type='top' if kd == 1 else 'bottom')
+                    for k, t, o, h, l, c, v, mh, ml, kd in zip(used.tolist(), *columns, merged_high[merged_pos].tolist(),
+                                                               merged_low[merged_pos].tolist(), kind[used].tolist())}
+
+        strokes = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            first, last = fractals[start], fractals[end]
+            strokes.append(Stroke(start_fractal=first, end_fractal=last,
+                                  direction='down' if last.type == 'bottom' else 'up',
+                                  high=max(first.kline.merged_high, last.kline.merged_high),
+                                  low=min(first.kline.merged_low, last.kline.merged_low)))
         return strokes
 
     def find_segments(self, strokes: List[Stroke]) -> List[Segment]:
-        # ... (代码无变化)
+        """相邻两笔同向处断开，至少三笔成段（分段由 chan_kernels.find_segments 完成）"""
+        direction = np.fromiter((1 if s.direction == 'up' else -1 for s in strokes), dtype=np.int8, count=len(strokes))
         segments = []
-        if len(strokes) < 3: return segments
-        current_segment_strokes = []
-        for stroke in strokes:
-            if not current_segment_strokes:
-                current_segment_strokes.append(stroke)
-                continue
-            last_stroke_in_segment = current_segment_strokes[-1]
-            if stroke.direction == last_stroke_in_segment.direction:
-                if len(current_segment_strokes) >= 3:
-                    seg_high = max(s.high for s in current_segment_strokes)
-                    seg_low = min(s.low for s in current_segment_strokes)
-                    segments.append(Segment(strokes=current_segment_strokes, direction=current_segment_strokes[0].direction, start_time=current_segment_strokes[0].start_fractal.kline.time, end_time=current_segment_strokes[-1].end_fractal.kline.time, high=seg_high, low=seg_low))
-                current_segment_strokes = [stroke]
-            else:
-                current_segment_strokes.append(stroke)
-        if len(current_segment_strokes) >= 3:
-            seg_high = max(s.high for s in current_segment_strokes)
-            seg_low = min(s.low for s in current_segment_strokes)
-            segments.append(Segment(strokes=current_segment_strokes, direction=current_segment_strokes[0].direction, start_time=current_segment_strokes[0].start_fractal.kline.time, end_time=current_segment_strokes[-1].end_fractal.kline.time, high=seg_high, low=seg_low))
+        for start, end in zip(*(a.tolist() for a in chan_kernels.find_segments(direction))):
+            members = strokes[start:end + 1]
+            segments.append(Segment(strokes=members, direction=members[0].direction,
+                                    start_time=members[0].start_fractal.kline.time,
+                                    end_time=members[-1].end_fractal.kline.time,
+                                    high=max(s.high for s in members), low=min(s.low for s in members)))
         return segments
 
     def find_centers(self, segments: List[Segment]) -> List[Center]:
@@ -132,7 +150,7 @@ class ChanAnalyzer:
                 centers.append(Center(segments=[s1, s2, s3], start_time=s1.start_time, end_time=s3.end_time, zg=zg, zd=zd, high=center_high, low=center_low))
         return centers
 
-    def _find_first_buy_sell_points(self, segments: List[Segment], centers: List[Center], macd_hist: List[float], ohlcv: List[Tuple]) -> List[BuySellPoint]:
+    def _find_first_buy_sell_points(self, segments: List[Segment], centers: List[Center], macd_hist: List[float], ohlcv: OHLCVArrays) -> List[BuySellPoint]:
         """步骤6：识别第一类买卖点（基于背驰）"""
         points = []
         if not centers or len(segments) < 2:
@@ -155,9 +173,8 @@ class ChanAnalyzer:
             return points
 
         # 计算两段的MACD面积以判断背驰
-        kline_times = [k[0] for k in ohlcv]
-        entering_area = self._calculate_macd_area(entering_segment, macd_hist, kline_times)
-        leaving_area = self._calculate_macd_area(leaving_segment, macd_hist, kline_times)
+        entering_area = self._calculate_macd_area(entering_segment, macd_hist, ohlcv.timestamp)
+        leaving_area = self._calculate_macd_area(leaving_segment, macd_hist, ohlcv.timestamp)
 
         # 判断下跌趋势中的盘整背驰（一类买点）
         if leaving_segment.direction == 'down' and leaving_segment.low < entering_segment.low:
@@ -181,14 +198,13 @@ class ChanAnalyzer:
 
         return points
 
-    def _calculate_macd_area(self, segment: Segment, macd_hist: List[float], kline_times: List[any]) -> float:
-        """计算一个段对应的MACD柱状图面积"""
-        try:
-            start_index = kline_times.index(segment.start_time)
-            end_index = kline_times.index(segment.end_time)
-            return sum(macd_hist[start_index : end_index + 1])
-        except (ValueError, IndexError):
+    def _calculate_macd_area(self, segment: Segment, macd_hist: List[float], kline_times: np.ndarray) -> float:
+        """计算一个段对应的MACD柱状图面积（kline_times 为升序时间戳数组，二分查找定位）"""
+        start_index, end_index = np.searchsorted(kline_times, [segment.start_time, segment.end_time])
+        if end_index >= len(kline_times) or kline_times[start_index] != segment.start_time \
+                or kline_times[end_index] != segment.end_time:
             return 0.0
+        return float(np.sum(macd_hist[start_index : end_index + 1]))
 
     def _find_second_buy_sell_points(self, segments: List[Segment], centers: List[Center]) -> List[BuySellPoint]:
         """步骤7：识别第二类买卖点。
@@ -280,63 +296,3 @@ class ChanAnalyzer:
                         segment=s2
                     ))
         return points
-
-    def _merge_klines(self, ohlcv: List[Tuple]) -> List[Kline]:
-        """处理K线包含关系"""
-        klines = [Kline(time=row[0], open=row[1], high=row[2], low=row[3], close=row[4], volume=row[5], merged_high=row[2], merged_low=row[3]) for row in ohlcv]
-        i = 1
-        while i < len(klines):
-            prev_k, curr_k = klines[i-1], klines[i]
-            is_contained = prev_k.merged_high >= curr_k.merged_high and prev_k.merged_low <= curr_k.merged_low
-            is_containing = curr_k.merged_high >= prev_k.merged_high and curr_k.merged_low <= prev_k.merged_low
-            if is_contained or is_containing:
-                merged_high = max(prev_k.merged_high, curr_k.merged_high)
-                merged_low = max(prev_k.merged_low, curr_k.merged_low)
-                klines[i-1].merged_high, klines[i-1].merged_low = merged_high, merged_low
-                klines.pop(i)
-                i = 1
-            else:
-                i += 1
-        return klines
-
-    def _find_fractals(self, klines: List[Kline]) -> List[Fractal]:
-        """从合并后的K线中找到所有分型"""
-        fractals = []
-        for i in range(1, len(klines) - 1):
-            prev_k, curr_k, next_k = klines[i-1], klines[i], klines[i+1]
-            if curr_k.merged_high > prev_k.merged_high and curr_k.merged_high > next_k.merged_high:
-                fractals.append(Fractal(kline=curr_k, type='top'))
-            if curr_k.merged_low < prev_k.merged_low and curr_k.merged_low < next_k.merged_low:
-                fractals.append(Fractal(kline=curr_k, type='bottom'))
-        return fractals
-
-    def _find_valid_strokes(self, fractals: List[Fractal], klines: List[Kline]) -> List[Stroke]:
-        """连接分型，形成有效的笔"""
-        strokes = []
-        if len(fractals) < 2:
-            return strokes
-        last_fractal = None
-        for curr_fractal in fractals:
-            if last_fractal is None:
-                last_fractal = curr_fractal
-                continue
-            if curr_fractal.type == last_fractal.type:
-                if curr_fractal.type == 'top' and curr_fractal.kline.merged_high > last_fractal.kline.merged_high:
-                    last_fractal = curr_fractal
-                elif curr_fractal.type == 'bottom' and curr_fractal.kline.merged_low < last_fractal.kline.merged_low:
-                    last_fractal = curr_fractal
-                continue
-            
-            start_k_index = klines.index(last_fractal.kline)
-            end_k_index = klines.index(curr_fractal.kline)
-            if abs(end_k_index - start_k_index) > 1:
-                direction = 'down' if curr_fractal.type == 'bottom' else 'up'
-                stroke = Stroke(
-                    start_fractal=last_fractal, end_fractal=curr_fractal, direction=direction,
-                    high=max(last_fractal.kline.merged_high, curr_fractal.kline.merged_high),
-                    low=min(last_fractal.kline.merged_low, curr_fractal.kline.merged_low)
-                )
-                strokes.append(stroke)
-                last_fractal = curr_fractal
-        return strokes
-
@@ -0,0 +1,322 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, Flask, Response, request
+
+from chan_archive import FIELDS, ChanArchive, Record, serialize_structures
+from logging_config import logger
+from ohlcv import OHLCVArrays
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON is always available
+    msgpack = None
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+HISTORY_VERSIONS = 16  # past versions kept per series for since= deltas
+
+
+class SeriesSnapshot:
+    """Immutable structures of one (symbol, timeframe) at one version."""
+
+    def __init__(self, version: int, records: Dict[str, List[Record]], bars: int, last_bar: int):
+        self.version = version
+        self.records = records
+        self.bars = bars
+        self.last_bar = last_bar
+        self.updated_at = time.time()
+        self.times = {kind: np.array([r[0] for r in rows], dtype=np.int64) for kind, rows in records.items()}
+
+
+class ChanSnapshotStore:
+    """
+    Latest Chan structures per (symbol, timeframe), published by the analysis side and read by the
+    HTTP handlers. A publish with unchanged content does not bump the version, so ETags stay valid.
+    Versions of a series start at the store's creation time in epoch ms, so ETags and since= versions
+    handed out by an earlier process never match a snapshot of this one.
+    The last HISTORY_VERSIONS versions are kept to answer since= deltas; encoded response bodies
+    are cached per (series, version, query) so repeated polls cost a dict lookup.
+    """
+
+    def __init__(self, body_cache_size: int = 1024):
+        self._series: Dict[Tuple[str, str], 'OrderedDict[int, SeriesSnapshot]'] = {}
+        self._lock = threading.Lock()
+        self._bodies: 'OrderedDict[Tuple, Tuple[bytes, str]]' = OrderedDict()
+        self._body_cache_size = body_cache_size
+        self.epoch = int(time.time() * 1000)
+
+    def publish(self, symbol: str, timeframe: str, records: Dict[str, List[Record]], bars: int, last_bar: int) -> int:
+        key = (symbol, timeframe)
+        with self._lock:
+            history = self._series.setdefault(key, OrderedDict())
+            latest = next(reversed(history.values()), None)
+            if latest is not None and latest.records == records:
+                return latest.version
+            version = latest.version + 1 if latest is not None else self.epoch
+            history[version] = SeriesSnapshot(version, records, bars, last_bar)
+            while len(history) > HISTORY_VERSIONS:
+                history.popitem(last=False)
+            return version
+
+    def latest(self, symbol: str, timeframe: str) -> Optional[SeriesSnapshot]:
+        history = self._series.get((symbol, timeframe))
+        return next(reversed(history.values()), None) if history else None
+
+    def version(self, symbol: str, timeframe: str, version: int) -> Optional[SeriesSnapshot]:
+        history = self._series.get((symbol, timeframe))
+        return history.get(version) if history else None
+
+    def series(self) -> List[Tuple[str, str]]:
+        return list(self._series)
+
+    def cached_body(self, key: Tuple) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry is not None:
+                self._bodies.move_to_end(key)
+            return entry
+
+    def cache_body(self, key: Tuple, body: bytes, mimetype: str):
+        with self._lock:
+            self._bodies[key] = (body, mimetype)
+            while len(self._bodies) > self._body_cache_size:
+                self._bodies.popitem(last=False)
+
+
+def encode_cursor(time_key: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{time_key}:{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    time_key, offset = raw.split(':')
+    return int(time_key), int(offset)
+
+
+def page(snapshot: SeriesSnapshot, kind: str, start: Optional[int], end: Optional[int],
+         cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    One page of records in [start, end) ordered by time. The cursor is (time, offset among records
+    sharing that time), so it stays valid when a newer snapshot appends or revises later records.
+    """
+    times = snapshot.times[kind]
+    lo = int(np.searchsorted(times, start, side='left')) if start is not None else 0
+    hi = int(np.searchsorted(times, end, side='left')) if end is not None else len(times)
+    if cursor:
+        time_key, offset = decode_cursor(cursor)
+        lo = max(lo, int(np.searchsorted(times, time_key, side='left')) + offset)
+    rows = snapshot.records[kind][lo:min(hi, lo + limit)]
+    result = {'fields': FIELDS[kind], 'records': rows, 'next_cursor': None}
+    if lo + len(rows) < hi:
+        last_time = rows[-1][0]
+        first_of_time = int(np.searchsorted(times, last_time, side='left'))
+        result['next_cursor'] = encode_cursor(last_time, lo + len(rows) - first_of_time)
+    return result
+
+
+def delta(old: SeriesSnapshot, new: SeriesSnapshot, kind: str) -> Dict[str, Any]:
+    """Records added or changed since `old`, plus the records that disappeared."""
+    before, after = set(old.records[kind]), set(new.records[kind])
+    return {'fields': FIELDS[kind], 'upserts': sorted(after - before, key=lambda r: r[0]),
+            'deletes': sorted(before - after, key=lambda r: r[0])}
+
+
+# ================== HTTP ==================
+
+def create_blueprint(store: ChanSnapshotStore, archive: Optional[ChanArchive] = None) -> Blueprint:
+    """
+    Read-only endpoints over a ChanSnapshotStore:
+
+        GET /chan/series
+        GET /chan/<kind>?symbol=ETH/USDT&timeframe=1h[&start=ms][&end=ms][&limit=n][&cursor=c][&since=version]
+        GET /chan/archive/<kind>?symbol=ETH/USDT&timeframe=1h[&start=ms][&end=ms][&limit=n][&cursor=c]
+
+    kind is strokes, segments, centers, points, signals, level_segments or trends (the last two
+    are the higher Chan levels derived from the series' own strokes). Responses carry an ETag; with
+    If-None-Match an unchanged snapshot answers 304. since=<version> returns only the changes
+    since that version (or the full page with "full": true if it is no longer retained).
+    Send Accept: application/msgpack for MessagePack instead of JSON. The archive endpoint pages
+    structures that a bounded ChanWindow evicted from memory (only when an archive is configured).
+    """
+    bp = Blueprint('chan_api', __name__, url_prefix='/chan')
+
+    def respond(payload: Dict[str, Any], etag: str, cache_key: Tuple) -> Response:
+        cached = store.cached_body(cache_key)
+        if cached is None:
+            if cache_key[-1] == 'msgpack':
+                cached = (msgpack.packb(payload, use_bin_type=True), 'application/msgpack')
+            else:
+                cached = (json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode(), 'application/json')
+            store.cache_body(cache_key, *cached)
+        response = Response(cached[0], mimetype=cached[1])
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @bp.route('/series')
+    def list_series():
+        items = []
+        for symbol, timeframe in store.series():
+            snapshot = store.latest(symbol, timeframe)
+            items.append({'symbol': symbol, 'timeframe': timeframe, 'version': snapshot.version,
+                          'bars': snapshot.bars, 'last_bar': snapshot.last_bar,
+                          'age': round(time.time() - snapshot.updated_at, 1),
+                          'counts': {kind: len(rows) for kind, rows in snapshot.records.items()}})
+        return Response(json.dumps({'series': items}, separators=(',', ':')), mimetype='application/json')
+
+    @bp.route('/<kind>')
+    def structures(kind: str):
+        if kind not in FIELDS:
+            return {'error': f"unknown structure '{kind}'", 'kinds': list(FIELDS)}, 404
+        symbol, timeframe = request.args.get('symbol'), request.args.get('timeframe')
+        snapshot = store.latest(symbol, timeframe) if symbol and timeframe else None
+        if snapshot is None:
+            return {'error': f"no snapshot for symbol={symbol} timeframe={timeframe}"}, 404
+
+        wants_msgpack = 'application/msgpack' in request.headers.get('Accept', '')
+        if wants_msgpack and msgpack is None:
+            return {'error': 'MessagePack is not available on this server'}, 406
+        try:
+            start = int(request.args['start']) if 'start' in request.args else None
+            end = int(request.args['end']) if 'end' in request.args else None
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            since = int(request.args['since']) if 'since' in request.args else None
+            cursor = request.args.get('cursor')
+            if cursor:
+                decode_cursor(cursor)
+        except (ValueError, TypeError) as e:
+            return {'error': f"bad query parameter: {e}"}, 400
+        if limit < 1:
+            return {'error': 'limit must be at least 1'}, 400
+
+        encoding = 'msgpack' if wants_msgpack else 'json'
+        query = (start, end, limit, since, cursor)
+        etag = '"%d-%s"' % (snapshot.version, hashlib.sha1(repr((kind, query, encoding)).encode()).hexdigest()[:12])
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers={'ETag': etag})
+
+        payload = {'symbol': symbol, 'timeframe': timeframe, 'kind': kind, 'version': snapshot.version}
+        old = store.version(symbol, timeframe, since) if since is not None else None
+        if since is not None and since == snapshot.version:
+            payload.update({'fields': FIELDS[kind], 'upserts': [], 'deletes': []})
+        elif old is not None:
+            payload.update(delta(old, snapshot, kind))
+        else:
+            payload.update(page(snapshot, kind, start, end, cursor, limit))
+            if since is not None:
+                payload['full'] = True
+        return respond(payload, etag, (symbol, timeframe, snapshot.version, kind, query, encoding))
+
+    @bp.route('/archive/<kind>')
+    def archived(kind: str):
+        if archive is None:
+            return {'error': 'no structure archive is configured'}, 404
+        if kind not in FIELDS:
+            return {'error': f"unknown structure '{kind}'", 'kinds': list(FIELDS)}, 404
+        symbol, timeframe = request.args.get('symbol'), request.args.get('timeframe')
+        if not symbol or not timeframe:
+            return {'error': 'symbol and timeframe are required'}, 400
+        try:
+            start = int(request.args['start']) if 'start' in request.args else None
+            end = int(request.args['end']) if 'end' in request.args else None
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            after = int(request.args['cursor']) if 'cursor' in request.args else None
+        except (ValueError, TypeError) as e:
+            return {'error': f"bad query parameter: {e}"}, 400
+        if limit < 1:
+            return {'error': 'limit must be at least 1'}, 400
+        payload = {'symbol': symbol, 'timeframe': timeframe, 'kind': kind}
+        payload.update(archive.page(symbol, timeframe, kind, start, end, after, limit))
+        return Response(json.dumps(payload, separators=(',', ':'), ensure_ascii=False), mimetype='application/json')
+
+    return bp
+
+
+# ================== Snapshot refresher ==================
+
+class ChanSnapshotService:
+    """
+    Keeps a ChanSnapshotStore current: every `interval` seconds it reads each series once from the
+    storage backend and re-runs the analysis only when the bars changed. Request handlers never
+    touch the database or the analyzers.
+    """
+
+    def __init__(self, store: ChanSnapshotStore, db_manager: Any, detector: Any,
+                 series: List[Tuple[str, str]], interval: float = 60.0, time_range_start: str = '-30d'):
+        self.store = store
+        self.db_manager = db_manager
+        self.detector = detector
+        self.series = series
+        self.interval = interval
+        self.time_range_start = time_range_start
+        self._stop = threading.Event()
+
+    def publish(self, symbol: str, timeframe: str, ohlcv: OHLCVArrays) -> int:
+        """Analyses one series (indicators come from the detector's cache) and publishes the result."""
+        context = self.detector.context(timeframe, ohlcv, symbol)
+        levels = context['chan_levels'] if self.detector.chan_levels is not None else None
+        records = serialize_structures(context['chan'], self.detector.detect_all_series(context, ohlcv),
+                                       ohlcv.timestamp, levels)
+        return self.store.publish(symbol, timeframe, records, len(ohlcv), int(ohlcv.timestamp[-1]))
+
+    def refresh(self):
+        for symbol, timeframe in self.series:
+            try:
+                ohlcv = self.db_manager.query_ohlcv_arrays(measurement=timeframe, symbol=symbol,
+                                                           time_range_start=self.time_range_start)
+                if len(ohlcv) < 10:
+                    continue
+                self.publish(symbol, timeframe, ohlcv)
+            except Exception as e:
+                logger.error(f"Failed to refresh Chan snapshot for {symbol} {timeframe}: {e}", exc_info=True)
+
+    def run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name='chan-snapshots', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_app(store: ChanSnapshotStore, archive: Optional[ChanArchive] = None) -> Flask:
+    app = Flask(__name__)
+    app.register_blueprint(create_blueprint(store, archive))
+    return app
+
+
+def main():
+    from config import config
+    from local_store import create_storage
+    from chan_levels import create_chan_levels
+    from chan_window import create_chan_windows
+    from signal_detector import SignalDetector
+
+    db_manager = create_storage(config.STORAGE_BACKEND, config.LOCAL_STORE_PATH, {
+        'url': config.INFLUXDB_URL, 'token': config.INFLUXDB_TOKEN, 'org': config.INFLUXDB_ORG,
+        'bucket': config.INFLUXDB_BUCKET, 'tiers': config.INFLUXDB_TIERS})
+    symbols = [s for s in config.SCAN_SYMBOLS.split(',') if s and s != 'all'] or [config.SYMBOL]
+    store = ChanSnapshotStore()
+    chan_windows = create_chan_windows(config.CHAN_WINDOW_CENTERS, config.CHAN_WINDOW_BARS, config.CHAN_ARCHIVE_PATH)
+    detector = SignalDetector(enabled_detectors=config.ENABLED_DETECTORS, chan_windows=chan_windows,
+                              chan_levels=create_chan_levels(config.CHAN_LEVELS))
+    service = ChanSnapshotService(store, db_manager, detector, [(s, tf) for s in symbols for tf in config.TIMEFRAMES],
+                                  interval=config.CHAN_API_REFRESH_SECONDS)
+    service.start()
+    create_app(store, chan_windows.archive if chan_windows is not None else None).run(host=config.API_HOST, port=config.API_PORT, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
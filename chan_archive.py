@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Column layout of each structure kind; records are sent as arrays in this order.
+FIELDS = {
+    'strokes': ('start_time', 'end_time', 'direction', 'high', 'low'),
+    'segments': ('start_time', 'end_time', 'direction', 'high', 'low', 'strokes'),
+    'centers': ('start_time', 'end_time', 'zg', 'zd', 'high', 'low'),
+    'points': ('time', 'type', 'price'),
+    'signals': ('time', 'source', 'direction'),
+    'level_segments': ('start_time', 'end_time', 'level', 'direction', 'high', 'low'),
+    'trends': ('start_time', 'end_time', 'level', 'direction', 'centers', 'high', 'low'),
+}
+
+Record = Tuple[Any, ...]
+
+
+def _direction(value: str) -> int:
+    if value == 'consolidation':
+        return 0
+    return 1 if value in ('up', 'bullish') else -1
+
+
+def serialize_structures(chan: Tuple[List[Any], List[Any], List[Any], List[Any]],
+                         signals: Optional[Dict[str, Dict[str, np.ndarray]]] = None,
+                         timestamps: Optional[np.ndarray] = None,
+                         levels: Optional[List[Any]] = None) -> Dict[str, List[Record]]:
+    """
+    Flattens ChanAnalyzer.analyze output (and optionally SignalDetector.detect_all_series masks and
+    the derived chan_levels.ChanLevel list) into compact, time-sorted records. The first column of
+    every record is its time key; trend direction 0 marks a consolidation.
+    """
+    strokes, segments, centers, points = chan
+    records = {
+        'strokes': [(int(s.start_fractal.kline.time), int(s.end_fractal.kline.time), _direction(s.direction),
+                     float(s.high), float(s.low)) for s in strokes],
+        'segments': [(int(s.start_time), int(s.end_time), _direction(s.direction), float(s.high), float(s.low),
+                      len(s.strokes)) for s in segments],
+        'centers': [(int(c.start_time), int(c.end_time), float(c.zg), float(c.zd), float(c.high), float(c.low))
+                    for c in centers],
+        'points': [(int(p.time), p.point_type, float(p.price)) for p in points],
+        'signals': [],
+        'level_segments': [(int(s.start_time), int(s.end_time), level.level, _direction(s.direction), float(s.high),
+                            float(s.low)) for level in levels or [] for s in level.segments],
+        'trends': [(int(t.start_time), int(t.end_time), level.level, _direction(t.kind), len(t.centers),
+                    float(t.high), float(t.low)) for level in levels or [] for t in level.trends],
+    }
+    if signals is not None and timestamps is not None:
+        for source, masks in signals.items():
+            for direction, mask in masks.items():
+                records['signals'].extend((int(t), source, _direction(direction)) for t in timestamps[np.flatnonzero(mask)])
+    for kind in records:
+        records[kind].sort(key=lambda r: r[0])
+    return records
+
+
+class ChanArchive:
+    """
+    On-disk archive of finalized Chan structures, filled by ChanWindow when it evicts them from
+    memory. Records are stored in the serialize_structures layout in a SQLite file indexed by
+    (symbol, timeframe, kind, time), so API and backtest consumers can page them back in without
+    loading a whole series.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS structures (
+                                      seq INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT NOT NULL,
+                                      timeframe TEXT NOT NULL, kind TEXT NOT NULL, time INTEGER NOT NULL,
+                                      record TEXT NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS structures_series ON structures (symbol, timeframe, kind, time, seq)")
+            if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'structures_unique'").fetchone():
+                # Archives written before the unique index may hold the same record several times (one
+                # copy per restart); keep the oldest copy so existing cursors stay valid.
+                self._conn.execute("""DELETE FROM structures WHERE seq NOT IN (
+                                          SELECT MIN(seq) FROM structures GROUP BY symbol, timeframe, kind, time, record)""")
+                self._conn.execute("CREATE UNIQUE INDEX structures_unique ON structures (symbol, timeframe, kind, time, record)")
+
+    def append(self, symbol: str, timeframe: str, records: Dict[str, List[Record]]) -> int:
+        """
+        Appends finalized records (as returned by serialize_structures); returns how many were written.
+        Records already archived (e.g. evicted again after a restart) are skipped.
+        """
+        rows = [(symbol, timeframe, kind, int(r[0]), json.dumps(r, separators=(',', ':')))
+                for kind, kind_records in records.items() for r in kind_records]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO structures (symbol, timeframe, kind, time, record) VALUES (?, ?, ?, ?, ?)", rows)
+            return self._conn.total_changes - before
+
+    def page(self, symbol: str, timeframe: str, kind: str, start: Optional[int] = None, end: Optional[int] = None,
+             after: Optional[int] = None, limit: int = 500) -> Dict[str, Any]:
+        """
+        Archived records of one kind in [start, end), oldest first. `after` is the next_cursor of the
+        previous page; archived records never change, so a plain sequence number is a stable cursor.
+        Raises ValueError for a limit below 1.
+        """
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        query = "SELECT seq, record FROM structures WHERE symbol = ? AND timeframe = ? AND kind = ?"
+        params: List[Any] = [symbol, timeframe, kind]
+        if start is not None:
+            query += " AND time >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND time < ?"
+            params.append(end)
+        if after is not None:
+            # Resume after the cursor row: later time, or same time with a larger sequence number.
+            query += " AND (time, seq) > (SELECT time, seq FROM structures WHERE seq = ?)"
+            params.append(after)
+        query += " ORDER BY time, seq LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {'fields': FIELDS[kind], 'records': [json.loads(r[1]) for r in rows],
+                'next_cursor': rows[-1][0] if more else None}
+
+    def counts(self, symbol: str, timeframe: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) FROM structures WHERE symbol = ? AND timeframe = ? GROUP BY kind",
+                                      (symbol, timeframe)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
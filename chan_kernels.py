@@ -0,0 +1,226 @@
+import argparse
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+# ================== 顺序内核 ==================
+# 缠论中无法用 NumPy 向量化的顺序步骤，写成“数组进、数组出”的纯函数：只用标量循环和预分配数组。
+# 安装了 numba（可选依赖）时首次调用即编译（cache=True，编译结果缓存在 __pycache__），否则按原样以
+# 纯 Python 运行，两者输出逐元素一致。numba 在首次调用时才导入，不增加启动耗时。
+# 设置环境变量 NUMBA_DISABLE_JIT=1 可在已安装 numba 时强制使用纯 Python。
+
+
+def merge_klines_py(high: np.ndarray, low: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    处理K线包含关系。返回 (index, merged_high, merged_low)：index 为每根合并后K线保留的原始K线下标，
+    被包含的K线并入其前一根（高点取较高者，低点取较高者），合并后再与更前一根比较。
+    """
+    n = len(high)
+    index = np.empty(n, dtype=np.int64)
+    merged_high = np.empty(n, dtype=np.float64)
+    merged_low = np.empty(n, dtype=np.float64)
+    top = 0
+    for j in range(n):
+        index[top] = j
+        merged_high[top] = high[j]
+        merged_low[top] = low[j]
+        top += 1
+        while top >= 2:
+            ph, pl = merged_high[top - 2], merged_low[top - 2]
+            ch, cl = merged_high[top - 1], merged_low[top - 1]
+            if (ph >= ch and pl <= cl) or (ch >= ph and cl <= pl):
+                merged_high[top - 2] = max(ph, ch)
+                merged_low[top - 2] = max(pl, cl)
+                top -= 1
+            else:
+                break
+    return index[:top], merged_high[:top], merged_low[:top]
+
+
+def find_fractals_py(merged_high: np.ndarray, merged_low: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """返回 (position, kind)：分型所在的合并K线下标，kind 为 1（顶分型）或 -1（底分型）；同一根K线先顶后底"""
+    m = len(merged_high)
+    position = np.empty(2 * m, dtype=np.int64)
+    kind = np.empty(2 * m, dtype=np.int8)
+    count = 0
+    for i in range(1, m - 1):
+        if merged_high[i] > merged_high[i - 1] and merged_high[i] > merged_high[i + 1]:
+            position[count] = i
+            kind[count] = 1
+            count += 1
+        if merged_low[i] < merged_low[i - 1] and merged_low[i] < merged_low[i + 1]:
+            position[count] = i
+            kind[count] = -1
+            count += 1
+    return position[:count], kind[:count]
+
+
+def find_strokes_py(position: np.ndarray, kind: np.ndarray, merged_high: np.ndarray, merged_low: np.ndarray,
+                    min_gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    连接分型成笔，返回 (start, end)：每一笔起止分型在 position/kind 中的下标。
+    同类分型取更极端者替换起点；异类分型与起点的合并K线间隔超过 min_gap 时成笔。
+    """
+    f = len(position)
+    start = np.empty(f, dtype=np.int64)
+    end = np.empty(f, dtype=np.int64)
+    count = 0
+    last = -1
+    for k in range(f):
+        if last < 0:
+            last = k
+            continue
+        if kind[k] == kind[last]:
+            if kind[k] == 1 and merged_high[position[k]] > merged_high[position[last]]:
+                last = k
+            elif kind[k] == -1 and merged_low[position[k]] < merged_low[position[last]]:
+                last = k
+            continue
+        if abs(position[k] - position[last]) > min_gap:
+            start[count] = last
+            end[count] = k
+            count += 1
+            last = k
+    return start[:count], end[:count]
+
+
+def find_segments_py(direction: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按方向变化划段：相邻两笔同向时断开，至少三笔的组成为一段。返回每段 (首笔, 末笔) 下标"""
+    n = len(direction)
+    start = np.empty(n, dtype=np.int64)
+    end = np.empty(n, dtype=np.int64)
+    count = 0
+    if n < 3:
+        return start[:0], end[:0]
+    first = 0
+    for i in range(1, n):
+        if direction[i] == direction[i - 1]:
+            if i - first >= 3:
+                start[count] = first
+                end[count] = i - 1
+                count += 1
+            first = i
+    if n - first >= 3:
+        start[count] = first
+        end[count] = n - 1
+        count += 1
+    return start[:count], end[:count]
+
+
+PY_KERNELS: Dict[str, Callable] = {
+    'merge_klines': merge_klines_py,
+    'find_fractals': find_fractals_py,
+    'find_strokes': find_strokes_py,
+    'find_segments': find_segments_py,
+}
+
+_compiled: Dict[str, Callable] = {}
+_compile_lock = threading.Lock()
+
+
+def jit_available() -> bool:
+    """numba 已安装且未被 NUMBA_DISABLE_JIT 关闭"""
+    try:
+        import numba
+    except ImportError:
+        return False
+    return not numba.config.DISABLE_JIT
+
+
+def kernel(name: str) -> Callable:
+    """返回内核的编译版本（numba 不可用时为纯 Python 版本），每个内核只编译一次"""
+    func = _compiled.get(name)
+    if func is None:
+        with _compile_lock:
+            func = _compiled.get(name)
+            if func is None:
+                func = PY_KERNELS[name]
+                if jit_available():
+                    import numba
+                    func = numba.njit(cache=True, nogil=True)(func)
+                _compiled[name] = func
+    return func
+
+
+def merge_klines(high: np.ndarray, low: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return kernel('merge_klines')(high, low)
+
+
+def find_fractals(merged_high: np.ndarray, merged_low: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return kernel('find_fractals')(merged_high, merged_low)
+
+
+def find_strokes(position: np.ndarray, kind: np.ndarray, merged_high: np.ndarray, merged_low: np.ndarray,
+                 min_gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    return kernel('find_strokes')(position, kind, merged_high, merged_low, min_gap)
+
+
+def find_segments(direction: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return kernel('find_segments')(direction)
+
+
+# ================== 差分自检 ==================
+
+def _random_bars(n: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """随机游走K线；价格量化到 0.01，让相等高低点（包含关系的边界）足够常见"""
+    rng = np.random.default_rng(seed)
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n))), 2)
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.round(np.maximum(open_, close) * (1 + rng.uniform(0, 0.004, n)), 2)
+    low = np.round(np.minimum(open_, close) * (1 - rng.uniform(0, 0.004, n)), 2)
+    return high, low
+
+
+def _run_pipeline(kernels: Dict[str, Callable], high: np.ndarray, low: np.ndarray, min_gap: int) -> Tuple[np.ndarray, ...]:
+    index, merged_high, merged_low = kernels['merge_klines'](high, low)
+    position, kind = kernels['find_fractals'](merged_high, merged_low)
+    start, end = kernels['find_strokes'](position, kind, merged_high, merged_low, min_gap)
+    direction = np.where(kind[end] == -1, -1, 1).astype(np.int8)
+    seg_start, seg_end = kernels['find_segments'](direction)
+    return index, merged_high, merged_low, position, kind, start, end, seg_start, seg_end
+
+
+def self_check(cases: int = 50, max_bars: int = 5000, seed: int = 0) -> int:
+    """差分校验：随机序列上编译内核与纯 Python 内核的每个输出数组必须完全相同；返回校验的序列数"""
+    if not jit_available():
+        raise RuntimeError("numba is not installed (or NUMBA_DISABLE_JIT is set); only the pure-Python kernels are available")
+    compiled = {name: kernel(name) for name in PY_KERNELS}
+    rng = np.random.default_rng(seed)
+    for case in range(cases):
+        n = int(rng.integers(0, max_bars))
+        high, low = _random_bars(n, seed + case)
+        min_gap = int(rng.integers(0, 4))
+        expected = _run_pipeline(PY_KERNELS, high, low, min_gap)
+        actual = _run_pipeline(compiled, high, low, min_gap)
+        for name, a, b in zip(('index', 'merged_high', 'merged_low', 'position', 'kind', 'start', 'end',
+                               'seg_start', 'seg_end'), expected, actual):
+            if a.dtype != b.dtype or not np.array_equal(a, b):
+                raise AssertionError(f"kernel mismatch in '{name}' (case {case}, {n} bars, min_gap={min_gap})")
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential check and timing of the Chan kernels.")
+    parser.add_argument('--cases', type=int, default=50, help="random series compared JIT vs pure Python")
+    parser.add_argument('--bars', type=int, default=1_000_000, help="series length for the timing run")
+    args = parser.parse_args()
+
+    jit = jit_available()
+    if jit:
+        print(f"differential check: {self_check(args.cases)} series identical")
+    else:
+        print("JIT unavailable: skipping the differential check, timing the pure-Python kernels")
+    kernels = {name: kernel(name) for name in PY_KERNELS}
+    high, low = _random_bars(args.bars, 1)
+    _run_pipeline(kernels, high[:100], low[:100], 1)  # 编译（或读取缓存）不计入计时
+    started = time.perf_counter()
+    result = _run_pipeline(kernels, high, low, 1)
+    elapsed = time.perf_counter() - started
+    print(f"{args.bars} bars -> {len(result[1])} merged, {len(result[3])} fractals, {len(result[5])} strokes "
+          f"in {elapsed * 1000:.1f} ms ({'numba' if jit else 'pure Python'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from chan import Center, ChanAnalyzer, Segment, Stroke
+
+# ================== 数据结构定义 ==================
+
+@dataclass
+class TrendType:
+    """走势类型：同向排列的两个及以上中枢为趋势，单个中枢为盘整"""
+    kind: str  # 'up'、'down' 或 'consolidation'
+    centers: List[Center]
+    start_time: any
+    end_time: any
+    high: float
+    low: float
+
+
+@dataclass
+class ChanLevel:
+    """
+    一个级别的结构。level 1 以基础周期的笔为“笔”，level N+1 以 level N 的段为“笔”；
+    segments 中前 confirmed 个已被反向三笔确认，其后（至多一个）为尚在延伸的段。
+    """
+    level: int
+    strokes: List[Stroke]
+    segments: List[Segment]
+    centers: List[Center]
+    trends: List[TrendType]
+    confirmed: int = 0
+
+
+def segment_as_stroke(segment: Segment) -> Stroke:
+    """把本级别的段视为上一级别的一笔（起止分型取自段的首尾笔）"""
+    return Stroke(start_fractal=segment.strokes[0].start_fractal, end_fractal=segment.strokes[-1].end_fractal,
+                  direction=segment.direction, high=segment.high, low=segment.low)
+
+
+def _stroke_key(stroke: Stroke) -> Tuple:
+    return (stroke.start_fractal.kline.time, stroke.end_fractal.kline.time, stroke.direction, stroke.high, stroke.low)
+
+
+def _beyond(a: Stroke, b: Stroke, direction: str) -> bool:
+    """a 是否在 direction 方向上创出比 b 更极端的价格"""
+    return a.high > b.high if direction == 'up' else a.low < b.low
+
+
+def _opposite(direction: str) -> str:
+    return 'down' if direction == 'up' else 'up'
+
+
+# ================== 线段划分（可续算） ==================
+
+@dataclass
+class _Checkpoint:
+    """某段被确认后的扫描状态；horizon 为确认时读到的最后一笔下标"""
+    horizon: int
+    count: int
+    start: int
+    direction: str
+
+
+@dataclass
+class _SegmentScan:
+    """单个级别的划分状态，保存确认点以便输入笔只在尾部变化时从最近的确认点续算"""
+    keys: List[Tuple] = field(default_factory=list)
+    spans: List[Tuple[int, int, str]] = field(default_factory=list)  # 已确认段 (首笔, 末笔, 方向)
+    segments: List[Segment] = field(default_factory=list)
+    checkpoints: List[_Checkpoint] = field(default_factory=list)
+
+    def update(self, strokes: List[Stroke]) -> Tuple[List[Segment], int]:
+        """并入新的笔序列，返回 (段列表, 已确认段数)"""
+        keys = [_stroke_key(s) for s in strokes]
+        common = 0
+        for old, new in zip(self.keys, keys):
+            if old != new:
+                break
+            common += 1
+        self.keys = keys
+        while self.checkpoints and self.checkpoints[-1].horizon >= common:
+            self.checkpoints.pop()
+        if self.checkpoints:
+            cp = self.checkpoints[-1]
+            del self.spans[cp.count:], self.segments[cp.count:]
+            start, direction = cp.start, cp.direction
+        else:
+            self.spans, self.segments = [], []
+            start, direction = 0, strokes[0].direction if strokes else 'up'
+        pending = self._scan(strokes, start, direction)
+
+        segments = list(self.segments)
+        if pending is not None:
+            segments.append(self._segment(strokes, *pending))
+        return segments, len(self.segments)
+
+    def _segment(self, strokes: List[Stroke], first: int, last: int, direction: str) -> Segment:
+        members = strokes[first:last + 1]
+        return Segment(strokes=members, direction=direction, start_time=members[0].start_fractal.kline.time,
+                       end_time=members[-1].end_fractal.kline.time, high=max(s.high for s in members),
+                       low=min(s.low for s in members))
+
+    def _scan(self, strokes: List[Stroke], start: int, direction: str) -> Optional[Tuple[int, int, str]]:
+        """
+        从 start 起按方向 direction 划段：同向笔不断创新高（低）时段延伸；极值笔之后出现反向三笔、
+        且其中的反向笔突破极值后第一笔的端点时，段在极值笔处结束并从下一笔开始反向段。
+        返回尚未确认的末段 (首笔, 末笔, 方向)，不足三笔时为 None。
+        """
+        n = len(strokes)
+        while start < n:
+            peak, q, confirmed = start, start + 1, False
+            while q < n:
+                stroke = strokes[q]
+                if (q - start) % 2 == 0:
+                    if _beyond(stroke, strokes[peak], direction):
+                        peak = q
+                elif not self.spans and _beyond(stroke, strokes[start], _opposite(direction)):
+                    # 首段起点被反向突破：起点选错，顺延一笔并改变方向
+                    break
+                elif peak >= start + 2 and q >= peak + 3 and \
+                        _beyond(stroke, strokes[peak + 1], _opposite(direction)):
+                    confirmed = True
+                    break
+                q += 1
+            if q >= n:
+                return (start, peak, direction) if peak >= start + 2 else None
+            if not confirmed:
+                start, direction = start + 1, _opposite(direction)
+                continue
+            self.spans.append((start, peak, direction))
+            self.segments.append(self._segment(strokes, start, peak, direction))
+            start, direction = peak + 1, _opposite(direction)
+            self.checkpoints.append(_Checkpoint(horizon=q, count=len(self.spans), start=start, direction=direction))
+        return None
+
+
+# ================== 中枢与走势类型 ==================
+
+def merge_centers(centers: List[Center]) -> List[Center]:
+    """把区间 [zd, zg] 与前一中枢重叠的中枢并入前者（中枢延伸），区间沿用最初的中枢"""
+    merged: List[Center] = []
+    for center in centers:
+        last = merged[-1] if merged else None
+        if last is not None and center.zd < last.zg and center.zg > last.zd:
+            extra = [s for s in center.segments if not any(s is t for t in last.segments)]
+            merged[-1] = Center(segments=last.segments + extra, start_time=last.start_time, end_time=center.end_time,
+                                zg=last.zg, zd=last.zd, high=max(last.high, center.high), low=min(last.low, center.low))
+        else:
+            merged.append(center)
+    return merged
+
+
+def find_trend_types(centers: List[Center]) -> List[TrendType]:
+    """
+    由（已合并的）中枢序列划分走势类型：后一中枢整体高于前一中枢为上涨、整体低于为下跌，
+    同向连续的中枢组成一个趋势，相邻趋势共用转折处的中枢；只有一个中枢时为盘整。
+    """
+    def build(kind: str, group: List[Center]) -> TrendType:
+        return TrendType(kind=kind, centers=group, start_time=group[0].start_time, end_time=group[-1].end_time,
+                         high=max(c.high for c in group), low=min(c.low for c in group))
+
+    if len(centers) == 1:
+        return [build('consolidation', centers)]
+    trends: List[TrendType] = []
+    group, kind = centers[:1], None
+    for prev, curr in zip(centers, centers[1:]):
+        step = 'up' if curr.zd >= prev.zg else 'down'
+        if kind is not None and step != kind:
+            trends.append(build(kind, group))
+            group = [prev]
+        group.append(curr)
+        kind = step
+    if kind is not None:
+        trends.append(build(kind, group))
+    return trends
+
+
+# ================== 多级别递归 ==================
+
+class ChanLevelBuilder:
+    """
+    从一次基础周期分析得到的笔递归构造多级别结构：每一级的段作为上一级的笔，再划段、找中枢、
+    分走势类型，各级别由同一组笔导出，天然一致。update 时逐级比较输入笔，只从最后一个不受
+    变化影响的确认点续算，因此基础级别只在尾部变化时，高级别的更新代价与历史长度基本无关。
+    """
+
+    def __init__(self, depth: int = 3, analyzer: Optional[ChanAnalyzer] = None):
+        """
+        Args:
+            depth: 构造的级别数（level 1 .. depth）
+            analyzer: 用于找中枢的 ChanAnalyzer
+        """
+        self.depth = depth
+        self.analyzer = analyzer or ChanAnalyzer()
+        self._scans = [_SegmentScan() for _ in range(depth)]
+        self._lock = threading.Lock()
+
+    def update(self, strokes: List[Stroke]) -> List[ChanLevel]:
+        """以最新的基础笔序列更新各级别；某一级别的段不足以构成上一级别的笔时停止"""
+        levels = []
+        with self._lock:
+            for level, scan in enumerate(self._scans, start=1):
+                segments, confirmed = scan.update(strokes)
+                centers = self.analyzer.find_centers(segments)
+                levels.append(ChanLevel(level=level, strokes=strokes, segments=segments, centers=centers,
+                                        trends=find_trend_types(merge_centers(centers)), confirmed=confirmed))
+                if len(segments) < 3:
+                    break
+                strokes = [segment_as_stroke(s) for s in segments]
+        return levels
+
+
+def build_levels(strokes: List[Stroke], depth: int = 3, analyzer: Optional[ChanAnalyzer] = None) -> List[ChanLevel]:
+    """一次性构造多级别结构（不保留续算状态）"""
+    return ChanLevelBuilder(depth, analyzer).update(strokes)
+
+
+class ChanLevelRegistry:
+    """按 (symbol, timeframe) 保存 ChanLevelBuilder；可作为 SignalDetector 的 chan_levels"""
+
+    def __init__(self, depth: int = 3, analyzer: Optional[ChanAnalyzer] = None):
+        self.depth = depth
+        self.analyzer = analyzer or ChanAnalyzer()
+        self._builders: Dict[Tuple[str, str], ChanLevelBuilder] = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol: str, timeframe: str, strokes: List[Stroke]) -> List[ChanLevel]:
+        with self._lock:
+            builder = self._builders.get((symbol, timeframe))
+            if builder is None:
+                builder = self._builders[(symbol, timeframe)] = ChanLevelBuilder(self.depth, self.analyzer)
+        return builder.update(strokes)
+
+
+def create_chan_levels(depth: int, analyzer: Optional[ChanAnalyzer] = None) -> Optional[ChanLevelRegistry]:
+    """按配置创建多级别构造器；depth 为 0 时返回 None（'chan_levels' 节点退回一次性构造）"""
+    return ChanLevelRegistry(depth, analyzer) if depth > 0 else None
@@ -0,0 +1,198 @@
+import sys
+import threading
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import indicators as ind
+from chan import ChanAnalyzer
+from chan_archive import ChanArchive, serialize_structures
+from logging_config import logger
+from ohlcv import OHLCV_FIELDS, OHLCVArrays, as_columns, merge_bars
+
+# 重新分析时保留在截断点之前的K线数：让截断点上的分型仍能被识别
+_CONTEXT_BARS = 1
+
+ChanResult = Tuple[List[Any], List[Any], List[Any], List[Any]]
+
+
+@dataclass
+class WindowMemory:
+    """单个 (symbol, timeframe) 窗口的内存占用统计"""
+    bars: int
+    strokes: int
+    segments: int
+    centers: int
+    points: int
+    archived: int
+    nbytes: int
+
+
+def _deep_size(objects: List[Any]) -> int:
+    """估算一组缠论结构（dataclass / 列表 / 标量）的总字节数，共享对象只计一次"""
+    seen = set()
+    total = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if is_dataclass(obj):
+            total += sys.getsizeof(obj.__dict__)
+            stack.extend(getattr(obj, f.name) for f in fields(obj))
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return total
+
+
+def _start_time(item: Any) -> int:
+    if hasattr(item, 'start_fractal'):
+        return item.start_fractal.kline.time
+    return item.start_time if hasattr(item, 'start_time') else item.time
+
+
+class ChanWindow:
+    """
+    单个 (symbol, timeframe) 的有界缠论工作窗口。
+
+    每次 update 只对截断点之后的K线做缠论分析；当已完成的中枢超过 max_centers 个，或窗口内
+    K线超过 bar_budget 根时，截断点前移：起点早于截断点的笔、段、中枢和买卖点视为定稿，
+    写入 archive（如有）后从内存淘汰，K线也只保留截断点之后的部分（外加 MACD 预热所需的
+    warmup_bars 根）。因此常驻内存与历史长度无关。截断点之后的结构从截断点重新起算，
+    与全量分析在截断点附近可能略有差异。
+    """
+
+    def __init__(self, analyzer: ChanAnalyzer, symbol: str, timeframe: str, max_centers: int = 3,
+                 bar_budget: int = 1000, warmup_bars: int = 100, archive: Optional[ChanArchive] = None):
+        """
+        Args:
+            analyzer: 使用的 ChanAnalyzer
+            max_centers: 保留最近的中枢个数（0 表示不按中枢截断）
+            bar_budget: 截断点之后最多保留的K线根数（0 表示不按K线截断）
+            warmup_bars: 截断点之前额外保留、仅用于 MACD 预热的K线根数
+            archive: 定稿结构的落盘归档，None 时直接丢弃
+        """
+        self.analyzer = analyzer
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.max_centers = max_centers
+        self.bar_budget = bar_budget
+        self.warmup_bars = warmup_bars
+        self.archive = archive
+        self.cut: Optional[int] = None  # 定稿边界时间戳，早于它开始的结构已淘汰
+        self.archived = 0
+        self._bars: Optional[OHLCVArrays] = None
+        self._result: ChanResult = ([], [], [], [])
+        self._lock = threading.Lock()
+
+    @property
+    def result(self) -> ChanResult:
+        """当前工作窗口内的 (strokes, segments, centers, buy_sell_points)"""
+        return self._result
+
+    def update(self, ohlcv: Any) -> ChanResult:
+        """并入新K线（全量历史或最近一段均可），重新分析工作窗口并按需定稿淘汰"""
+        fresh = as_columns(ohlcv)
+        with self._lock:
+            if self._bars is not None and len(self._bars) and len(fresh):
+                # 已淘汰区间的K线不再并入
+                fresh = fresh[int(np.searchsorted(fresh.timestamp, self._bars.timestamp[0], side='left')):]
+            keep = len(fresh) + (len(self._bars) if self._bars is not None else 0)
+            self._bars = merge_bars(self._bars, fresh, keep)
+            self._result = self._analyze()
+            self._finalize()
+            return self._result
+
+    def _window_start(self) -> int:
+        if self.cut is None:
+            return 0
+        return int(np.searchsorted(self._bars.timestamp, self.cut, side='left'))
+
+    def _analyze(self) -> ChanResult:
+        bars = self._bars
+        start = max(0, self._window_start() - _CONTEXT_BARS)
+        macd_hist = ind.macd(bars.close)['macd_hist'][start:]
+        strokes, segments, centers, points = self.analyzer.analyze(bars[start:], macd_hist)
+        if self.cut is None:
+            return strokes, segments, centers, points
+        return tuple([x for x in items if _start_time(x) >= self.cut]
+                     for items in (strokes, segments, centers, points))
+
+    def _finalize(self):
+        strokes, segments, centers, points = self._result
+        cut = None
+        if self.max_centers and len(centers) > self.max_centers:
+            cut = centers[-self.max_centers].start_time
+        start = self._window_start()
+        if self.bar_budget and len(self._bars) - start > self.bar_budget:
+            budget_cut = int(self._bars.timestamp[-self.bar_budget])
+            cut = budget_cut if cut is None else max(cut, budget_cut)
+        if cut is None or (self.cut is not None and cut <= self.cut):
+            return
+
+        done = tuple([x for x in items if _start_time(x) < cut] for items in self._result)
+        self._result = tuple([x for x in items if _start_time(x) >= cut] for items in self._result)
+        if self.archive is not None:
+            try:
+                self.archived += self.archive.append(self.symbol, self.timeframe, serialize_structures(done))
+            except Exception as e:
+                logger.error(f"Failed to archive Chan structures for {self.symbol} {self.timeframe}: {e}")
+        self.cut = int(cut)
+        keep_from = max(0, int(np.searchsorted(self._bars.timestamp, self.cut, side='left')) - self.warmup_bars)
+        # 复制而非视图，让被截掉的K线内存真正释放
+        self._bars = OHLCVArrays(*(np.array(getattr(self._bars, f)[keep_from:]) for f in OHLCV_FIELDS))
+
+    def memory(self) -> WindowMemory:
+        """窗口当前的结构数量与估算字节数（K线列 + 结构对象）"""
+        with self._lock:
+            strokes, segments, centers, points = self._result
+            nbytes = (self._bars.nbytes if self._bars is not None else 0) + _deep_size([strokes, segments, centers, points])
+            return WindowMemory(bars=len(self._bars) if self._bars is not None else 0, strokes=len(strokes),
+                                segments=len(segments), centers=len(centers), points=len(points),
+                                archived=self.archived, nbytes=nbytes)
+
+
+class ChanWindowRegistry:
+    """按 (symbol, timeframe) 管理 ChanWindow，并汇总内存占用；可作为 SignalDetector 的 chan_windows"""
+
+    def __init__(self, analyzer: Optional[ChanAnalyzer] = None, max_centers: int = 3, bar_budget: int = 1000,
+                 warmup_bars: int = 100, archive: Optional[ChanArchive] = None):
+        self.analyzer = analyzer or ChanAnalyzer()
+        self.max_centers = max_centers
+        self.bar_budget = bar_budget
+        self.warmup_bars = warmup_bars
+        self.archive = archive
+        self._windows: Dict[Tuple[str, str], ChanWindow] = {}
+        self._lock = threading.Lock()
+
+    def window(self, symbol: str, timeframe: str) -> ChanWindow:
+        with self._lock:
+            window = self._windows.get((symbol, timeframe))
+            if window is None:
+                window = ChanWindow(self.analyzer, symbol, timeframe, self.max_centers, self.bar_budget,
+                                    self.warmup_bars, self.archive)
+                self._windows[(symbol, timeframe)] = window
+            return window
+
+    def update(self, symbol: str, timeframe: str, ohlcv: Any) -> ChanResult:
+        return self.window(symbol, timeframe).update(ohlcv)
+
+    def memory(self) -> Dict[Tuple[str, str], WindowMemory]:
+        with self._lock:
+            windows = dict(self._windows)
+        return {key: window.memory() for key, window in windows.items()}
+
+    def total_bytes(self) -> int:
+        return sum(m.nbytes for m in self.memory().values())
+
+
+def create_chan_windows(max_centers: int, bar_budget: int, archive_path: str = '',
+                        analyzer: Optional[ChanAnalyzer] = None) -> Optional[ChanWindowRegistry]:
+    """按配置创建有界窗口；max_centers 与 bar_budget 均为 0 时返回 None（保持全量分析）"""
+    if not max_centers and not bar_budget:
+        return None
+    archive = ChanArchive(archive_path) if archive_path else None
+    return ChanWindowRegistry(analyzer, max_centers=max_centers, bar_budget=bar_budget, archive=archive)
@@ -1,17 +1,37 @@
 import os
 from dataclasses import dataclass
+from typing import Dict, List
+
+
+def _parse_timeframe_lists(value: str) -> Dict[str, List[str]]:
+    """Parses '1h=macd,rsi;4h=chan' into {'1h': ['macd', 'rsi'], '4h': ['chan']}."""
+    result = {}
+    for entry in filter(None, (part.strip() for part in value.split(';'))):
+        timeframe, _, names = entry.partition('=')
+        result[timeframe.strip()] = [n.strip() for n in names.split(',') if n.strip()]
+    return result
+
 
 @dataclass
 class Config:
     # Telegram Bot settings
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
     TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID', '')
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')  # e.g. a local stub for load tests
 
     # InfluxDB settings
     INFLUXDB_URL = os.getenv('INFLUXDB_URL')
     INFLUXDB_TOKEN = os.getenv('INFLUXDB_TOKEN')
     INFLUXDB_ORG = os.getenv('INFLUXDB_ORG')
     INFLUXDB_BUCKET = os.getenv('INFLUXDB_BUCKET')
+    # Optional downsampling/retention tiers, '<timeframe>:<retention>' with the base tier first,
+    # e.g. '1h:90d,1d:1825d,1w:0' (0 = keep forever). Empty keeps the single-bucket layout.
+    INFLUXDB_TIERS = os.getenv('INFLUXDB_TIERS', '')
+
+    # Storage backend: 'influxdb', 'local' (embedded column files, no InfluxDB needed)
+    # or 'cached' (local read-through cache in front of InfluxDB).
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'influxdb')
+    LOCAL_STORE_PATH = os.getenv('LOCAL_STORE_PATH', 'data/bars')
     
     # Exchange settings
     EXCHANGE = 'binance'
@@ -22,6 +42,85 @@ class Config:
     # Trading settings
     SYMBOL = os.getenv('SYMBOL', 'ETH/USDT')
 
+    # Scanner mode: when SCAN_SYMBOLS is set ('all' = every USDT swap, or 'BTC/USDT,SOL/USDT,...'),
+    # each cycle scans the whole universe and sends one ranked digest instead of single-symbol alerts.
+    SCAN_SYMBOLS = os.getenv('SCAN_SYMBOLS', '')
+    SCAN_CONCURRENCY = int(os.getenv('SCAN_CONCURRENCY', '16'))
+    SCAN_TOP_N = int(os.getenv('SCAN_TOP_N', '20'))
+    SCAN_HISTORY_LIMIT = int(os.getenv('SCAN_HISTORY_LIMIT', '500'))
+
+    # Streaming mode: subscribe to kline WebSocket streams and analyse on every candle close instead of
+    # polling every SCHEDULE_MINUTES. STREAM_INTRABAR_SECONDS > 0 also evaluates open candles at that rate.
+    STREAMING = os.getenv('STREAMING', 'false').lower() in ('1', 'true', 'yes')
+    STREAM_URL = os.getenv('STREAM_URL', 'wss://fstream.binance.com/stream')
+    STREAM_INTRABAR_SECONDS = float(os.getenv('STREAM_INTRABAR_SECONDS', '0'))
+    # Timeframes built locally from the aggTrade stream instead of exchange klines, e.g. '1m,5m,15m'.
+    STREAM_TRADE_TIMEFRAMES = [tf for tf in os.getenv('STREAM_TRADE_TIMEFRAMES', '').split(',') if tf]
+    # Order book recording: a local L2 book per symbol from the diff-depth stream, recorded delta-encoded
+    # to ORDERBOOK_PATH (empty = features only) and sampled every second into per-bar features (imbalance,
+    # depth within ORDERBOOK_BAND_BPS of the mid, stacked levels) for the 'orderflow' detector.
+    ORDERBOOK = os.getenv('ORDERBOOK', 'false').lower() in ('1', 'true', 'yes')
+    ORDERBOOK_PATH = os.getenv('ORDERBOOK_PATH', 'data/orderbook')
+    ORDERBOOK_BAND_BPS = float(os.getenv('ORDERBOOK_BAND_BPS', '10'))
+    ORDERBOOK_STACK_MULTIPLE = float(os.getenv('ORDERBOOK_STACK_MULTIPLE', '5'))
+    ORDERBOOK_LEVELS = int(os.getenv('ORDERBOOK_LEVELS', '1000'))
+    ORDERBOOK_KEYFRAME_SECONDS = float(os.getenv('ORDERBOOK_KEYFRAME_SECONDS', '60'))
+
+    # Sharding: several bot instances split the (symbol, timeframe) shards through leases in a shared
+    # backend, so each shard is fetched, analysed and alerted by exactly one instance.
+    SHARDING = os.getenv('SHARDING', 'false').lower() in ('1', 'true', 'yes')
+    SHARD_BACKEND = os.getenv('SHARD_BACKEND', 'sqlite')
+    SHARD_DB_PATH = os.getenv('SHARD_DB_PATH', 'data/shards.db')
+    SHARD_LEASE_SECONDS = float(os.getenv('SHARD_LEASE_SECONDS', '30'))
+    INSTANCE_ID = os.getenv('INSTANCE_ID', '')  # defaults to hostname-pid
+
+    # Strategy channel: when set, bot.py appends each strategy to this append-only log and the notifier
+    # process (python strategy_notifier.py) delivers it. The xlsx table is then only an optional export.
+    STRATEGY_CHANNEL_PATH = os.getenv('STRATEGY_CHANNEL_PATH', '')
+    STRATEGY_XLSX_EXPORT = os.getenv('STRATEGY_XLSX_EXPORT', '')  # e.g. 'ETH_动态挂单表.xlsx'
+    STRATEGY_XLSX_EXPORT_SECONDS = float(os.getenv('STRATEGY_XLSX_EXPORT_SECONDS', '300'))
+
+    # Bar integrity: a background pass every GAP_REPAIR_INTERVAL_SECONDS finds holes in the stored series
+    # (within GAP_SCAN_RANGE) and fetches only the missing ranges. GAP_POLICY decides what analysis does
+    # with a window that still has gaps: 'flag' (log and analyse), 'refuse' (skip) or 'off'.
+    GAP_REPAIR = os.getenv('GAP_REPAIR', 'false').lower() in ('1', 'true', 'yes')
+    GAP_SCAN_RANGE = os.getenv('GAP_SCAN_RANGE', '-365d')
+    GAP_REPAIR_INTERVAL_SECONDS = float(os.getenv('GAP_REPAIR_INTERVAL_SECONDS', '3600'))
+    GAP_POLICY = os.getenv('GAP_POLICY', 'flag')
+
+    # Derivatives ingestion: funding rate, open interest and long/short ratio for every analysed symbol,
+    # refreshed in the background every DERIVATIVES_REFRESH_SECONDS, stored next to the bars and aligned
+    # to each timeframe's bars for the 'derivatives' detector. DERIVATIVES_PERIOD is the sampling period
+    # of open interest and long/short ratio (funding settles every 8h).
+    DERIVATIVES = os.getenv('DERIVATIVES', 'false').lower() in ('1', 'true', 'yes')
+    DERIVATIVES_METRICS = [m.strip() for m in os.getenv('DERIVATIVES_METRICS', 'funding,open_interest,long_short').split(',') if m.strip()]
+    DERIVATIVES_PERIOD = os.getenv('DERIVATIVES_PERIOD', '1h')
+    DERIVATIVES_REFRESH_SECONDS = float(os.getenv('DERIVATIVES_REFRESH_SECONDS', '300'))
+    DERIVATIVES_CONCURRENCY = int(os.getenv('DERIVATIVES_CONCURRENCY', '8'))
+    DERIVATIVES_LOOKBACK_DAYS = int(os.getenv('DERIVATIVES_LOOKBACK_DAYS', '30'))
+    # The 'derivatives' detector runs on this one timeframe unless ENABLED_DETECTORS lists it elsewhere, since
+    # the metrics are the same for every timeframe of a symbol. Empty: DERIVATIVES_PERIOD if it is analysed,
+    # else the first configured timeframe.
+    DERIVATIVES_TIMEFRAME = os.getenv('DERIVATIVES_TIMEFRAME', '')
+
+    # Cross-asset analytics: rolling return correlation, beta and relative-strength rank of every symbol in
+    # CROSS_ASSET_SYMBOLS (defaults to the scanner universe, else SYMBOL) against CROSS_ASSET_BENCHMARK, per
+    # timeframe over CROSS_ASSET_WINDOW bars, for the 'crossasset' detector (decoupling, RS breakouts).
+    # The benchmark must be spelled as in the universe (e.g. 'BTC/USDT:USDT' with SCAN_SYMBOLS=all).
+    CROSS_ASSET = os.getenv('CROSS_ASSET', 'false').lower() in ('1', 'true', 'yes')
+    CROSS_ASSET_SYMBOLS = os.getenv('CROSS_ASSET_SYMBOLS', '')
+    CROSS_ASSET_BENCHMARK = os.getenv('CROSS_ASSET_BENCHMARK', 'BTC/USDT')
+    CROSS_ASSET_WINDOW = int(os.getenv('CROSS_ASSET_WINDOW', '100'))
+    CROSS_ASSET_REFRESH_SECONDS = float(os.getenv('CROSS_ASSET_REFRESH_SECONDS', '60'))
+    CROSS_ASSET_CONCURRENCY = int(os.getenv('CROSS_ASSET_CONCURRENCY', '8'))
+
+    # Signal journal: every emitted signal and computed Chan buy/sell point is buffered and written in
+    # batches (SIGNAL_JOURNAL_BATCH rows, or every SIGNAL_JOURNAL_FLUSH_SECONDS) to the storage backend's
+    # 'signal_journal' measurement; read it back with `python signal_journal.py SYMBOL --since -7d`.
+    SIGNAL_JOURNAL = os.getenv('SIGNAL_JOURNAL', 'false').lower() in ('1', 'true', 'yes')
+    SIGNAL_JOURNAL_BATCH = int(os.getenv('SIGNAL_JOURNAL_BATCH', '500'))
+    SIGNAL_JOURNAL_FLUSH_SECONDS = float(os.getenv('SIGNAL_JOURNAL_FLUSH_SECONDS', '5'))
+
     # Scheduler settings
     SCHEDULE_MINUTES = int(os.getenv('SCHEDULE_MINUTES', '5'))
     
@@ -33,6 +132,20 @@ class Config:
         '1w': '1w'
     }
     
+    # Bounded Chan analysis for long-running multi-symbol processes: keep only the last
+    # CHAN_WINDOW_CENTERS centers / CHAN_WINDOW_BARS bars per series in memory (0 and 0 = full history).
+    # Evicted structures are archived to CHAN_ARCHIVE_PATH (SQLite) when set, else dropped.
+    CHAN_WINDOW_CENTERS = int(os.getenv('CHAN_WINDOW_CENTERS', '0'))
+    CHAN_WINDOW_BARS = int(os.getenv('CHAN_WINDOW_BARS', '0'))
+    CHAN_ARCHIVE_PATH = os.getenv('CHAN_ARCHIVE_PATH', '')
+    # Higher Chan levels derived recursively from each series' own strokes (level N segments are the
+    # strokes of level N+1), updated incrementally per series; 0 disables them in chan_api snapshots.
+    CHAN_LEVELS = int(os.getenv('CHAN_LEVELS', '3'))
+
+    # Detectors enabled per timeframe, e.g. '1h=macd,rsi,volume;1d=chan'.
+    # Timeframes not listed run every registered detector.
+    ENABLED_DETECTORS = _parse_timeframe_lists(os.getenv('ENABLED_DETECTORS', ''))
+
     # Signal thresholds
     MIN_SIGNALS_FOR_HEAVY_POSITION = 3
     MIN_RISK_REWARD_RATIO = 3.0
@@ -48,5 +161,7 @@ class Config:
     API_HOST = '0.0.0.0'
     API_PORT = 5000
     API_DEBUG = True
+    # chan_api.py re-reads storage and re-analyses changed series this often; requests only read snapshots.
+    CHAN_API_REFRESH_SECONDS = float(os.getenv('CHAN_API_REFRESH_SECONDS', '60'))
 
 config = Config()
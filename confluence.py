@@ -0,0 +1,183 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ohlcv import OHLCVArrays, as_columns, timeframe_ms
+from signal_detector import Signal, SignalDetector
+
+# ================== 多周期共振引擎 ==================
+# 所有周期的K线放在同一条时间轴上：每根低周期K线通过预先计算的 as-of 索引映射到
+# 其所在（或最近一根已收盘）的高周期K线，规则与区间套条件都以数组索引的方式一次性求值，
+# 得到每一根基准K线的共振得分，而不是按周期逐层嵌套循环。
+
+@dataclass
+class ConfluenceCondition:
+    """单周期条件：timeframe 上的 feature 在最近 within 根（该周期）K线内出现过 direction 信号"""
+    timeframe: str
+    feature: str     # 'MACD'/'RSI'/'Volume'/'BBands'/'Chan'/'trend'/'rsi_divergence'
+    direction: str   # 'bullish' 或 'bearish'
+    within: int = 0
+
+
+@dataclass
+class ConfluenceRule:
+    """多周期规则：所有条件同时满足时按 weight 计分"""
+    name: str
+    direction: str
+    conditions: List[ConfluenceCondition]
+    weight: float = 1.0
+
+
+def default_rules() -> List[ConfluenceRule]:
+    """xinhao.md / 设计文档中的周期共振组合"""
+    rules = []
+    for direction, word in (('bullish', '多'), ('bearish', '空')):
+        rules.extend([
+            ConfluenceRule(f"周线趋势+4小时MACD同向({word})", direction, [
+                ConfluenceCondition('1w', 'trend', direction),
+                ConfluenceCondition('4h', 'MACD', direction, within=1),
+            ], weight=2.0),
+            ConfluenceRule(f"周线趋势+4小时布林突破({word})", direction, [
+                ConfluenceCondition('1w', 'trend', direction),
+                ConfluenceCondition('4h', 'BBands', direction, within=1),
+            ], weight=2.0),
+            ConfluenceRule(f"日线RSI背离+1小时MACD({word})", direction, [
+                ConfluenceCondition('1d', 'rsi_divergence', direction, within=2),
+                ConfluenceCondition('1h', 'MACD', direction),
+            ], weight=1.5),
+            # 区间套：大级别缠论买卖点刚出现，小级别同向买卖点确认
+            ConfluenceRule(f"区间套 日线+1小时缠论({word})", direction, [
+                ConfluenceCondition('1d', 'Chan', direction, within=3),
+                ConfluenceCondition('1h', 'Chan', direction),
+            ], weight=3.0),
+            ConfluenceRule(f"区间套 周线+4小时缠论({word})", direction, [
+                ConfluenceCondition('1w', 'Chan', direction, within=2),
+                ConfluenceCondition('4h', 'Chan', direction),
+            ], weight=3.0),
+        ])
+    return rules
+
+
+def recent(mask: np.ndarray, within: int) -> np.ndarray:
+    """mask 在最近 within 根K线（含当前）内出现过 True"""
+    if within <= 0:
+        return mask
+    index = np.arange(len(mask))
+    last_true = np.maximum.accumulate(np.where(mask, index, -1))
+    return (last_true >= 0) & (index - last_true <= within)
+
+
+@dataclass
+class ConfluenceResult:
+    """基准周期每根K线的共振得分与各规则命中掩码"""
+    base_timeframe: str
+    timestamps: np.ndarray
+    score: np.ndarray
+    rules: Dict[str, np.ndarray] = field(default_factory=dict)
+
+
+class ConfluenceEngine:
+    """保存一个品种所有周期的K线与信号序列，并在共享时间轴上求值多周期规则"""
+
+    def __init__(self, symbol: str, detector: Optional[SignalDetector] = None,
+                 rules: Optional[List[ConfluenceRule]] = None, trend_lookback: int = 5, lookahead: bool = False):
+        """
+        Args:
+            symbol: 交易对
+            detector: 用于生成各周期信号序列的 SignalDetector（共享其指标缓存）
+            rules: 共振规则，缺省为 default_rules()
+            trend_lookback: 'trend'/'rsi_divergence' 特征的回看K线数（与 eth-gd2.py 一致）
+            lookahead: False 时低周期K线只映射到已收盘的高周期K线，避免用到未来数据
+        """
+        self.symbol = symbol
+        self.detector = detector or SignalDetector()
+        self.rules = rules if rules is not None else default_rules()
+        self.trend_lookback = trend_lookback
+        self.lookahead = lookahead
+        self._ohlcv: Dict[str, OHLCVArrays] = {}
+        self._features: Dict[str, Dict[str, Dict[str, np.ndarray]]] = {}
+
+    def add_timeframe(self, timeframe: str, ohlcv: Any):
+        """加入（或替换）一个周期的K线（OHLCVArrays、DataFrame 或行列表）"""
+        self._ohlcv[timeframe] = as_columns(ohlcv)
+        self._features.pop(timeframe, None)
+
+    @property
+    def timeframes(self) -> List[str]:
+        return sorted(self._ohlcv, key=timeframe_ms)
+
+    def features(self, timeframe: str) -> Dict[str, Dict[str, np.ndarray]]:
+        """该周期全部特征的 bullish/bearish 序列（每个周期只计算一次）"""
+        if timeframe not in self._features:
+            ohlcv = self._ohlcv[timeframe]
+            context = self.detector.context(timeframe, ohlcv, self.symbol)
+            features = self.detector.detect_all_series(context, ohlcv)
+
+            n, lb = len(ohlcv), self.trend_lookback
+            ema20, close, rsi = context['ema20'], context['close'], context['rsi']
+            rising, falling = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+            bull_div, bear_div = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+            if n > lb:
+                rising[lb:] = ema20[lb:] > ema20[:-lb]
+                falling[lb:] = ema20[lb:] < ema20[:-lb]
+                bull_div[lb:] = (close[lb:] < close[:-lb]) & (rsi[lb:] > rsi[:-lb])
+                bear_div[lb:] = (close[lb:] > close[:-lb]) & (rsi[lb:] < rsi[:-lb])
+            features['trend'] = {'bullish': rising, 'bearish': falling}
+            features['rsi_divergence'] = {'bullish': bull_div, 'bearish': bear_div}
+            self._features[timeframe] = features
+        return self._features[timeframe]
+
+    def asof_index(self, timeframe: str, base_timeframe: str) -> np.ndarray:
+        """
+        每根基准K线对应的 timeframe K线下标（-1 表示尚无对应K线）。
+
+        lookahead=False 时取基准K线收盘时刻之前已收盘的最后一根高周期K线，
+        否则取包含该基准K线开盘时刻的高周期K线。
+        """
+        base_ts = self._ohlcv[base_timeframe].timestamp
+        ts = self._ohlcv[timeframe].timestamp
+        if timeframe == base_timeframe:
+            return np.arange(len(base_ts))
+        if self.lookahead:
+            return np.searchsorted(ts, base_ts, side='right') - 1
+        close_times = ts + timeframe_ms(timeframe)
+        return np.searchsorted(close_times, base_ts + timeframe_ms(base_timeframe), side='right') - 1
+
+    def evaluate(self, base_timeframe: Optional[str] = None) -> ConfluenceResult:
+        """对基准周期的每一根K线计算所有规则的命中情况与加权得分"""
+        base_timeframe = base_timeframe or self.timeframes[0]
+        n = len(self._ohlcv[base_timeframe])
+        index_cache: Dict[str, np.ndarray] = {}
+        score = np.zeros(n)
+        hits = {}
+        for rule in self.rules:
+            if any(c.timeframe not in self._ohlcv for c in rule.conditions):
+                continue
+            combined = np.ones(n, dtype=bool)
+            for cond in rule.conditions:
+                if cond.timeframe not in index_cache:
+                    index_cache[cond.timeframe] = self.asof_index(cond.timeframe, base_timeframe)
+                idx = index_cache[cond.timeframe]
+                mask = recent(self.features(cond.timeframe)[cond.feature][cond.direction], cond.within)
+                combined &= (idx >= 0) & mask[np.maximum(idx, 0)]
+            hits[rule.name] = combined
+            score += np.where(combined, rule.weight if rule.direction == 'bullish' else -rule.weight, 0.0)
+        return ConfluenceResult(base_timeframe, self._ohlcv[base_timeframe].timestamp, score, hits)
+
+    def latest_signals(self, base_timeframe: Optional[str] = None) -> List[Signal]:
+        """末根基准K线命中的共振规则，转换为 Signal"""
+        result = self.evaluate(base_timeframe)
+        signals = []
+        if len(result.score) == 0:
+            return signals
+        for rule in self.rules:
+            if rule.name in result.rules and result.rules[rule.name][-1]:
+                signals.append(Signal(
+                    name=f"{self.symbol} {rule.name}",
+                    type=rule.direction,
+                    description=f"多周期共振：{', '.join(f'{c.timeframe} {c.feature}' for c in rule.conditions)}，"
+                                f"综合得分 {result.score[-1]:+.1f}",
+                    source='Confluence',
+                ))
+        return signals
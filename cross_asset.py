@@ -0,0 +1,398 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from derivatives import asof
+from logging_config import logger
+from ohlcv import as_columns, timeframe_ms
+
+# Per-bar cross-asset features of every symbol in the universe, and the keys the 'cross_asset' analysis
+# node provides for them:
+#   xa_corr       rolling log-return correlation with the benchmark
+#   xa_beta       rolling beta to the benchmark
+#   xa_rs         relative strength: the symbol's window log return minus the benchmark's
+#   xa_rs_rank    percentile (0..1) of the symbol's window return across the universe
+#   xa_mean_corr  mean correlation with the rest of the universe (sector co-movement)
+CROSS_ASSET_OUTPUTS: Tuple[str, ...] = ('xa_corr', 'xa_beta', 'xa_rs', 'xa_rs_rank', 'xa_mean_corr')
+
+
+class RollingCovariance:
+    """
+    Pairwise-complete covariance of the last `window` return vectors, updated per vector.
+
+    Components may be NaN (a symbol without a bar); they are left out of every statistic that involves
+    them instead of counting as a zero return. Three N×N sums are kept over the window: the co-moment
+    C = Σ x xᵀ, A = Σ x mᵀ (sum of x_i over the vectors where j is present) and the pair counts
+    P = Σ m mᵀ, with m the presence mask and x zeroed where missing. Adding a vector, and removing the one
+    leaving the window, is one outer product per sum; the covariance of i and j is then
+    (C_ij - A_ij A_ji / P_ij) / (P_ij - 1). The window is kept in a contiguous ring of shape (window, N)
+    so the sums can be recomputed exactly every `resync_every` vectors, bounding floating-point drift.
+    """
+
+    def __init__(self, size: int, window: int, resync_every: Optional[int] = None):
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        self.size = size
+        self.window = window
+        self.resync_every = resync_every or window
+        self.count = 0
+        self._comoment = np.zeros((size, size))
+        self._sums = np.zeros((size, size))
+        self._pairs = np.zeros((size, size))
+        self._ring = np.full((window, size), np.nan)
+        self._head = 0
+        self._pushes = 0
+
+    def _accumulate(self, x: np.ndarray, sign: float):
+        present = np.isfinite(x)
+        values = np.where(present, x, 0.0)
+        mask = present.astype(np.float64)
+        self._comoment += sign * np.multiply.outer(values, values)
+        self._sums += sign * np.multiply.outer(values, mask)
+        self._pairs += sign * np.multiply.outer(mask, mask)
+
+    def push(self, x: np.ndarray):
+        x = np.asarray(x, dtype=np.float64)
+        if self.count < self.window:
+            self.count += 1
+        else:
+            self._accumulate(self._ring[self._head], -1.0)
+        self._accumulate(x, 1.0)
+        self._ring[self._head] = x
+        self._head = (self._head + 1) % self.window
+        self._pushes += 1
+        if self._pushes % self.resync_every == 0:
+            self.resync()
+
+    def resync(self):
+        """Recomputes the sums exactly from the vectors in the window."""
+        rows = self._ring if self.count == self.window else self._ring[:self.count]
+        present = np.isfinite(rows)
+        values = np.where(present, rows, 0.0)
+        mask = present.astype(np.float64)
+        self._comoment = values.T @ values
+        self._sums = values.T @ mask
+        self._pairs = mask.T @ mask
+
+    def counts(self) -> np.ndarray:
+        """Vectors in the window where both components are present (the diagonal: where each one is)."""
+        return self._pairs.round()
+
+    def covariance(self) -> np.ndarray:
+        """Pairwise-complete sample covariance (NaN where a pair has fewer than two common vectors)."""
+        pairs = self.counts()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (self._comoment - self._sums * self._sums.T / pairs) / (pairs - 1)
+        return np.where(pairs >= 2, cov, np.nan)
+
+    def window_sum(self) -> np.ndarray:
+        """Sum of each component over its present vectors in the window (the window log return for log-return input)."""
+        return np.diagonal(self._sums).copy()
+
+
+class CrossAssetMatrix:
+    """
+    Rolling correlation, beta and relative strength of a symbol universe on one timeframe.
+
+    push() takes the closes of every symbol at one bar (NaN where a symbol has no bar) and turns them into
+    log returns. A symbol without a bar, or whose previous bar is missing, has no return at that bar and is
+    left out of the update rather than counted as flat. The rolling statistics are updated once for the
+    whole cross-section. The per-symbol features of the last `history` bars are kept in ring arrays of
+    shape (history, N). Features are NaN until the window has filled, for symbols with fewer than
+    `min_periods` returns in the window and for symbols that have not printed a bar yet.
+    """
+
+    def __init__(self, symbols: Sequence[str], benchmark: str, window: int = 100, history: int = 500,
+                 min_periods: Optional[int] = None):
+        self.symbols = list(symbols)
+        if benchmark not in self.symbols:
+            raise ValueError(f"Benchmark {benchmark} is not in the universe")
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.benchmark = self.index[benchmark]
+        self.window = window
+        self.history = history
+        self.min_periods = min_periods or max(2, window // 2)
+        self.stats = RollingCovariance(len(self.symbols), window)
+        self._last_close = np.full(len(self.symbols), np.nan)
+        self._timestamps = np.zeros(history, dtype=np.int64)
+        self._features = {key: np.full((history, len(self.symbols)), np.nan) for key in CROSS_ASSET_OUTPUTS}
+        self._head = 0
+        self._filled = 0
+        self.watermark: Optional[int] = None  # last cross-section pushed
+        self.last_bar = np.full(len(self.symbols), -1, dtype=np.int64)  # per symbol: last bar it printed
+        self._lock = threading.Lock()
+
+    def push(self, timestamp: int, closes: np.ndarray):
+        """Adds one bar (open time in ms) of closes for every symbol, in universe order."""
+        closes = np.asarray(closes, dtype=np.float64)
+        seen = np.isfinite(closes) & (closes > 0)
+        # _last_close only holds the previous cross-section's closes, so every return spans exactly one bar.
+        moved = seen & np.isfinite(self._last_close)
+        returns = np.full(len(self.symbols), np.nan)
+        returns[moved] = np.log(closes[moved] / self._last_close[moved])
+        self._last_close = np.where(seen, closes, np.nan)
+        if moved.any():
+            features = self._compute(returns)
+        else:  # the first cross-section only sets the reference closes
+            features = {key: np.full(len(self.symbols), np.nan) for key in CROSS_ASSET_OUTPUTS}
+        with self._lock:
+            row = self._head
+            self._timestamps[row] = timestamp
+            for key, values in features.items():
+                self._features[key][row] = values
+            self._head = (row + 1) % self.history
+            self._filled = min(self._filled + 1, self.history)
+            self.watermark = int(timestamp)
+            self.last_bar[seen] = int(timestamp)
+
+    def _compute(self, returns: np.ndarray) -> Dict[str, np.ndarray]:
+        stats = self.stats
+        stats.push(returns)
+        nan = np.full(len(self.symbols), np.nan)
+        if stats.count < self.window:
+            return {key: nan for key in CROSS_ASSET_OUTPUTS}
+        cov = stats.covariance()
+        var = np.diagonal(cov).copy()
+        live = (np.diagonal(stats.counts()) >= self.min_periods) & (np.nan_to_num(var) > 0)
+        std = np.where(live, np.sqrt(np.where(live, var, 1.0)), np.nan)
+        b = self.benchmark
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr_benchmark = cov[:, b] / (std * std[b])
+            beta = cov[:, b] / var[b]
+            corr = cov / np.multiply.outer(std, std)
+        np.fill_diagonal(corr, np.nan)
+        valid = int(live.sum())
+        pairs = np.isfinite(corr).sum(axis=1)
+        mean_corr = np.where(live & (pairs > 0), np.nansum(corr, axis=1) / np.maximum(pairs, 1), np.nan)
+        window_return = stats.window_sum()
+        rank = np.full(len(self.symbols), np.nan)
+        if valid > 1:
+            order = np.argsort(np.where(live, window_return, np.inf), kind='stable')[:valid]
+            rank[order] = np.arange(valid) / (valid - 1)
+        return {
+            'xa_corr': np.where(live, corr_benchmark, np.nan),
+            'xa_beta': np.where(live, beta, np.nan),
+            'xa_rs': np.where(live, window_return - window_return[b], np.nan),
+            'xa_rs_rank': rank,
+            'xa_mean_corr': mean_corr,
+        }
+
+    def correlation(self) -> np.ndarray:
+        """Current N×N rolling correlation matrix (universe order)."""
+        cov = self.stats.covariance()
+        std = np.sqrt(np.diagonal(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return cov / np.multiply.outer(std, std)
+
+    def series(self, symbol: str) -> Dict[str, np.ndarray]:
+        """Feature history of one symbol in time order, with the bars' open times as 'timestamp'."""
+        column = self.index.get(symbol)
+        with self._lock:
+            order = (np.arange(self._filled) + self._head - self._filled) % self.history
+            result = {'timestamp': self._timestamps[order]}
+            for key in CROSS_ASSET_OUTPUTS:
+                result[key] = self._features[key][order, column] if column is not None else np.full(len(order), np.nan)
+        return result
+
+
+class CrossAssetTracker:
+    """
+    Keeps a CrossAssetMatrix per timeframe current for a symbol universe.
+
+    Each background pass fetches, per timeframe, the closed bars after each symbol's last pushed bar
+    (on a bounded thread pool over the shared ccxt exchange), lines them up by bar open time and
+    pushes each cross-section once, so a bar close costs one O(N²) update rather than an N×N recompute.
+    The first pass seeds `window + history` bars per series from the storage backend and tops them up
+    from the exchange. aligned() joins a symbol's features onto a timeframe's bar grid for the
+    'cross_asset' node.
+    """
+
+    def __init__(self, exchange: Any, db_manager: Any, symbols: Sequence[str], timeframes: Sequence[str],
+                 benchmark: str = 'BTC/USDT', window: int = 100, history: int = 500, concurrency: int = 8,
+                 page_limit: int = 1000, interval: float = 60.0, max_lag: int = 3):
+        """
+        Args:
+            exchange: ccxt exchange instance (e.g. SimpleDataProcessor.exchange).
+            db_manager: Storage backend used to seed history on the first pass, or None.
+            symbols (Sequence[str]): Symbol universe; the benchmark is added when missing.
+            timeframes (Sequence[str]): Timeframes to keep a matrix for.
+            benchmark (str): Symbol correlation, beta and relative strength are measured against.
+            window (int): Rolling window in bars.
+            history (int): Bars of features kept per symbol.
+            concurrency (int): Maximum concurrent exchange requests.
+            page_limit (int): Maximum bars per exchange request; a longer backlog is caught up over passes.
+            interval (float): Seconds between background passes.
+            max_lag (int): Bars a symbol may trail the newest one before it stops holding the grid back.
+        """
+        self.exchange = exchange
+        self.db_manager = db_manager
+        self.symbols = list(symbols) if benchmark in symbols else [benchmark] + list(symbols)
+        self.timeframes = list(timeframes)
+        self.benchmark = benchmark
+        self.window = window
+        self.history = history
+        self.concurrency = concurrency
+        self.page_limit = page_limit
+        self.interval = interval
+        self.max_lag = max_lag
+        self.matrices = {tf: CrossAssetMatrix(self.symbols, benchmark, window, history) for tf in self.timeframes}
+        self._stop = threading.Event()
+
+    # ---------- fetching ----------
+
+    def _seed(self, symbol: str, timeframe: str) -> Tuple[np.ndarray, np.ndarray]:
+        bars = self.window + self.history
+        if self.db_manager is not None:
+            days = bars * timeframe_ms(timeframe) // 86_400_000 + 1
+            try:
+                stored = self.db_manager.query_ohlcv_arrays(measurement=timeframe, symbol=symbol,
+                                                            time_range_start=f"-{days}d")
+                if len(stored):
+                    return stored.timestamp[-bars:], stored.close[-bars:]
+            except Exception as e:
+                logger.warning(f"Could not seed {symbol} {timeframe} from storage: {e}")
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    def fetch(self, symbol: str, timeframe: str, since: Optional[int], now: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Open times and closes of the closed bars after `since` (the first pass: seed plus top-up)."""
+        timestamps, closes = (np.empty(0, dtype=np.int64), np.empty(0)) if since is not None else self._seed(symbol, timeframe)
+        step = timeframe_ms(timeframe)
+        last = int(timestamps[-1]) if len(timestamps) else since
+        if last is None:
+            start, limit = None, self.window + self.history
+        else:
+            start, limit = last + 1, self.page_limit
+        if last is None or now >= last + 2 * step:
+            fresh = as_columns(self.exchange.fetch_ohlcv(symbol, timeframe, since=start, limit=limit))
+            keep = fresh.timestamp > (last if last is not None else -1)
+            timestamps = np.concatenate([timestamps, fresh.timestamp[keep]])
+            closes = np.concatenate([closes, fresh.close[keep]])
+        closed = timestamps + step <= now
+        return timestamps[closed], closes[closed]
+
+    def refresh(self, timeframe: str, now: Optional[int] = None) -> int:
+        """
+        Brings one timeframe's matrix up to date; returns the cross-sections pushed.
+
+        Each symbol is fetched from its own last pushed bar. The grid stops at the oldest latest bar among
+        the symbols that fetched successfully, so a symbol whose exchange data lags is not skipped past;
+        its newer bars and everyone else's are pushed on a later pass. Symbols more than `max_lag` bars
+        behind the newest one are taken as halted and do not hold the grid back.
+        """
+        now = int(time.time() * 1000) if now is None else now
+        matrix = self.matrices[timeframe]
+        step = timeframe_ms(timeframe)
+        since = matrix.watermark
+        if since is not None and now < since + 2 * step:
+            return 0
+        fetched: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {}
+            for symbol in self.symbols:
+                last = int(matrix.last_bar[matrix.index[symbol]])
+                futures[pool.submit(self.fetch, symbol, timeframe, last if last >= 0 else None, now)] = symbol
+            for future, symbol in futures.items():
+                try:
+                    fetched[symbol] = future.result()
+                except Exception as e:
+                    logger.warning(f"Failed to fetch {symbol} {timeframe} for cross-asset analytics: {e}")
+        if not fetched:
+            return 0
+        latest = np.array([max(int(ts[-1]) if len(ts) else -1, int(matrix.last_bar[matrix.index[symbol]]))
+                           for symbol, (ts, _) in fetched.items()])
+        latest = latest[latest >= 0]
+        if not len(latest):
+            return 0
+        cap = latest[latest >= latest.max() - self.max_lag * step].min()
+        grid = np.unique(np.concatenate([ts for ts, _ in fetched.values()]))
+        grid = grid[grid <= cap]
+        if since is not None:
+            grid = grid[grid > since]
+        if not len(grid):
+            return 0
+        closes = np.full((len(grid), len(self.symbols)), np.nan)
+        for symbol, (timestamps, values) in fetched.items():
+            rows = np.searchsorted(grid, timestamps)
+            inside = (rows < len(grid)) & (grid[np.minimum(rows, len(grid) - 1)] == timestamps)
+            closes[rows[inside], matrix.index[symbol]] = values[inside]
+        for timestamp, row in zip(grid, closes):
+            matrix.push(int(timestamp), row)
+        return len(grid)
+
+    def run_once(self) -> int:
+        """One pass over every timeframe; returns the cross-sections pushed."""
+        started = time.perf_counter()
+        total = 0
+        for timeframe in self.timeframes:
+            try:
+                total += self.refresh(timeframe)
+            except Exception as e:
+                logger.warning(f"Cross-asset refresh of {timeframe} failed: {e}")
+        logger.info(f"Cross-asset pass: {total} bars across {len(self.symbols)} symbols "
+                    f"in {time.perf_counter() - started:.1f}s.")
+        return total
+
+    def run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name='cross-asset', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- alignment ----------
+
+    def aligned(self, symbol: str, timeframe: str, bar_timestamps: Any) -> Dict[str, np.ndarray]:
+        """
+        Every CROSS_ASSET_OUTPUTS key as an array parallel to the bars: each bar gets the features pushed
+        for exactly its own timestamp, NaN outside the universe and for bars not pushed (yet). Only closed
+        bars are pushed, so a still-forming last bar is NaN rather than a copy of the previous bar, which
+        would make every crossing on it invisible.
+        """
+        at = np.asarray(bar_timestamps, dtype=np.int64)
+        matrix = self.matrices.get(timeframe)
+        if matrix is None or symbol not in matrix.index:
+            return {key: np.full(len(at), np.nan) for key in CROSS_ASSET_OUTPUTS}
+        series = matrix.series(symbol)
+        return {key: asof(series['timestamp'], series[key], at, max_age=0) for key in CROSS_ASSET_OUTPUTS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-bar update cost of the cross-asset matrix on random returns.")
+    parser.add_argument('--symbols', type=int, default=300, help="universe size")
+    parser.add_argument('--bars', type=int, default=2000, help="bars pushed")
+    parser.add_argument('--window', type=int, default=100, help="rolling window in bars")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    symbols = [f"S{i}/USDT" for i in range(args.symbols)]
+    market = rng.normal(0, 0.01, args.bars)
+    loadings = rng.uniform(0.2, 1.5, args.symbols)
+    returns = np.outer(market, loadings) + rng.normal(0, 0.01, (args.bars, args.symbols))
+    closes = 100 * np.exp(np.cumsum(returns, axis=0))
+    matrix = CrossAssetMatrix(symbols, symbols[0], window=args.window)
+    timings = []
+    for i, row in enumerate(closes):
+        started = time.perf_counter()
+        matrix.push(i * 3_600_000, row)
+        timings.append(time.perf_counter() - started)
+    steady = np.array(timings[args.window:]) * 1000
+    log_returns = np.diff(np.log(closes[-args.window - 1:]), axis=0)
+    exact = np.corrcoef(log_returns, rowvar=False)
+    drift = np.nanmax(np.abs(matrix.correlation() - exact))
+    print(f"{args.symbols} symbols, window {args.window}: {np.median(steady):.2f} ms median, "
+          f"{np.percentile(steady, 99):.2f} ms p99 per bar update")
+    print(f"max |incremental - recomputed| correlation after {args.bars} bars: {drift:.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,10 @@
 import pandas as pd
 import ta
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 class DataProcessor:
-    def __init__(self):
-        self.symbol = 'ETH/USDT'
+    def __init__(self, symbol: str = 'ETH/USDT'):
+        self.symbol = symbol
         
     def fetch_ohlcv(self, exchange, symbol: str, timeframe: str, limit: int) -> pd.DataFrame:
         """获取K线数据"""
@@ -24,8 +24,8 @@ class DataProcessor:
         df['bb_low'] = bb.bollinger_lband()
         return df
         
-    def get_all_timeframes_data(self, exchange) -> Dict[str, pd.DataFrame]:
-        """获取所有时间周期的数据"""
+    def get_all_timeframes_data(self, exchange, symbol: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """获取所有时间周期的数据（symbol 缺省为实例的交易对）"""
         timeframes = {
             '1w': 60,
             '1d': 180,
@@ -35,7 +35,7 @@ class DataProcessor:
         
         data = {}
         for timeframe, limit in timeframes.items():
-            df = self.fetch_ohlcv(exchange, self.symbol, timeframe, limit)
+            df = self.fetch_ohlcv(exchange, symbol or self.symbol, timeframe, limit)
             df = self.calculate_indicators(df)
             data[timeframe] = df
         
@@ -1,18 +1,127 @@
 import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
-from influxdb_client import InfluxDBClient, Point
+from influxdb_client import BucketRetentionRules, InfluxDBClient, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.domain.task_create_request import TaskCreateRequest
+from influxdb_client.domain.task_update_request import TaskUpdateRequest
 from logging_config import logger
+from local_store import parse_range_start
+from ohlcv import OHLCVArrays, grid_offset_ms, timeframe_ms
+
+# Flux windows are aligned to the Unix epoch (a Thursday); shift weekly windows so rolled-up
+# weekly bars open on Monday like the exchange's own candles.
+_WINDOW_OFFSETS = {'1w': '4d'}
+
+
+@dataclass
+class RetentionTier:
+    """
+    One storage tier: bars of `timeframe` resolution kept in their own bucket for `retention`.
+
+    The first configured tier is the base tier and receives the raw writes; each later tier is
+    filled server-side by an InfluxDB task that rolls the base bars up.
+    """
+    timeframe: str
+    retention: str  # e.g. '90d'; '0' keeps data forever
+    bucket: str
+
+    @property
+    def resolution_ms(self) -> int:
+        return timeframe_ms(self.timeframe)
+
+    @property
+    def retention_ms(self) -> int:
+        return 0 if self.retention == '0' else timeframe_ms(self.retention)
+
+
+def parse_tiers(value: str, bucket: str) -> List[RetentionTier]:
+    """
+    Parses '1h:90d,1d:5y,1w:0' into tiers stored in buckets named '<bucket>_<timeframe>'. Timeframes and
+    retentions use the m/h/d/w/M units of timeframe_ms; a retention in years ('5y') is taken as 365-day
+    years. Raises ValueError naming the entry for any other unit, so a typo fails at startup.
+    """
+    tiers = []
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        timeframe, _, retention = (s.strip() for s in entry.partition(':'))
+        retention = retention or '0'
+        years = re.fullmatch(r'(\d+)y', retention)
+        if years:
+            retention = f"{int(years.group(1)) * 365}d"
+        try:
+            timeframe_ms(timeframe)
+            if retention != '0':
+                timeframe_ms(retention)
+        except ValueError:
+            raise ValueError(f"Invalid INFLUXDB_TIERS entry '{entry}': expected <timeframe>:<retention> "
+                             f"with units m/h/d/w/M (retention also y, or 0 to keep forever)") from None
+        tiers.append(RetentionTier(timeframe, retention, f"{bucket}_{timeframe}"))
+    return tiers
+
+
+def _flux_duration(timeframe: str) -> str:
+    """'1M' is a month in ccxt timeframes but a minute in Flux."""
+    return timeframe[:-1] + 'mo' if timeframe.endswith('M') else timeframe
+
+
+def rollup_flux(source_bucket: str, measurement: str, start: str, every: str, symbol: Optional[str] = None,
+                fresh: Optional[Tuple[str, str, str]] = None) -> str:
+    """
+    Flux that aggregates OHLCV rows of `measurement` into `every` bars:
+    open=first, high=max, low=min, close=last, volume=sum, stamped with the window start.
+
+    With fresh=(bucket, measurement, cutoff) the source rows are read only up to `cutoff` (RFC3339, on an
+    `every` window boundary) and the rows from `cutoff` on come from the fresh bucket's measurement instead.
+    """
+    symbol_filter = f'\n  |> filter(fn: (r) => r.symbol == "{symbol}")' if symbol else ''
+    offset = f', offset: {_WINDOW_OFFSETS[every]}' if every in _WINDOW_OFFSETS else ''
+    window = f'every: {_flux_duration(every)}{offset}, createEmpty: false, timeSrc: "_start"'
+    if fresh is None:
+        lines = [
+            f'data = from(bucket: "{source_bucket}")\n'
+            f'  |> range(start: {start})\n'
+            f'  |> filter(fn: (r) => r._measurement == "{measurement}"){symbol_filter}'
+        ]
+    else:
+        fresh_bucket, fresh_measurement, cutoff = fresh
+        symbol_filter = symbol_filter.replace('\n', '\n    ')
+        lines = [
+            f'data = union(tables: [\n'
+            f'    from(bucket: "{source_bucket}")\n'
+            f'      |> range(start: {start}, stop: {cutoff})\n'
+            f'      |> filter(fn: (r) => r._measurement == "{measurement}"){symbol_filter},\n'
+            f'    from(bucket: "{fresh_bucket}")\n'
+            f'      |> range(start: {cutoff})\n'
+            f'      |> filter(fn: (r) => r._measurement == "{fresh_measurement}"){symbol_filter}])\n'
+            f'  |> group(columns: ["_field", "symbol"])\n'
+            f'  |> sort(columns: ["_time"])'
+        ]
+    for field, fn in (('open', 'first'), ('high', 'max'), ('low', 'min'), ('close', 'last'), ('volume', 'sum')):
+        lines.append(f'{field} = data |> filter(fn: (r) => r._field == "{field}") |> aggregateWindow({window}, fn: {fn})')
+    lines.append('union(tables: [open, high, low, close, volume])')
+    return '\n'.join(lines)
+
 
 class DatabaseManager:
     """Manages all interactions with the InfluxDB time-series database."""
 
-    def __init__(self, url: str, token: str, org: str, bucket: str):
-        """Initializes the database connection using provided configuration."""
+    def __init__(self, url: str, token: str, org: str, bucket: str, tiers: str = ''):
+        """
+        Initializes the database connection using provided configuration.
+
+        Args:
+            tiers (str): Optional downsampling/retention tiers, e.g. '1h:90d,1d:1825d,1w:0'. The first tier
+                is the base resolution; when empty, every measurement is stored raw in `bucket` as before.
+        """
         self.influx_url = url
         self.influx_token = token
         self.influx_org = org
         self.bucket = bucket
+        self.tiers = parse_tiers(tiers, bucket) if tiers else []
 
         if not all([self.influx_url, self.influx_token, self.influx_org, self.bucket]):
             logger.error("InfluxDB configuration is incomplete. All parameters (URL, TOKEN, ORG, BUCKET) are required.")
@@ -47,12 +156,13 @@ class DatabaseManager:
                 )
                 points.append(point)
             
-            self.write_api.write(bucket=self.bucket, org=self.influx_org, record=points)
+            self.write_api.write(bucket=self._write_bucket(measurement), org=self.influx_org, record=points)
             logger.info(f"Successfully wrote {len(points)} data points to measurement '{measurement}' for symbol {symbol}.")
         except Exception as e:
             logger.error(f"Failed to write data to InfluxDB: {e}")
 
-    def query_ohlcv_data(self, measurement: str, symbol: str, time_range_start: str = "-7d") -> pd.DataFrame:
+    def query_ohlcv_data(self, measurement: str, symbol: str, time_range_start: str = "-7d",
+                         strict: bool = False) -> pd.DataFrame:
         """
         Queries OHLCV data from InfluxDB and returns it as a pandas DataFrame.
 
@@ -60,16 +170,14 @@ class DatabaseManager:
             measurement (str): The measurement name (e.g., '1h', '5m').
             symbol (str): The trading symbol (e.g., 'ETH/USDT').
             time_range_start (str): The start of the time range for the query (e.g., '-1d', '-30d').
+            strict (bool): Re-raise query errors instead of returning an empty frame, so callers
+                (e.g. the local cache) can tell a failure from a range without data.
 
         Returns:
             pd.DataFrame: A DataFrame with the queried data, sorted by time.
         """
         try:
-            query = f'''
-            from(bucket: "{self.bucket}")
-              |> range(start: {time_range_start})
-              |> filter(fn: (r) => r._measurement == "{measurement}")
-              |> filter(fn: (r) => r.symbol == "{symbol}")
+            query = self._ohlcv_source(measurement, symbol, time_range_start) + '''
               |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
               |> keep(columns: ["_time", "open", "high", "low", "close", "volume"])
               |> sort(columns: ["_time"])
@@ -79,17 +187,291 @@ class DatabaseManager:
                 logger.warning(f"Query for '{measurement}' on symbol {symbol} returned no data.")
                 return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
 
-            # Convert time and set as index
+            # Convert time to epoch milliseconds, keeping timestamp as a column
             result_df.rename(columns={'_time': 'timestamp'}, inplace=True)
-            result_df['timestamp'] = result_df['timestamp'].astype(int) // 10**6 # Convert to milliseconds
-            result_df.set_index('timestamp', inplace=True)
-            
+            result_df['timestamp'] = result_df['timestamp'].astype('int64') // 10**6
+
             logger.info(f"Successfully queried {len(result_df)} data points from measurement '{measurement}' for symbol {symbol}.")
-            return result_df.reset_index() # Return with timestamp as a column
+            return result_df
         except Exception as e:
             logger.error(f"Failed to query data from InfluxDB: {e}")
+            if strict:
+                raise
             return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
 
+    def _write_bucket(self, measurement: str) -> str:
+        """Raw bars of the base tier go to the base tier bucket; everything else to the main bucket."""
+        if self.tiers and measurement == self.tiers[0].timeframe:
+            return self.tiers[0].bucket
+        return self.bucket
+
+    def select_tier(self, measurement: str, time_range_start: str) -> Optional[RetentionTier]:
+        """
+        Picks the coarsest tier whose resolution divides the requested timeframe and whose retention
+        still covers the start of the range, or None if no tier can serve the query.
+        """
+        try:
+            wanted_ms = timeframe_ms(measurement)
+            age_ms = int(time.time() * 1000) - parse_range_start(time_range_start)
+        except ValueError:
+            return None
+        candidates = [
+            tier for tier in self.tiers
+            if wanted_ms % tier.resolution_ms == 0 and (tier.retention_ms == 0 or age_ms <= tier.retention_ms)
+        ]
+        return max(candidates, key=lambda tier: tier.resolution_ms, default=None)
+
+    def _fresh_cutoff(self, tier: RetentionTier, measurement: str) -> Optional[int]:
+        """
+        A derived tier is rolled up once per period, so its newest windows lag the base tier. Returns the
+        epoch ms (on the `measurement` grid) before which the tier is complete: the start of the tier window
+        before the current one, in case this period's rollup has not run yet. None when the base tier no
+        longer holds that range, or for calendar-month windows that have no fixed grid.
+        """
+        base = self.tiers[0]
+        if tier is base or 'M' in (tier.timeframe[-1], measurement[-1]):
+            return None
+        now_ms = int(time.time() * 1000)
+        period, offset = tier.resolution_ms, grid_offset_ms(tier.timeframe)
+        cutoff = (now_ms - offset) // period * period + offset - period
+        step, step_offset = timeframe_ms(measurement), grid_offset_ms(measurement)
+        cutoff = (cutoff - step_offset) // step * step + step_offset
+        if base.retention_ms and now_ms - cutoff > base.retention_ms:
+            return None
+        return cutoff
+
+    def _ohlcv_source(self, measurement: str, symbol: str, time_range_start: str) -> str:
+        """
+        Flux source of raw OHLCV rows, served from the best retention tier when tiers are configured.
+        A derived tier only serves the range it has already rolled up; the newer bars are rolled up from
+        the base tier, so the forming bar and the bars closed since the last rollup are not lost.
+        """
+        tier = self.select_tier(measurement, time_range_start)
+        if tier is not None and tier is not self.tiers[0]:
+            cutoff = self._fresh_cutoff(tier, measurement)
+            if cutoff is not None:
+                base = self.tiers[0]
+                if parse_range_start(time_range_start) >= cutoff:
+                    return rollup_flux(base.bucket, base.timeframe, time_range_start, measurement, symbol)
+                stop = pd.Timestamp(cutoff, unit='ms', tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+                logger.info(f"Serving '{measurement}' for {symbol} from tier '{tier.timeframe}' until {stop}, "
+                            f"then from tier '{base.timeframe}'.")
+                return rollup_flux(tier.bucket, tier.timeframe, time_range_start, measurement, symbol,
+                                   fresh=(base.bucket, base.timeframe, stop))
+        if tier is not None and tier.timeframe != measurement:
+            # Only a finer tier still holds this range: aggregate it server-side.
+            logger.info(f"Serving '{measurement}' for {symbol} by rolling up tier '{tier.timeframe}'.")
+            return rollup_flux(tier.bucket, tier.timeframe, time_range_start, measurement, symbol)
+        # Without a serving tier, read where the measurement's raw bars are written (the base tier's own
+        # bucket for the base timeframe, the main bucket otherwise).
+        bucket = tier.bucket if tier is not None else self._write_bucket(measurement)
+        return f'''
+            from(bucket: "{bucket}")
+              |> range(start: {time_range_start})
+              |> filter(fn: (r) => r._measurement == "{measurement}")
+              |> filter(fn: (r) => r.symbol == "{symbol}")'''
+
+    def _ensure_bucket(self, tier: RetentionTier):
+        buckets_api = self.client.buckets_api()
+        every_seconds = tier.retention_ms // 1000
+        rules = [BucketRetentionRules(type='expire', every_seconds=every_seconds)] if every_seconds else []
+        bucket = buckets_api.find_bucket_by_name(tier.bucket)
+        if bucket is None:
+            buckets_api.create_bucket(bucket_name=tier.bucket, retention_rules=rules, org=self.influx_org)
+            logger.info(f"Created bucket '{tier.bucket}' with retention {tier.retention}.")
+        elif [r.every_seconds for r in bucket.retention_rules or []] != [r.every_seconds for r in rules]:
+            bucket.retention_rules = rules
+            buckets_api.update_bucket(bucket=bucket)
+            logger.info(f"Updated retention of bucket '{tier.bucket}' to {tier.retention}.")
+
+    def _ensure_task(self, name: str, flux: str):
+        tasks_api = self.client.tasks_api()
+        existing = tasks_api.find_tasks(name=name)
+        if not existing:
+            tasks_api.create_task(task_create_request=TaskCreateRequest(
+                org=self.influx_org, flux=flux, status='active', description="OHLCV downsampling"))
+            logger.info(f"Created downsampling task '{name}'.")
+        elif existing[0].flux != flux:
+            tasks_api.update_task_request(existing[0].id, TaskUpdateRequest(flux=flux))
+            logger.info(f"Updated downsampling task '{name}'.")
+
+    def _bucket_empty(self, bucket: str) -> bool:
+        tables = self.query_api.query(f'from(bucket: "{bucket}") |> range(start: 0) |> limit(n: 1)', org=self.influx_org)
+        return not any(table.records for table in tables)
+
+    def _backfill_tier(self, tier: RetentionTier, base: RetentionTier):
+        """
+        Fills a newly created tier bucket once from the history already in the main bucket: the base tier
+        gets a copy of the raw base bars within its retention; a derived tier gets the base bars rolled up,
+        then the main bucket's own bars of that timeframe (exchange candles) on top where they exist.
+        """
+        start = f"-{tier.retention}" if tier.retention_ms else "0"
+        copy = (f'from(bucket: "{self.bucket}")\n  |> range(start: {start})\n'
+                f'  |> filter(fn: (r) => r._measurement == "{tier.timeframe}")\n'
+                f'  |> to(bucket: "{tier.bucket}", org: "{self.influx_org}")')
+        if tier is not base:
+            self.query_api.query(rollup_flux(self.bucket, base.timeframe, start, tier.timeframe)
+                                 + f'\n  |> set(key: "_measurement", value: "{tier.timeframe}")'
+                                 + f'\n  |> to(bucket: "{tier.bucket}", org: "{self.influx_org}")', org=self.influx_org)
+        self.query_api.query(copy, org=self.influx_org)
+        logger.info(f"Backfilled tier bucket '{tier.bucket}' from '{self.bucket}'.")
+
+    def ensure_retention_tiers(self):
+        """
+        Provisions the tier buckets with their retention rules and one InfluxDB task per derived tier
+        that rolls the base bars into it once per period. A tier bucket that is still empty is backfilled
+        once from the main bucket, so long-range reads work right after tiers are enabled. Idempotent;
+        safe to call on every startup.
+        """
+        if not self.tiers:
+            return
+        base = self.tiers[0]
+        try:
+            for tier in self.tiers:
+                self._ensure_bucket(tier)
+                if self._bucket_empty(tier.bucket):
+                    self._backfill_tier(tier, base)
+            for tier in self.tiers[1:]:
+                name = f"downsample_ohlcv_{base.timeframe}_to_{tier.timeframe}"
+                # Re-aggregate the previous and current window so the last closed bar is always complete.
+                start = f"-{2 * int(tier.timeframe[:-1])}{_flux_duration(tier.timeframe[-1])}"
+                flux = (f'option task = {{name: "{name}", every: {_flux_duration(tier.timeframe)}, offset: 1m}}\n\n'
+                        + rollup_flux(base.bucket, base.timeframe, start, tier.timeframe)
+                        + f'\n  |> set(key: "_measurement", value: "{tier.timeframe}")'
+                        + f'\n  |> to(bucket: "{tier.bucket}", org: "{self.influx_org}")')
+                self._ensure_task(name, flux)
+        except Exception as e:
+            logger.error(f"Failed to provision InfluxDB retention tiers: {e}")
+
+    def query_ohlcv_arrays(self, measurement: str, symbol: str, time_range_start: str = "-7d") -> OHLCVArrays:
+        """
+        Queries OHLCV data and returns it as columnar NumPy arrays for the analyzers.
+
+        The arrays are views over the queried DataFrame's columns, so no row-wise copy of the
+        history is made between the database and ChanAnalyzer / SignalDetector.
+        """
+        df = self.query_ohlcv_data(measurement, symbol, time_range_start)
+        return OHLCVArrays.from_dataframe(df)
+
+    def write_metric_data(self, measurement: str, data: pd.DataFrame, symbol: str):
+        """
+        Writes a non-OHLCV series (e.g. 'funding') to the main bucket: every column other than
+        'timestamp' becomes a float field.
+        """
+        try:
+            fields = [c for c in data.columns if c != 'timestamp']
+            points = []
+            for row in data.itertuples(index=False):
+                point = Point(measurement).tag("symbol", symbol).time(pd.to_datetime(row.timestamp, unit='ms'))
+                for field in fields:
+                    value = getattr(row, field)
+                    if pd.notna(value):
+                        point = point.field(field, float(value))
+                points.append(point)
+            self.write_api.write(bucket=self.bucket, org=self.influx_org, record=points)
+            logger.info(f"Successfully wrote {len(points)} data points to measurement '{measurement}' for symbol {symbol}.")
+        except Exception as e:
+            logger.error(f"Failed to write '{measurement}' to InfluxDB: {e}")
+
+    def query_metric_data(self, measurement: str, symbol: str, fields: Sequence[str],
+                          time_range_start: str = "-7d", strict: bool = False) -> pd.DataFrame:
+        """
+        Queries a series written by write_metric_data as a DataFrame of 'timestamp' plus `fields`;
+        with strict=True query errors are re-raised instead of returning an empty frame.
+        """
+        columns = ['timestamp', *fields]
+        try:
+            keep = ', '.join(f'"{c}"' for c in ['_time', *fields])
+            query = f'''
+            from(bucket: "{self.bucket}")
+              |> range(start: {time_range_start})
+              |> filter(fn: (r) => r._measurement == "{measurement}")
+              |> filter(fn: (r) => r.symbol == "{symbol}")
+              |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+              |> keep(columns: [{keep}])
+              |> sort(columns: ["_time"])
+            '''
+            result_df = self.query_api.query_data_frame(query, org=self.influx_org)
+            if result_df.empty:
+                return pd.DataFrame(columns=columns)
+            result_df.rename(columns={'_time': 'timestamp'}, inplace=True)
+            result_df['timestamp'] = result_df['timestamp'].astype('int64') // 10**6
+            return result_df.reindex(columns=columns)
+        except Exception as e:
+            logger.error(f"Failed to query '{measurement}' from InfluxDB: {e}")
+            if strict:
+                raise
+            return pd.DataFrame(columns=columns)
+
+    def query_metric_arrays(self, measurement: str, symbol: str, fields: Sequence[str],
+                            time_range_start: str = "-7d") -> Dict[str, np.ndarray]:
+        """Column arrays ('timestamp' plus `fields`) of a series written by write_metric_data."""
+        df = self.query_metric_data(measurement, symbol, fields, time_range_start)
+        arrays = {'timestamp': df['timestamp'].to_numpy(dtype=np.int64)}
+        arrays.update({f: df[f].to_numpy(dtype=np.float64) for f in fields})
+        return arrays
+
+    def write_event_data(self, measurement: str, data: pd.DataFrame, symbol: str, tags: Sequence[str]):
+        """
+        Writes event rows (several may share a timestamp) to the main bucket: the `tags` columns become
+        tags next to 'symbol', so events are told apart by their tags and indexed for filtering, and the
+        other columns become float fields. Re-writing an event overwrites the identical point. Errors are
+        logged and re-raised, so the caller (the signal journal) can keep the rows and retry.
+        """
+        try:
+            fields = [c for c in data.columns if c != 'timestamp' and c not in tags]
+            points = []
+            for row in data.itertuples(index=False):
+                point = Point(measurement).tag("symbol", symbol).time(pd.to_datetime(row.timestamp, unit='ms'))
+                for tag in tags:
+                    point = point.tag(tag, str(getattr(row, tag)))
+                for field in fields:
+                    value = getattr(row, field)
+                    if pd.notna(value):
+                        point = point.field(field, float(value))
+                points.append(point)
+            self.write_api.write(bucket=self.bucket, org=self.influx_org, record=points)
+            logger.info(f"Successfully wrote {len(points)} events to measurement '{measurement}' for symbol {symbol}.")
+        except Exception as e:
+            logger.error(f"Failed to write '{measurement}' events to InfluxDB: {e}")
+            raise
+
+    def query_event_data(self, measurement: str, symbol: str, time_range_start: str = "-7d",
+                         time_range_stop: Optional[str] = None,
+                         where: Optional[Dict[str, str]] = None, strict: bool = False) -> pd.DataFrame:
+        """
+        Event rows written by write_event_data, optionally only those whose tags equal `where`; with
+        strict=True query errors are re-raised instead of returning an empty frame.
+        """
+        try:
+            stop = f", stop: {time_range_stop}" if time_range_stop else ""
+            filters = ''.join(f'\n              |> filter(fn: (r) => r["{tag}"] == "{value}")'
+                              for tag, value in (where or {}).items())
+            query = f'''
+            from(bucket: "{self.bucket}")
+              |> range(start: {time_range_start}{stop})
+              |> filter(fn: (r) => r._measurement == "{measurement}")
+              |> filter(fn: (r) => r.symbol == "{symbol}"){filters}
+              |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+              |> group()
+              |> drop(columns: ["_start", "_stop", "_measurement", "symbol"])
+              |> sort(columns: ["_time"])
+            '''
+            result_df = self.query_api.query_data_frame(query, org=self.influx_org)
+            if isinstance(result_df, list):
+                result_df = pd.concat(result_df, ignore_index=True) if result_df else pd.DataFrame()
+            if result_df.empty:
+                return pd.DataFrame(columns=['timestamp'])
+            result_df = result_df.drop(columns=['result', 'table'], errors='ignore')
+            result_df.rename(columns={'_time': 'timestamp'}, inplace=True)
+            result_df['timestamp'] = result_df['timestamp'].astype('int64') // 10**6
+            return result_df.reset_index(drop=True)
+        except Exception as e:
+            logger.error(f"Failed to query '{measurement}' events from InfluxDB: {e}")
+            if strict:
+                raise
+            return pd.DataFrame(columns=['timestamp'])
+
     def close(self):
         """Closes the InfluxDB client connection."""
         self.client.close()
@@ -0,0 +1,276 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logging_config import logger
+from ohlcv import timeframe_ms
+
+# Stored derivatives series: measurement -> float fields (besides 'timestamp'). Each is written next to
+# the symbol's bars as its own measurement, e.g. local store <root>/BTC_USDT_USDT/funding/funding_rate.bin.
+METRICS: Dict[str, Tuple[str, ...]] = {
+    'funding': ('funding_rate',),
+    'open_interest': ('open_interest', 'open_interest_value'),
+    'long_short': ('long_short_ratio', 'long_account', 'short_account'),
+}
+
+# Keys the 'derivatives' analysis node provides, each aligned to the bar grid of the analysed timeframe.
+DERIVATIVE_OUTPUTS: Tuple[str, ...] = tuple(f for fields in METRICS.values() for f in fields) + ('open_interest_change_1d',)
+
+FUNDING_INTERVAL_MS = 8 * 3_600_000
+DAY_MS = 86_400_000
+
+Rows = List[Tuple[float, ...]]  # (timestamp, *fields) per sample, ascending
+
+
+class UnsupportedMetric(Exception):
+    """The exchange has no endpoint for a derivatives metric."""
+
+
+def _float(value: Any) -> float:
+    return float(value) if value is not None else np.nan
+
+
+def fetch_funding(exchange: Any, symbol: str, period: str, since: Optional[int], limit: int) -> Rows:
+    if not exchange.has.get('fetchFundingRateHistory'):
+        raise UnsupportedMetric('funding')
+    entries = exchange.fetch_funding_rate_history(symbol, since=since, limit=limit)
+    return [(e['timestamp'], _float(e.get('fundingRate'))) for e in entries]
+
+
+def fetch_open_interest(exchange: Any, symbol: str, period: str, since: Optional[int], limit: int) -> Rows:
+    if not exchange.has.get('fetchOpenInterestHistory'):
+        raise UnsupportedMetric('open_interest')
+    entries = exchange.fetch_open_interest_history(symbol, period, since=since, limit=limit)
+    return [(e['timestamp'], _float(e.get('openInterestAmount')), _float(e.get('openInterestValue'))) for e in entries]
+
+
+def fetch_long_short(exchange: Any, symbol: str, period: str, since: Optional[int], limit: int) -> Rows:
+    """
+    Global long/short account ratio. Uses the unified method where the installed ccxt has it, else
+    Binance's futures-data endpoint through ccxt's implicit API.
+    """
+    if exchange.has.get('fetchLongShortRatioHistory'):
+        entries = exchange.fetch_long_short_ratio_history(symbol, period, since=since, limit=limit)
+        return [(e['timestamp'], _float(e.get('longShortRatio')), np.nan, np.nan) for e in entries]
+    endpoint = getattr(exchange, 'fapiDataGetGlobalLongShortAccountRatio', None)
+    if endpoint is None:
+        raise UnsupportedMetric('long_short')
+    exchange.load_markets()  # market() needs the markets; ccxt caches them after the first call
+    params = {'symbol': exchange.market(symbol)['id'], 'period': period, 'limit': limit}
+    if since is not None:
+        params['startTime'] = since
+    entries = endpoint(params)
+    return [(int(e['timestamp']), _float(e.get('longShortRatio')), _float(e.get('longAccount')),
+             _float(e.get('shortAccount'))) for e in entries]
+
+
+FETCHERS: Dict[str, Callable[[Any, str, str, Optional[int], int], Rows]] = {
+    'funding': fetch_funding,
+    'open_interest': fetch_open_interest,
+    'long_short': fetch_long_short,
+}
+
+
+def asof(sample_ts: np.ndarray, values: np.ndarray, at: np.ndarray, max_age: Optional[int] = None) -> np.ndarray:
+    """
+    As-of join: for each time in `at`, the last sample with timestamp <= that time (NaN before the
+    first sample, or when the latest sample is older than `max_age` ms).
+    """
+    result = np.full(len(at), np.nan)
+    if len(sample_ts) == 0 or len(at) == 0:
+        return result
+    index = np.searchsorted(sample_ts, at, side='right') - 1
+    known = index >= 0
+    if max_age is not None:
+        known &= at - sample_ts[np.maximum(index, 0)] <= max_age
+    result[known] = values[index[known]]
+    return result
+
+
+def change_over(sample_ts: np.ndarray, values: np.ndarray, window_ms: int) -> np.ndarray:
+    """Relative change of each sample against the as-of value `window_ms` earlier (NaN without one)."""
+    before = asof(sample_ts, values, sample_ts - window_ms)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return values / before - 1.0
+
+
+class DerivativesIngestor:
+    """
+    Keeps funding rate, open interest and long/short ratio series current for a symbol universe.
+
+    Each (symbol, metric) series has a watermark (its last stored sample), seeded from the storage
+    backend, so every pass requests only the samples after it, and skips the request entirely until
+    the next sample can exist (funding settles every 8h, the others every `period`). Requests run on a
+    bounded thread pool over the shared ccxt exchange, which throttles itself. Recent samples stay in
+    memory as columns; aligned() joins them onto a timeframe's bar grid for the 'derivatives' node.
+    """
+
+    def __init__(self, exchange: Any, db_manager: Any, symbols: Sequence[str],
+                 metrics: Iterable[str] = tuple(METRICS), period: str = '1h', concurrency: int = 8,
+                 lookback_days: int = 30, page_limit: int = 500, interval: float = 300.0):
+        """
+        Args:
+            exchange: ccxt swap exchange (e.g. SimpleDataProcessor.exchange).
+            db_manager: Storage backend with write_metric_data / query_metric_arrays, or None.
+            symbols (Sequence[str]): Perpetual symbols to keep current.
+            metrics (Iterable[str]): Subset of METRICS to ingest.
+            period (str): Sampling period of open interest and long/short ratio ('5m' .. '1d').
+            concurrency (int): Maximum concurrent exchange requests.
+            lookback_days (int): History kept in memory and fetched on the first pass
+                (Binance serves 30 days of open interest and long/short history).
+            page_limit (int): Maximum samples per exchange request.
+            interval (float): Seconds between background passes.
+        """
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise ValueError(f"Unknown derivatives metrics: {unknown}")
+        self.exchange = exchange
+        self.db_manager = db_manager
+        self.symbols = list(symbols)
+        self.metrics = list(metrics)
+        self.period = period
+        self.concurrency = concurrency
+        self.lookback_ms = lookback_days * DAY_MS
+        self.page_limit = page_limit
+        self.interval = interval
+        self._series: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+        self._unsupported: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pause = 0.0 if getattr(exchange, 'enableRateLimit', False) else getattr(exchange, 'rateLimit', 0) / 1000
+
+    def sample_interval(self, metric: str) -> int:
+        """Milliseconds between consecutive samples of a metric."""
+        return FUNDING_INTERVAL_MS if metric == 'funding' else timeframe_ms(self.period)
+
+    # ---------- fetching ----------
+
+    def _empty(self, metric: str) -> Dict[str, np.ndarray]:
+        return {'timestamp': np.empty(0, dtype=np.int64), **{f: np.empty(0) for f in METRICS[metric]}}
+
+    def _seed(self, symbol: str, metric: str) -> Dict[str, np.ndarray]:
+        if self.db_manager is None:
+            return self._empty(metric)
+        try:
+            stored = self.db_manager.query_metric_arrays(metric, symbol, METRICS[metric],
+                                                         time_range_start=f"-{self.lookback_ms // DAY_MS}d")
+            return {k: np.array(v) for k, v in stored.items()}
+        except Exception as e:
+            logger.warning(f"Could not seed {symbol} {metric} from storage: {e}")
+            return self._empty(metric)
+
+    def series(self, symbol: str, metric: str) -> Dict[str, np.ndarray]:
+        """In-memory columns ('timestamp' plus the metric's fields) of one series."""
+        with self._lock:
+            series = self._series.get((symbol, metric))
+        if series is None:
+            series = self._seed(symbol, metric)
+            with self._lock:
+                series = self._series.setdefault((symbol, metric), series)
+        return series
+
+    def watermark(self, symbol: str, metric: str) -> Optional[int]:
+        timestamps = self.series(symbol, metric)['timestamp']
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def refresh(self, symbol: str, metric: str, now: Optional[int] = None) -> int:
+        """Fetches the samples after the series' watermark, page by page; returns the samples added."""
+        if metric in self._unsupported:
+            return 0
+        now = int(time.time() * 1000) if now is None else now
+        last = self.watermark(symbol, metric)
+        step = self.sample_interval(metric)
+        if last is not None and now < last + step:
+            return 0
+        since = now - self.lookback_ms if last is None else last + 1
+        rows: Rows = []
+        while since < now:
+            try:
+                page = FETCHERS[metric](self.exchange, symbol, self.period, since, self.page_limit)
+            except UnsupportedMetric:
+                self._unsupported.add(metric)
+                logger.warning(f"Exchange has no '{metric}' history endpoint; skipping that metric.")
+                return 0
+            page = [r for r in page if r[0] >= since]
+            if not page:
+                break
+            rows.extend(page)
+            since = int(page[-1][0]) + 1
+            if len(page) < self.page_limit:
+                break
+            if self._pause:
+                time.sleep(self._pause)
+        if rows:
+            self._append(symbol, metric, rows, now)
+        return len(rows)
+
+    def _append(self, symbol: str, metric: str, rows: Rows, now: int):
+        fields = ('timestamp',) + METRICS[metric]
+        fresh = np.array(rows, dtype=np.float64).reshape(-1, len(fields))
+        if self.db_manager is not None:
+            import pandas as pd
+            frame = pd.DataFrame(fresh, columns=list(fields)).astype({'timestamp': np.int64})
+            self.db_manager.write_metric_data(metric, frame, symbol)
+        series = self.series(symbol, metric)
+        merged = {'timestamp': np.concatenate([series['timestamp'], fresh[:, 0].astype(np.int64)])}
+        for i, field in enumerate(fields[1:], start=1):
+            merged[field] = np.concatenate([series[field], fresh[:, i]])
+        _, first = np.unique(merged['timestamp'][::-1], return_index=True)  # last write wins
+        keep = len(merged['timestamp']) - 1 - first
+        keep = keep[merged['timestamp'][keep] >= now - self.lookback_ms]
+        with self._lock:
+            self._series[(symbol, metric)] = {k: v[keep] for k, v in merged.items()}
+
+    def run_once(self) -> int:
+        """One pass over every (symbol, metric) series; returns the samples added."""
+        started = time.perf_counter()
+        jobs = [(s, m) for s in self.symbols for m in self.metrics if m not in self._unsupported]
+        total = errors = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.refresh, s, m): (s, m) for s, m in jobs}
+            for future, (symbol, metric) in futures.items():
+                try:
+                    total += future.result()
+                except Exception as e:
+                    errors += 1
+                    logger.warning(f"Failed to fetch {symbol} {metric}: {e}")
+        logger.info(f"Derivatives pass: {total} samples for {len(jobs)} series "
+                    f"in {time.perf_counter() - started:.1f}s ({errors} with fetch errors).")
+        return total
+
+    def run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name='derivatives', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- alignment ----------
+
+    def aligned(self, symbol: str, timeframe: str, bar_timestamps: Any) -> Dict[str, np.ndarray]:
+        """
+        Every DERIVATIVE_OUTPUTS key as an array parallel to the bars: each bar gets the last sample
+        known at its close (open time + timeframe), NaN where none is known or it is older than two
+        sample intervals. Detectors read these columns instead of looking samples up per bar.
+        """
+        at = np.asarray(bar_timestamps, dtype=np.int64) + timeframe_ms(timeframe)
+        result = {key: np.full(len(at), np.nan) for key in DERIVATIVE_OUTPUTS}
+        for metric in self.metrics:
+            series = self.series(symbol, metric)
+            max_age = 2 * self.sample_interval(metric)
+            for field in METRICS[metric]:
+                result[field] = asof(series['timestamp'], series[field], at, max_age)
+            if metric == 'open_interest':
+                change = change_over(series['timestamp'], series['open_interest'], DAY_MS)
+                result['open_interest_change_1d'] = asof(series['timestamp'], change, at, max_age)
+        return result
+
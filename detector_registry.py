@@ -0,0 +1,251 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import indicators as ind
+from center_index import build_center_index
+from chan_levels import build_levels
+from cross_asset import CROSS_ASSET_OUTPUTS
+from derivatives import DERIVATIVE_OUTPUTS
+from orderbook import ORDERBOOK_OUTPUTS
+from ohlcv import OHLCVArrays, as_columns
+
+# ================== 指标 / 结构节点 ==================
+# 每个节点声明其依赖的节点与产出的扁平键（如 'macd' 节点产出 macd/signal_line/macd_hist），
+# 由 AnalysisContext 按需惰性求值，同一 (symbol, timeframe, 数据版本) 下每个节点只计算一次。
+
+
+@dataclass(frozen=True)
+class IndicatorNode:
+    """DAG 中的一个指标或结构节点"""
+    name: str
+    deps: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    func: Callable[['AnalysisContext'], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class DetectorSpec:
+    """已注册的检测器：声明依赖的节点，返回 Signal 列表"""
+    name: str
+    requires: Tuple[str, ...]
+    func: Callable[..., List[Any]]
+
+
+INDICATOR_NODES: Dict[str, IndicatorNode] = {}
+OUTPUT_INDEX: Dict[str, str] = {}  # 扁平键 -> 产出该键的节点名
+DETECTORS: Dict[str, DetectorSpec] = {}
+
+
+def register_indicator(name: str, deps: Iterable[str] = (), outputs: Iterable[str] = ()):
+    """注册一个指标/结构节点；outputs 缺省为节点名本身"""
+    def decorator(func):
+        node = IndicatorNode(name=name, deps=tuple(deps), outputs=tuple(outputs) or (name,), func=func)
+        INDICATOR_NODES[name] = node
+        for key in node.outputs:
+            OUTPUT_INDEX[key] = name
+        return func
+    return decorator
+
+
+def register_detector(name: str, requires: Iterable[str] = ()):
+    """注册一个检测器，func(detector, timeframe, context) -> List[Signal]"""
+    def decorator(func):
+        DETECTORS[name] = DetectorSpec(name=name, requires=tuple(requires), func=func)
+        return func
+    return decorator
+
+
+# ================== 内置节点 ==================
+
+@register_indicator('ohlcv')
+def _ohlcv_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    return {'ohlcv': as_columns(ctx.ohlcv)}
+
+
+@register_indicator('price', deps=('ohlcv',), outputs=('close', 'volume'))
+def _price_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    data = as_columns(ctx['ohlcv'])
+    return {'close': data.close, 'volume': data.volume}
+
+
+@register_indicator('macd', deps=('price',), outputs=('macd', 'signal_line', 'macd_hist'))
+def _macd_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    return ind.macd(ctx['close'])
+
+
+@register_indicator('rsi', deps=('price',))
+def _rsi_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    return {'rsi': ind.rsi(ctx['close'])}
+
+
+@register_indicator('bbands', deps=('price',), outputs=('middle_band', 'upper_band', 'lower_band', 'bandwidth'))
+def _bbands_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    return ind.bollinger_bands(ctx['close'])
+
+
+@register_indicator('ema20', deps=('price',))
+def _ema20_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    return {'ema20': ind.ema(ctx['close'], 20)}
+
+
+@register_indicator('chan', deps=('ohlcv', 'macd'))
+def _chan_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    """缠论结构 (strokes, segments, centers, buy_sell_points)；配置了有界窗口时只含工作窗口内的结构"""
+    if ctx.chan_windows is not None:
+        return {'chan': ctx.chan_windows.update(ctx.symbol, ctx.timeframe, ctx['ohlcv'])}
+    return {'chan': ctx.chan_analyzer.analyze(ctx['ohlcv'], ctx['macd_hist'])}
+
+
+@register_indicator('chan_levels', deps=('chan',))
+def _chan_levels_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    """多级别结构 List[ChanLevel]：由本周期的笔递归导出；配置了 chan_levels 时按 (symbol, timeframe) 增量更新"""
+    strokes = ctx['chan'][0]
+    if ctx.chan_levels is not None:
+        return {'chan_levels': ctx.chan_levels.update(ctx.symbol, ctx.timeframe, strokes)}
+    return {'chan_levels': build_levels(strokes, analyzer=ctx.chan_analyzer)}
+
+
+@register_indicator('center_index', deps=('chan_levels',))
+def _center_index_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    """
+    中枢区间索引 CenterIndex（价格所在中枢、上下最近 ZG/ZD）；配置了 center_index 时按 (symbol, timeframe) 增量维护。
+    中枢与段取自 chan_levels 的 level 1（以笔划段），'chan' 节点的同向断段几乎总是只得到一段、没有中枢。
+    """
+    level = ctx['chan_levels'][0] if ctx['chan_levels'] else None
+    segments, centers = (level.segments, level.centers) if level is not None else ([], [])
+    if ctx.center_index is not None:
+        return {'center_index': ctx.center_index.update(ctx.symbol, ctx.timeframe, centers, segments)}
+    return {'center_index': build_center_index(centers, segments)}
+
+
+@register_indicator('derivatives', deps=('ohlcv',), outputs=DERIVATIVE_OUTPUTS)
+def _derivatives_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    """资金费率、持仓量、多空比等衍生品数据，按本周期K线收盘时间 as-of 对齐；未配置或无数据处为 NaN"""
+    timestamps = as_columns(ctx['ohlcv']).timestamp
+    if ctx.derivatives is None:
+        return {key: np.full(len(timestamps), np.nan) for key in DERIVATIVE_OUTPUTS}
+    return ctx.derivatives.aligned(ctx.symbol, ctx.timeframe, timestamps)
+
+
+@register_indicator('orderbook', deps=('ohlcv',), outputs=ORDERBOOK_OUTPUTS)
+def _orderbook_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    """盘口特征（买卖失衡、带内深度、挂单堆积档数等）按K线聚合后对齐到本周期；未记录处为 NaN"""
+    timestamps = as_columns(ctx['ohlcv']).timestamp
+    if ctx.orderbook is None:
+        return {key: np.full(len(timestamps), np.nan) for key in ORDERBOOK_OUTPUTS}
+    return ctx.orderbook.aligned(ctx.symbol, ctx.timeframe, timestamps)
+
+
+@register_indicator('cross_asset', deps=('ohlcv',), outputs=CROSS_ASSET_OUTPUTS)
+def _cross_asset_node(ctx: 'AnalysisContext') -> Dict[str, Any]:
+    """跨品种特征（与基准的滚动相关系数、beta、相对强弱及其全市场分位）按K线对齐；未配置或不在品种池处为 NaN"""
+    timestamps = as_columns(ctx['ohlcv']).timestamp
+    if ctx.cross_asset is None:
+        return {key: np.full(len(timestamps), np.nan) for key in CROSS_ASSET_OUTPUTS}
+    return ctx.cross_asset.aligned(ctx.symbol, ctx.timeframe, timestamps)
+
+
+# ================== 求值上下文与缓存 ==================
+
+class IndicatorCache:
+    """按 (symbol, timeframe) 保存最近一个数据版本的节点结果，LRU 淘汰"""
+
+    def __init__(self, max_series: int = 256):
+        self.max_series = max_series
+        self._series: 'OrderedDict[Tuple[str, str], Tuple[Any, Dict[str, Dict[str, Any]]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def results_for(self, symbol: str, timeframe: str, version: Any) -> Dict[str, Dict[str, Any]]:
+        """返回该版本的节点结果字典（可原地写入）；版本变化时旧结果整体作废"""
+        key = (symbol, timeframe)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, {})
+                self._series[key] = entry
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+            return entry[1]
+
+
+def data_version(ohlcv: Any) -> Tuple:
+    """默认数据版本：K线数量 + 最后一根K线（未收盘K线更新时版本也会变化）"""
+    if len(ohlcv) == 0:
+        return (0,)
+    if isinstance(ohlcv, OHLCVArrays) or hasattr(ohlcv, 'columns'):
+        return (len(ohlcv),) + as_columns(ohlcv).row(-1)
+    return (len(ohlcv),) + tuple(float(x) for x in ohlcv[-1])
+
+
+class AnalysisContext(Mapping):
+    """
+    惰性的指标字典：对扁平键（'macd_hist'、'rsi'、'chan' 等）的首次访问才会计算对应节点及其依赖，
+    结果写入 IndicatorCache。可以像原来的 indicators dict 一样传给 SignalDetector 的 detect_* 方法。
+    """
+
+    def __init__(self, symbol: str, timeframe: str, ohlcv: Any, cache: Optional[IndicatorCache] = None,
+                 version: Any = None, chan_analyzer: Any = None, overrides: Optional[Dict[str, Any]] = None,
+                 chan_windows: Any = None, chan_levels: Any = None, derivatives: Any = None,
+                 orderbook: Any = None, center_index: Any = None, cross_asset: Any = None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.ohlcv = ohlcv
+        self.chan_analyzer = chan_analyzer
+        self.chan_windows = chan_windows
+        self.chan_levels = chan_levels
+        self.derivatives = derivatives
+        self.orderbook = orderbook
+        self.center_index = center_index
+        self.cross_asset = cross_asset
+        self.overrides = dict(overrides or {})
+        version = data_version(ohlcv) if version is None else version
+        self._results = (cache or IndicatorCache()).results_for(symbol, timeframe, version)
+        self._evaluating = set()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.overrides:
+            return self.overrides[key]
+        if key not in OUTPUT_INDEX:
+            raise KeyError(key)
+        return self.evaluate(OUTPUT_INDEX[key])[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.overrides or key in OUTPUT_INDEX
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(set(OUTPUT_INDEX) | set(self.overrides))
+
+    def __len__(self) -> int:
+        return len(set(OUTPUT_INDEX) | set(self.overrides))
+
+    def evaluate(self, node_name: str) -> Dict[str, Any]:
+        """计算（或从缓存读取）一个节点，先递归计算其依赖"""
+        if node_name in self._results:
+            return self._results[node_name]
+        node = INDICATOR_NODES[node_name]
+        if node_name in self._evaluating:
+            raise ValueError(f"Cyclic indicator dependency at '{node_name}'")
+        self._evaluating.add(node_name)
+        try:
+            for dep in node.deps:
+                self.evaluate(dep)
+            result = node.func(self)
+        finally:
+            self._evaluating.discard(node_name)
+        self._results[node_name] = result
+        return result
+
+    def require(self, names: Iterable[str]):
+        """预先计算给定的节点（或扁平键）及其依赖，每个节点最多计算一次"""
+        for name in names:
+            self.evaluate(OUTPUT_INDEX.get(name, name) if name not in INDICATOR_NODES else name)
+
+    def computed(self) -> List[str]:
+        """当前数据版本下已经计算过的节点名"""
+        return list(self._results)
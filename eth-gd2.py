@@ -3,6 +3,7 @@ import pandas as pd
 import ta
 import logging
 import requests
+import os
 import time
 from datetime import datetime, timedelta
 from flask import Flask, request
@@ -20,6 +21,14 @@ REQUEST_TIMEOUT = 10
 exchange = ccxt.binance({'enableRateLimit': True})
 symbol = 'ETH/USDT'
 
+# 信号阈值（可由参数扫描 param_sweep.py 调优）
+VOLUME_BREAKOUT_RATIO = 1.5   # 4小时放量：成交量 > 均量的倍数
+RSI_DIVERGENCE_LOOKBACK = 5   # 日线RSI背离 / 周线EMA方向的回看K线数
+
+STRATEGY_INTERVAL_SECONDS = 900  # 后台策略循环间隔（15分钟）
+# 接口可接受的最大快照年龄，超过后由第一个请求触发刷新（其余请求合并等待同一次刷新）
+MAX_SNAPSHOT_STALENESS = int(os.getenv('MAX_SNAPSHOT_STALENESS', str(STRATEGY_INTERVAL_SECONDS * 2)))
+
 # ================== 通用函数 ==================
 def send_telegram(message: str) -> bool:
     url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
@@ -58,7 +67,7 @@ def calc_indicators(df):
     df['bb_low'] = bb.bollinger_lband()
     return df
 
-def detect_signals():
+def detect_signals(volume_ratio=VOLUME_BREAKOUT_RATIO, lookback=RSI_DIVERGENCE_LOOKBACK):
     df_1w = calc_indicators(fetch_ohlcv(symbol, '1w', 60))
     df_1d = calc_indicators(fetch_ohlcv(symbol, '1d', 180))
     df_4h = calc_indicators(fetch_ohlcv(symbol, '4h', 200))
@@ -66,14 +75,14 @@ def detect_signals():
 
     signals = []
     
-    if df_1w['ema20'].iloc[-1] > df_1w['ema20'].iloc[-5]:
+    if df_1w['ema20'].iloc[-1] > df_1w['ema20'].iloc[-lookback]:
         signals.append('周线EMA上升')
 
-    if df_1d['close'].iloc[-1] < df_1d['close'].iloc[-5] and df_1d['rsi'].iloc[-1] > df_1d['rsi'].iloc[-5]:
+    if df_1d['close'].iloc[-1] < df_1d['close'].iloc[-lookback] and df_1d['rsi'].iloc[-1] > df_1d['rsi'].iloc[-lookback]:
         signals.append('日线RSI底背离')
 
     if (df_4h['close'].iloc[-1] > df_4h['bb_high'].iloc[-1] and
-        df_4h['volume'].iloc[-1] > 1.5 * df_4h['volume_ma'].iloc[-1]):
+        df_4h['volume'].iloc[-1] > volume_ratio * df_4h['volume_ma'].iloc[-1]):
         signals.append('4小时放量突破')
 
     if (df_1h['macd'].iloc[-1] > df_1h['macdsignal'].iloc[-1] and
@@ -82,6 +91,62 @@ def detect_signals():
 
     return signals
 
+class AnalysisSnapshot:
+    """
+    进程内共享的最新分析结果。
+
+    后台循环定期刷新；接口直接读取快照。刷新采用 single-flight：同一时刻只有一个线程
+    调用 detect_signals()，并发的刷新请求（包括 force）等待并共享这一次的结果。
+    """
+
+    def __init__(self, compute, max_staleness):
+        self._compute = compute
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._inflight = None  # 正在进行的刷新完成事件
+        self._error = None
+        self.signals = None
+        self.updated_at = 0.0
+
+    def age(self):
+        return time.time() - self.updated_at if self.updated_at else float('inf')
+
+    def get(self, force=False):
+        """返回 (signals, 快照年龄秒数)；快照过期或 force 时刷新"""
+        if not force and self.signals is not None and self.age() <= self.max_staleness:
+            return self.signals, self.age()
+        return self.refresh(), self.age()
+
+    def refresh(self):
+        with self._lock:
+            done = self._inflight
+            leader = done is None
+            if leader:
+                done = self._inflight = threading.Event()
+        if not leader:
+            done.wait()
+            with self._lock:
+                if self._error is not None and self.signals is None:
+                    raise self._error
+                return self.signals
+
+        try:
+            signals = self._compute()
+            with self._lock:
+                self.signals, self.updated_at, self._error = signals, time.time(), None
+            return signals
+        except Exception as e:
+            with self._lock:
+                self._error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight = None
+            done.set()
+
+
+snapshot = AnalysisSnapshot(detect_signals, MAX_SNAPSHOT_STALENESS)
+
 def generate_strategy_message(signals):
     now = (datetime.utcnow() + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M (北京时间)")
     if len(signals) >= 3:
@@ -106,22 +171,25 @@ def strategy_loop():
     while True:
         try:
             app.logger.info("开始执行 15 分钟策略检测")
-            signals = detect_signals()
+            signals = snapshot.refresh()
             msg = generate_strategy_message(signals)
             send_telegram(msg)
             app.logger.info("策略推送完成，休眠 15 分钟")
         except Exception as e:
             app.logger.error(f"策略循环异常: {e}")
-        time.sleep(900)  # 15分钟
+        time.sleep(STRATEGY_INTERVAL_SECONDS)
 
 # ================== Flask 接口 ==================
 @app.route("/predict_strategy", methods=["POST"])
 def predict_strategy():
     try:
-        signals = detect_signals()
+        # 读取共享快照，不直接访问交易所；force=true 强制刷新（并发请求共享同一次刷新）
+        force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+        signals, age = snapshot.get(force=force)
         msg = generate_strategy_message(signals)
-        send_telegram(msg)
-        return "策略预测已发送", 200
+        # Telegram 推送放到后台线程，接口响应时间与推送耗时无关
+        threading.Thread(target=send_telegram, args=(msg,), daemon=True).start()
+        return "策略预测已发送", 200, {'X-Snapshot-Age': f"{age:.1f}"}
     except Exception as e:
         app.logger.error(f"策略预测失败: {e}")
         return f"策略预测失败: {e}", 500
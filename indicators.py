@@ -0,0 +1,107 @@
+import numpy as np
+from typing import Dict, Sequence
+
+# ================== 技术指标计算（纯 NumPy） ==================
+# 输出与 ta 库的默认实现保持一致（EMA 使用 adjust=False，RSI 使用 Wilder 平滑），
+# 但只依赖 NumPy，便于在参数扫描的多进程中和热路径上直接使用。
+
+
+def ema(values: np.ndarray, window: int) -> np.ndarray:
+    """指数移动平均，前 window-1 根为 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) < window:
+        return out
+    alpha = 2.0 / (window + 1)
+    acc = out[0] = values[0]
+    for i in range(1, len(values)):
+        acc = alpha * values[i] + (1 - alpha) * acc
+        out[i] = acc
+    out[:window - 1] = np.nan
+    return out
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均（包含当前K线），前 window-1 根为 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) < window:
+        return out
+    csum = np.cumsum(np.insert(values, 0, 0.0))
+    out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """总体标准差（ddof=0），与 ta 库布林带一致"""
+    values = np.asarray(values, dtype=np.float64)
+    mean = rolling_mean(values, window)
+    mean_sq = rolling_mean(values * values, window)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    """MACD 快线、信号线与柱状图"""
+    macd_line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(len(macd_line), np.nan)
+    valid = ~np.isnan(macd_line)
+    if valid.any():
+        first = int(np.argmax(valid))
+        signal_line[first:] = ema(macd_line[first:], signal)
+    return {
+        'macd': macd_line,
+        'signal_line': signal_line,
+        'macd_hist': macd_line - signal_line,
+    }
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Wilder RSI"""
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(len(close), np.nan)
+    if len(close) <= window:
+        return out
+    diff = np.diff(close, prepend=close[0])
+    up = np.clip(diff, 0, None)
+    down = np.clip(-diff, 0, None)
+    alpha = 1.0 / window
+    avg_up, avg_down = up[0], down[0]
+    for i in range(len(close)):
+        if i:
+            avg_up = alpha * up[i] + (1 - alpha) * avg_up
+            avg_down = alpha * down[i] + (1 - alpha) * avg_down
+        if avg_down == 0:
+            out[i] = 100.0 if avg_up > 0 else 50.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_up / avg_down)
+    out[:window - 1] = np.nan
+    return out
+
+
+def bollinger_bands(close: np.ndarray, window: int = 20, num_std: float = 2.0) -> Dict[str, np.ndarray]:
+    """布林带上下轨及带宽（(上轨-下轨)/中轨，0.05 即 5%）"""
+    middle = rolling_mean(close, window)
+    std = rolling_std(close, window)
+    upper = middle + num_std * std
+    lower = middle - num_std * std
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bandwidth = (upper - lower) / middle
+    return {
+        'middle_band': middle,
+        'upper_band': upper,
+        'lower_band': lower,
+        'bandwidth': bandwidth,
+    }
+
+
+def compute_indicators(ohlcv: Sequence[Sequence[float]]) -> Dict[str, np.ndarray]:
+    """根据 OHLCV 计算 SignalDetector 所需的全部指标"""
+    data = np.asarray(ohlcv, dtype=np.float64)
+    if data.ndim != 2 or len(data) == 0:
+        return {}
+    close = data[:, 4]
+    indicators = {'close': close, 'volume': data[:, 5]}
+    indicators.update(macd(close))
+    indicators['rsi'] = rsi(close)
+    indicators.update(bollinger_bands(close))
+    return indicators
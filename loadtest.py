@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import numpy as np
+from ccxt.base.errors import BadSymbol, RateLimitExceeded
+
+from logging_config import logger
+from ohlcv import grid_offset_ms, timeframe_ms
+
+# ================== Fake exchange ==================
+
+
+class FakeExchange:
+    """
+    Offline stand-in for a ccxt exchange: deterministic synthetic OHLCV through the same
+    fetch_ohlcv / load_markets interface, with configurable latency and rate limiting.
+
+    Each bar is a pure function of (symbol, timeframe, bar index): trending waves plus hashed noise,
+    so every run sees the same history and any range can be served without generating the rest.
+    `now_ms` is the simulated clock; advance it to make new bars appear.
+    """
+
+    def __init__(self, n_symbols: int = 300, latency: float = 0.05, jitter: float = 0.02,
+                 rate_limit: float = 0.0, now_ms: Optional[int] = None, seed: int = 0):
+        """
+        Args:
+            n_symbols (int): Number of listed USDT swaps (SYM0/USDT, SYM1/USDT, ...).
+            latency (float): Mean seconds per request.
+            jitter (float): Uniform +/- seconds added to the latency.
+            rate_limit (float): Requests per second before RateLimitExceeded is raised; 0 disables it.
+            now_ms (Optional[int]): Initial simulated time; defaults to the wall clock.
+            seed (int): Base seed of the synthetic series.
+        """
+        self.symbols = [f"SYM{i}/USDT" for i in range(n_symbols)]
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        self.seed = seed
+        self.requests = 0
+        self.rate_limited = 0
+        self._window: List[float] = []
+        self._lock = threading.Lock()
+
+    def load_markets(self) -> Dict[str, Dict[str, Any]]:
+        return {s: {'symbol': s, 'base': s.split('/')[0], 'quote': 'USDT', 'swap': True, 'active': True}
+                for s in self.symbols}
+
+    def _admit(self):
+        """Sliding one-second window, like an exchange's request weight limit."""
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit <= 0:
+                return
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                self.rate_limited += 1
+                raise RateLimitExceeded(f"fake exchange: more than {self.rate_limit:g} requests/s")
+            self._window.append(now)
+
+    def _bar(self, symbol: str, timeframe: str, index: np.ndarray) -> np.ndarray:
+        """Bars by absolute bar index; each bar depends only on (symbol, timeframe, index)."""
+        key = zlib.crc32(f"{self.seed}|{symbol}|{timeframe}".encode())
+        u = ((index * 2654435761 + key) % 2**32) / 2**32
+        v = ((index * 40503 + key * 7 + 12345) % 2**32) / 2**32
+        base = 100.0 + (key % 1000)
+        close = base * (1 + 0.2 * np.sin(index / 37.0 + key % 17) + 0.05 * np.sin(index / 5.3) + 0.01 * (u - 0.5))
+        open_ = base * (1 + 0.2 * np.sin((index - 1) / 37.0 + key % 17) + 0.05 * np.sin((index - 1) / 5.3))
+        high = np.maximum(open_, close) * (1 + 0.004 * v)
+        low = np.minimum(open_, close) * (1 - 0.004 * u)
+        volume = 1000 * (1 + 3 * (u > 0.95)) * (0.5 + v)
+        return np.column_stack([index * timeframe_ms(timeframe) + grid_offset_ms(timeframe), open_, high, low, close, volume])
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1h', since: Optional[int] = None,
+                    limit: Optional[int] = None, params: Optional[Dict] = None) -> List[List[float]]:
+        if symbol not in self.symbols:
+            raise BadSymbol(f"fake exchange does not have market symbol {symbol}")
+        self._admit()
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        step, offset = timeframe_ms(timeframe), grid_offset_ms(timeframe)
+        limit = limit or 500
+        last = (self.now_ms - offset) // step  # index of the currently open bar
+        first = max(0, (since - offset) // step if since is not None else last - limit + 1)
+        index = np.arange(first, min(last, first + limit - 1) + 1, dtype=np.int64)
+        rows = self._bar(symbol, timeframe, index)
+        rows[:, 0] = index * step + offset
+        return rows.tolist()
+
+
+# ================== Stub Telegram Bot API ==================
+
+
+class TelegramStub:
+    """
+    Minimal Bot API endpoint on localhost that accepts sendMessage and records arrival times.
+    Point TelegramNotifier at it with base_url=stub.base_url.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.messages: List[Dict[str, Any]] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rsplit('/', 1)[-1]
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    payload = json.loads(body or b'{}')
+                else:
+                    payload = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                stub.messages.append({'method': method, 'received': time.perf_counter(), **payload})
+                result = {'message_id': len(stub.messages), 'date': int(time.time()),
+                          'chat': {'id': int(payload.get('chat_id', 0) or 0), 'type': 'private'},
+                          'text': payload.get('text', '')}
+                data = json.dumps({'ok': True, 'result': result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.base_url = f"http://{host}:{self.server.server_address[1]}/bot"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> 'TelegramStub':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class KlineStreamStub:
+    """
+    Local combined-stream WebSocket endpoint in Binance's kline format, fed from a FakeExchange.
+
+    Every `tick` seconds it advances the exchange's simulated clock by `sim_ms_per_tick`, pushes an
+    open-candle update for each subscribed stream and a closed kline whenever a bar boundary is
+    crossed. `drop_every` closes each connection after that many messages to exercise reconnects.
+    """
+
+    def __init__(self, exchange: FakeExchange, tick: float = 0.05, sim_ms_per_tick: int = 60_000,
+                 drop_every: int = 0):
+        self.exchange = exchange
+        self.tick = tick
+        self.sim_ms_per_tick = sim_ms_per_tick
+        self.drop_every = drop_every
+        self.connections = 0
+        self.url = ''
+        self._runner = None
+        self._clock = None
+
+    async def _advance_clock(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.exchange.now_ms += self.sim_ms_per_tick
+
+    def _kline(self, symbol: str, timeframe: str, index: int, closed: bool) -> Dict[str, Any]:
+        t, o, h, l, c, v = self.exchange._bar(symbol, timeframe, np.array([index]))[0]
+        step, offset = timeframe_ms(timeframe), grid_offset_ms(timeframe)
+        return {'e': 'kline', 's': symbol.replace('/', ''), 'k': {
+            't': int(index * step + offset), 'T': int((index + 1) * step + offset - 1), 's': symbol.replace('/', ''), 'i': timeframe,
+            'o': str(o), 'h': str(h), 'l': str(l), 'c': str(c), 'v': str(v), 'x': closed}}
+
+    async def _handle(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        streams = request.query.get('streams', '').split('/')
+        by_name = {f"{s.replace('/', '').lower()}@kline_{tf}": (s, tf)
+                   for s in self.exchange.symbols for tf in ('1m', '5m', '15m', '1h', '4h', '1d', '1w')}
+        series = [(name, by_name[name]) for name in streams if name in by_name]
+        last_index = {name: (self.exchange.now_ms - grid_offset_ms(tf)) // timeframe_ms(tf) for name, (_, tf) in series}
+        sent = 0
+        while not ws.closed:
+            await asyncio.sleep(self.tick)
+            for name, (symbol, timeframe) in series:
+                index = (self.exchange.now_ms - grid_offset_ms(timeframe)) // timeframe_ms(timeframe)
+                messages = [self._kline(symbol, timeframe, i, True) for i in range(last_index[name], index)]
+                messages.append(self._kline(symbol, timeframe, index, False))
+                last_index[name] = index
+                for message in messages:
+                    await ws.send_str(json.dumps({'stream': name, 'data': message}))
+                    sent += 1
+                    if self.drop_every and sent % self.drop_every == 0:
+                        await ws.close()
+                        return ws
+        return ws
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/stream', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.url = f"ws://{host}:{site._server.sockets[0].getsockname()[1]}/stream"
+        self._clock = asyncio.ensure_future(self._advance_clock())
+        return self.url
+
+    async def stop(self):
+        if self._clock is not None:
+            self._clock.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# ================== Load driver ==================
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    values = np.asarray(samples)
+    return {'p50': float(np.percentile(values, 50)), 'p90': float(np.percentile(values, 90)),
+            'p99': float(np.percentile(values, 99)), 'max': float(values.max())}
+
+
+def run_load(n_symbols: int = 300, cycles: int = 5, timeframes: Optional[List[str]] = None,
+             schedule_minutes: int = 5, concurrency: int = 16, latency: float = 0.05,
+             rate_limit: float = 0.0, mode: str = 'scan') -> Dict[str, Any]:
+    """
+    Runs bot.py's job `cycles` times against the fake exchange and the Telegram stub, advancing
+    the simulated clock by one schedule slot per cycle without waiting for it.
+
+    mode='scan' runs the scanner job over every listed symbol; mode='job' runs the single-symbol
+    job once per symbol. Returns latency percentiles in seconds (per cycle, cycle start to the last
+    Telegram message of the cycle, and per symbol in job mode) and throughput in symbols/minute.
+    """
+    import bot
+    from local_store import LocalBarStore
+    from scanner import MarketScanner
+    from signal_detector import SignalDetector
+    from simple_data_processor import SimpleDataProcessor
+    from strategy_notifier import StrategyNotifier
+
+    timeframes = timeframes or ['1h', '4h', '1d', '1w']
+    step_ms = schedule_minutes * 60_000
+    # Start in the past so the simulated clock never runs ahead of the wall clock.
+    exchange = FakeExchange(n_symbols, latency=latency, rate_limit=rate_limit,
+                            now_ms=int(time.time() * 1000) - cycles * step_ms)
+    store_root = tempfile.mkdtemp(prefix='loadtest_bars_')
+    cycle_latency, symbol_latency, notify_latency = [], [], []
+    try:
+        with TelegramStub() as stub:
+            store = LocalBarStore(store_root)
+            detector = SignalDetector()
+            notifier = StrategyNotifier({'token': '0:loadtest', 'chat_id': '1', 'base_url': stub.base_url})
+            app_config = {'exchange': {}, 'symbol': exchange.symbols[0], 'timeframes': timeframes}
+            processor = SimpleDataProcessor(app_config, store, exchange=exchange)
+            scanner = MarketScanner(exchange, store, detector, timeframes, concurrency=concurrency)
+
+            started = time.perf_counter()
+            for cycle in range(cycles):
+                exchange.now_ms += step_ms
+                cycle_start = time.perf_counter()
+                if mode == 'scan':
+                    bot.run_market_scan('all', scanner, notifier, top_n=20)
+                else:
+                    for symbol in exchange.symbols:
+                        symbol_start = time.perf_counter()
+                        processor.symbol = app_config['symbol'] = symbol
+                        bot.run_job(app_config, processor, store, detector, notifier)
+                        symbol_latency.append(time.perf_counter() - symbol_start)
+                cycle_latency.append(time.perf_counter() - cycle_start)
+                delivered = [m['received'] for m in stub.messages if m['received'] >= cycle_start]
+                if delivered:
+                    notify_latency.append(max(delivered) - cycle_start)
+                logger.info(f"[LOADTEST] cycle {cycle + 1}/{cycles}: {cycle_latency[-1]:.2f}s")
+            elapsed = time.perf_counter() - started
+            store.close()
+            messages = len(stub.messages)
+    finally:
+        shutil.rmtree(store_root, ignore_errors=True)
+
+    return {
+        'mode': mode,
+        'symbols': n_symbols,
+        'timeframes': len(timeframes),
+        'cycles': cycles,
+        'cycle_latency_s': percentiles(cycle_latency),
+        'notify_latency_s': percentiles(notify_latency),
+        'symbol_latency_s': percentiles(symbol_latency) if symbol_latency else None,
+        'throughput_symbols_per_min': n_symbols * cycles / elapsed * 60 if elapsed else 0.0,
+        'fits_schedule_slot': max(cycle_latency, default=0.0) < schedule_minutes * 60,
+        'exchange_requests': exchange.requests,
+        'rate_limited': exchange.rate_limited,
+        'telegram_messages': messages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test against a fake exchange and Telegram stub.")
+    parser.add_argument('--symbols', type=int, default=300)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--timeframes', default='1h,4h,1d,1w')
+    parser.add_argument('--schedule-minutes', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.05, help="Mean exchange latency in seconds.")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Exchange requests/s before 429s (0 = off).")
+    parser.add_argument('--mode', choices=['scan', 'job'], default='scan')
+    args = parser.parse_args()
+
+    report = run_load(args.symbols, args.cycles, args.timeframes.split(','), args.schedule_minutes,
+                      args.concurrency, args.latency, args.rate_limit, args.mode)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logging_config import logger
+from ohlcv import OHLCV_FIELDS, OHLCVArrays, empty_ohlcv
+
+_DTYPES = {'timestamp': np.int64, **{f: np.float64 for f in OHLCV_FIELDS[1:]}}
+
+
+def _dtype(field: str) -> Any:
+    """Column dtype: int64 epoch ms for 'timestamp', float64 for every other column."""
+    return _DTYPES.get(field, np.float64)
+_DURATION_MS = {'ms': 1, 's': 1_000, 'm': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def parse_range_start(time_range_start: str, now_ms: Optional[int] = None) -> int:
+    """
+    Converts a Flux-style range start ('-30d', '-12h', '0', or an RFC3339 timestamp) into epoch ms,
+    so the local store accepts the same arguments as DatabaseManager.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    value = time_range_start.strip()
+    if value == '0':
+        return 0
+    match = re.fullmatch(r'-((?:\d+(?:ms|s|m|h|d|w))+)', value)
+    if match:
+        total = sum(int(n) * _DURATION_MS[unit] for n, unit in re.findall(r'(\d+)(ms|s|m|h|d|w)', match.group(1)))
+        return now_ms - total
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() * 1000)
+
+
+class _Series:
+    """
+    Append-only column files for one (symbol, measurement), with a sparse timestamp index. The
+    columns are the OHLCV fields for bars, or any other float columns (e.g. derivatives metrics).
+    With unique=False several rows may share a timestamp (event series); they are kept sorted by
+    timestamp and never overwritten.
+    """
+
+    def __init__(self, path: str, index_stride: int, fields: Sequence[str] = OHLCV_FIELDS, unique: bool = True):
+        self.path = path
+        self.index_stride = index_stride
+        self.fields = tuple(fields)
+        self.unique = unique
+        os.makedirs(path, exist_ok=True)
+        self._columns: Dict[str, np.memmap] = {}
+        self._length = os.path.getsize(self._file('timestamp')) // 8 if os.path.exists(self._file('timestamp')) else 0
+        self._load_index()
+
+    def _file(self, field: str) -> str:
+        return os.path.join(self.path, f"{field}.bin")
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _load_index(self):
+        """Rebuilds the sparse index (every index_stride-th timestamp) from the timestamp column."""
+        self.sparse_index = self.column('timestamp')[::self.index_stride].copy() if self._length else np.empty(0, np.int64)
+
+    def column(self, field: str) -> np.ndarray:
+        """Read-only memory map over a column file (remapped after the file grows)."""
+        cached = self._columns.get(field)
+        if cached is None or len(cached) != self._length:
+            if self._length == 0:
+                return np.empty(0, dtype=_dtype(field))
+            cached = np.memmap(self._file(field), dtype=_dtype(field), mode='r', shape=(self._length,))
+            self._columns[field] = cached
+        return cached
+
+    def seek(self, start_ms: int) -> int:
+        """First row with timestamp >= start_ms: binary search the sparse index, then one stride block."""
+        if self._length == 0:
+            return 0
+        block = max(int(np.searchsorted(self.sparse_index, start_ms, side='left')) - 1, 0)
+        lo = block * self.index_stride
+        hi = min(lo + 2 * self.index_stride, self._length)
+        return lo + int(np.searchsorted(self.column('timestamp')[lo:hi], start_ms, side='left'))
+
+    def read(self, start_ms: int, stop_ms: Optional[int] = None) -> OHLCVArrays:
+        lo = self.seek(start_ms)
+        hi = self._length if stop_ms is None else self.seek(stop_ms)
+        if lo >= hi:
+            return empty_ohlcv()
+        return OHLCVArrays(*(self.column(f)[lo:hi] for f in OHLCV_FIELDS))
+
+    def read_columns(self, start_ms: int, stop_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Zero-copy views of every column over [start_ms, stop_ms)."""
+        lo = self.seek(start_ms)
+        hi = self._length if stop_ms is None else self.seek(stop_ms)
+        return {f: self.column(f)[lo:max(lo, hi)] for f in self.fields}
+
+    def upsert(self, data: Dict[str, np.ndarray]):
+        """
+        Writes sorted, de-duplicated rows. Rows newer than the last stored bar are appended; rows that
+        match stored timestamps (e.g. the still-open candle) are overwritten in place; anything else
+        (back-filled gaps) triggers a merge-and-rewrite of the series.
+        """
+        ts = data['timestamp']
+        if len(ts) == 0:
+            return
+        last = int(self.column('timestamp')[-1]) if self._length else None
+        if last is None or ts[0] > last or (not self.unique and ts[0] == last):
+            self._append(data, slice(None))
+            return
+        if not self.unique:
+            self._rewrite(data)
+            return
+
+        stored = self.column('timestamp')
+        pos = np.searchsorted(stored, ts)
+        exists = (pos < self._length) & (stored[np.minimum(pos, self._length - 1)] == ts)
+        newer = ts > last
+        if np.all(exists | newer):
+            self._overwrite(data, exists, pos[exists])
+            self._append(data, newer)
+        else:
+            self._rewrite(data)
+
+    def _append(self, data: Dict[str, np.ndarray], rows: Any):
+        selected = {f: np.ascontiguousarray(data[f][rows], dtype=_dtype(f)) for f in self.fields}
+        if len(selected['timestamp']) == 0:
+            return
+        for field in self.fields:
+            with open(self._file(field), 'ab') as f:
+                f.write(selected[field].tobytes())
+        self._length = os.path.getsize(self._file('timestamp')) // 8
+        self._load_index()
+
+    def _overwrite(self, data: Dict[str, np.ndarray], rows: np.ndarray, positions: np.ndarray):
+        """
+        Replaces stored rows by writing each changed column to a new file and swapping it in, so
+        zero-copy views handed out earlier keep mapping the old file and never change under a reader.
+        """
+        if len(positions) == 0:
+            return
+        for field in self.fields[1:]:
+            column = np.array(self.column(field))
+            column[positions] = data[field][rows]
+            tmp = self._file(field) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(column.tobytes())
+            os.replace(tmp, self._file(field))
+        self._columns.clear()
+
+    def _rewrite(self, data: Dict[str, np.ndarray]):
+        existing = {f: np.array(self.column(f)) for f in self.fields}
+        merged = {f: np.concatenate([existing[f], data[f]]) for f in self.fields}
+        # Keep the newest write for duplicate timestamps: stable sort, then take the last of each run.
+        order = np.argsort(merged['timestamp'], kind='stable')
+        sorted_ts = merged['timestamp'][order]
+        keep = np.append(sorted_ts[1:] != sorted_ts[:-1], True) if self.unique else np.ones(len(order), dtype=bool)
+        self._columns.clear()
+        for field in self.fields:
+            tmp = self._file(field) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(np.ascontiguousarray(merged[field][order][keep], dtype=_dtype(field)).tobytes())
+            os.replace(tmp, self._file(field))
+        self._length = int(keep.sum())
+        self._load_index()
+
+
+class LocalBarStore:
+    """
+    Embedded, dependency-free OHLCV store with the same write/query interface as DatabaseManager.
+
+    Each (symbol, timeframe) is a directory of append-only binary column files that are read
+    through read-only memory maps, so range reads return zero-copy OHLCVArrays views.
+    """
+
+    def __init__(self, root: str, index_stride: int = 1024):
+        """
+        Args:
+            root (str): Directory holding the column files.
+            index_stride (int): Keep every N-th timestamp in the in-memory sparse index.
+        """
+        self.root = root
+        self.index_stride = index_stride
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        logger.info(f"Local bar store opened at '{os.path.abspath(root)}'.")
+
+    def _get_series(self, measurement: str, symbol: str, fields: Sequence[str] = OHLCV_FIELDS,
+                    unique: bool = True) -> _Series:
+        key = (symbol, measurement)
+        if key not in self._series:
+            safe_symbol = re.sub(r'[^A-Za-z0-9_.-]', '_', symbol)
+            self._series[key] = _Series(os.path.join(self.root, safe_symbol, measurement), self.index_stride,
+                                        fields, unique)
+        return self._series[key]
+
+    def write_ohlcv_data(self, measurement: str, data: 'pd.DataFrame', symbol: str):
+        """
+        Upserts OHLCV rows from a DataFrame with columns ['timestamp', 'open', 'high', 'low', 'close', 'volume'].
+
+        Args:
+            measurement (str): The timeframe (e.g., '1h').
+            data (pd.DataFrame): The rows to write; the last row for a timestamp wins.
+            symbol (str): The trading symbol (e.g., 'ETH/USDT').
+        """
+        try:
+            if data.empty:
+                return
+            frame = data.drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+            columns = {f: frame[f].to_numpy(dtype=_dtype(f)) for f in OHLCV_FIELDS}
+            with self._lock:
+                self._get_series(measurement, symbol).upsert(columns)
+            logger.info(f"Successfully wrote {len(frame)} data points to local store '{measurement}' for symbol {symbol}.")
+        except Exception as e:
+            logger.error(f"Failed to write data to local store: {e}")
+
+    def query_ohlcv_arrays(self, measurement: str, symbol: str, time_range_start: str = "-7d",
+                           time_range_stop: Optional[str] = None) -> OHLCVArrays:
+        """Returns read-only memory-mapped column views for the requested range."""
+        start_ms = parse_range_start(time_range_start)
+        stop_ms = parse_range_start(time_range_stop) if time_range_stop else None
+        with self._lock:
+            return self._get_series(measurement, symbol).read(start_ms, stop_ms)
+
+    def query_ohlcv_data(self, measurement: str, symbol: str, time_range_start: str = "-7d") -> 'pd.DataFrame':
+        """
+        Queries OHLCV data and returns it as a pandas DataFrame, sorted by time.
+
+        Args:
+            measurement (str): The timeframe (e.g., '1h').
+            symbol (str): The trading symbol.
+            time_range_start (str): Flux-style range start (e.g., '-30d') or RFC3339 timestamp.
+
+        Returns:
+            pd.DataFrame: Columns ['timestamp', 'open', 'high', 'low', 'close', 'volume'].
+        """
+        import pandas as pd
+        arrays = self.query_ohlcv_arrays(measurement, symbol, time_range_start)
+        return pd.DataFrame({f: np.asarray(getattr(arrays, f)) for f in OHLCV_FIELDS})
+
+    def write_metric_data(self, measurement: str, data: 'pd.DataFrame', symbol: str):
+        """
+        Upserts a non-OHLCV series (e.g. 'funding'): a 'timestamp' column plus float columns, stored as
+        column files next to the symbol's bars.
+
+        Args:
+            measurement (str): The series name.
+            data (pd.DataFrame): The rows to write; the last row for a timestamp wins.
+            symbol (str): The trading symbol.
+        """
+        try:
+            if data.empty:
+                return
+            frame = data.drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+            fields = ('timestamp',) + tuple(c for c in frame.columns if c != 'timestamp')
+            columns = {f: frame[f].to_numpy(dtype=_dtype(f)) for f in fields}
+            with self._lock:
+                self._get_series(measurement, symbol, fields).upsert(columns)
+        except Exception as e:
+            logger.error(f"Failed to write '{measurement}' to local store: {e}")
+
+    def query_metric_arrays(self, measurement: str, symbol: str, fields: Sequence[str],
+                            time_range_start: str = "-7d") -> Dict[str, np.ndarray]:
+        """Memory-mapped column views ('timestamp' plus `fields`) of a series written by write_metric_data."""
+        with self._lock:
+            return self._get_series(measurement, symbol, ('timestamp',) + tuple(fields)).read_columns(
+                parse_range_start(time_range_start))
+
+    def _event_schema(self, measurement: str) -> Dict[str, Any]:
+        """
+        Column layout of an event measurement, shared by all symbols: '<root>/<measurement>.schema.json'
+        lists the tag columns with the strings seen so far (stored as their position in that list) and
+        the float field columns.
+        """
+        schema = self._schemas.get(measurement)
+        if schema is None:
+            path = os.path.join(self.root, f"{measurement}.schema.json")
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    schema = json.load(f)
+            else:
+                schema = {'tags': {}, 'fields': []}
+            schema['codes'] = {tag: {v: i for i, v in enumerate(values)} for tag, values in schema['tags'].items()}
+            self._schemas[measurement] = schema
+        return schema
+
+    def _save_event_schema(self, measurement: str, schema: Dict[str, Any]):
+        path = os.path.join(self.root, f"{measurement}.schema.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'tags': schema['tags'], 'fields': schema['fields']}, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    def write_event_data(self, measurement: str, data: 'pd.DataFrame', symbol: str, tags: Sequence[str]):
+        """
+        Appends event rows (several may share a timestamp): 'timestamp', the string columns in `tags`
+        and float columns. Tag strings are stored as integer codes, so rows stay fixed-width column files
+        with the same sparse time index as bars. The first write fixes the measurement's columns; a row
+        identical to a stored one in timestamp and tags is skipped, so re-recording events is idempotent.
+
+        Args:
+            measurement (str): The event series name (e.g. 'signal_journal').
+            data (pd.DataFrame): The rows to write.
+            symbol (str): The trading symbol.
+            tags (Sequence[str]): Columns holding strings.
+        """
+        try:
+            if data.empty:
+                return
+            frame = data.sort_values('timestamp', kind='stable')
+            with self._lock:
+                schema = self._event_schema(measurement)
+                changed = not schema['tags'] and not schema['fields']
+                if changed:
+                    schema['tags'] = {tag: [] for tag in tags}
+                    schema['codes'] = {tag: {} for tag in tags}
+                    schema['fields'] = [c for c in frame.columns if c != 'timestamp' and c not in tags]
+                columns = {'timestamp': frame['timestamp'].to_numpy(dtype=np.int64)}
+                for tag, values in schema['tags'].items():
+                    codes = schema['codes'][tag]
+                    raw = frame[tag].astype(str).tolist() if tag in frame.columns else [''] * len(frame)
+                    for value in raw:
+                        if value not in codes:
+                            codes[value] = len(values)
+                            values.append(value)
+                            changed = True
+                    columns[tag] = np.array([codes[v] for v in raw], dtype=np.float64)
+                for field in schema['fields']:
+                    columns[field] = (frame[field].to_numpy(dtype=np.float64) if field in frame.columns
+                                      else np.full(len(frame), np.nan))
+                if changed:
+                    self._save_event_schema(measurement, schema)
+                layout = ('timestamp', *schema['tags'], *schema['fields'])
+                series = self._get_series(measurement, symbol, layout, unique=False)
+                ts = columns['timestamp']
+                stored = series.read_columns(int(ts[0]), int(ts[-1]) + 1)
+                existing = set(zip(*(stored[c].tolist() for c in ('timestamp', *schema['tags']))))
+                fresh = np.array([key not in existing for key in zip(*(columns[c].tolist() for c in ('timestamp', *schema['tags'])))],
+                                 dtype=bool)
+                if fresh.any():
+                    series.upsert({c: v[fresh] for c, v in columns.items()})
+        except Exception as e:
+            logger.error(f"Failed to write '{measurement}' events to local store: {e}")
+
+    def query_event_data(self, measurement: str, symbol: str, time_range_start: str = "-7d",
+                         time_range_stop: Optional[str] = None,
+                         where: Optional[Dict[str, str]] = None) -> 'pd.DataFrame':
+        """
+        Event rows of one symbol in a time range, optionally only those whose tag columns equal the
+        values in `where` (e.g. {'timeframe': '1h', 'type': 'bullish'}); the time range is found with the
+        sparse index and the tag filter compares integer codes.
+        """
+        import pandas as pd
+        with self._lock:
+            schema = self._event_schema(measurement)
+            layout = ('timestamp', *schema['tags'], *schema['fields'])
+            if len(layout) == 1:
+                return pd.DataFrame(columns=['timestamp'])
+            start_ms = parse_range_start(time_range_start)
+            stop_ms = parse_range_start(time_range_stop) if time_range_stop else None
+            columns = self._get_series(measurement, symbol, layout, unique=False).read_columns(start_ms, stop_ms)
+            keep = np.ones(len(columns['timestamp']), dtype=bool)
+            for tag, value in (where or {}).items():
+                code = schema['codes'].get(tag, {}).get(value)
+                keep &= columns[tag] == code if code is not None else False
+            frame = pd.DataFrame({'timestamp': np.asarray(columns['timestamp'][keep])})
+            for tag, values in schema['tags'].items():
+                frame[tag] = np.asarray(values, dtype=object)[columns[tag][keep].astype(np.int64)] if len(frame) else []
+            for field in schema['fields']:
+                frame[field] = np.asarray(columns[field][keep])
+            return frame
+
+    def close(self):
+        """Releases the memory maps."""
+        with self._lock:
+            self._series.clear()
+
+
+class CachedDatabaseManager:
+    """
+    Read-through cache: a LocalBarStore in front of another backend (normally InfluxDB).
+
+    Writes go to both. A query is answered locally when the cache already covers its start;
+    otherwise the range is read once from the backend and kept locally for the next reads.
+    """
+
+    def __init__(self, backend: Any, cache: LocalBarStore):
+        self.backend = backend
+        self.cache = cache
+        self._coverage_file = os.path.join(cache.root, 'coverage.json')
+        self._coverage: Dict[str, int] = {}
+        self._coverage_lock = threading.Lock()
+        if os.path.exists(self._coverage_file):
+            with open(self._coverage_file, encoding='utf-8') as f:
+                self._coverage = json.load(f)
+
+    def _covered_from(self, measurement: str, symbol: str) -> Optional[int]:
+        return self._coverage.get(f"{symbol}|{measurement}")
+
+    def _fill(self, measurement: str, symbol: str, time_range_start: str, fields: Optional[Sequence[str]] = None):
+        start_ms = parse_range_start(time_range_start)
+        covered = self._covered_from(measurement, symbol)
+        if covered is not None and covered <= start_ms:
+            return
+        # Coverage is recorded only after a successful backend read; a failed one is retried next time.
+        try:
+            if fields is None:
+                data = self.backend.query_ohlcv_data(measurement, symbol, time_range_start, strict=True)
+            else:
+                data = self.backend.query_metric_data(measurement, symbol, fields, time_range_start, strict=True)
+        except Exception as e:
+            logger.warning(f"Backend read of {symbol} '{measurement}' failed; serving the local cache only: {e}")
+            return
+        if fields is None:
+            self.cache.write_ohlcv_data(measurement, data, symbol)
+        else:
+            self.cache.write_metric_data(measurement, data, symbol)
+        self._set_coverage(measurement, symbol, start_ms)
+
+    def _set_coverage(self, measurement: str, symbol: str, start_ms: int, only_if_missing: bool = False):
+        with self._coverage_lock:
+            key = f"{symbol}|{measurement}"
+            if only_if_missing and key in self._coverage:
+                return
+            self._coverage[key] = start_ms
+            tmp = self._coverage_file + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._coverage, f)
+            os.replace(tmp, self._coverage_file)
+
+    def write_ohlcv_data(self, measurement: str, data: 'pd.DataFrame', symbol: str):
+        self.backend.write_ohlcv_data(measurement, data, symbol)
+        self.cache.write_ohlcv_data(measurement, data, symbol)
+
+    def query_ohlcv_data(self, measurement: str, symbol: str, time_range_start: str = "-7d") -> 'pd.DataFrame':
+        self._fill(measurement, symbol, time_range_start)
+        return self.cache.query_ohlcv_data(measurement, symbol, time_range_start)
+
+    def query_ohlcv_arrays(self, measurement: str, symbol: str, time_range_start: str = "-7d") -> OHLCVArrays:
+        self._fill(measurement, symbol, time_range_start)
+        return self.cache.query_ohlcv_arrays(measurement, symbol, time_range_start)
+
+    def write_metric_data(self, measurement: str, data: 'pd.DataFrame', symbol: str):
+        self.backend.write_metric_data(measurement, data, symbol)
+        self.cache.write_metric_data(measurement, data, symbol)
+
+    def query_metric_arrays(self, measurement: str, symbol: str, fields: Sequence[str],
+                            time_range_start: str = "-7d") -> Dict[str, np.ndarray]:
+        self._fill(measurement, symbol, time_range_start, fields)
+        return self.cache.query_metric_arrays(measurement, symbol, fields, time_range_start)
+
+    def write_event_data(self, measurement: str, data: 'pd.DataFrame', symbol: str, tags: Sequence[str]):
+        """
+        Writes events to both stores. The local copy holds every event detected since its first write, and
+        an event's bar time never lies after its detection, so it covers bar times from that moment on.
+        """
+        started = int(time.time() * 1000)
+        self.backend.write_event_data(measurement, data, symbol, tags)
+        self.cache.write_event_data(measurement, data, symbol, tags)
+        self._set_coverage(measurement, symbol, started, only_if_missing=True)
+
+    def query_event_data(self, measurement: str, symbol: str, time_range_start: str = "-7d",
+                         time_range_stop: Optional[str] = None,
+                         where: Optional[Dict[str, str]] = None) -> 'pd.DataFrame':
+        """
+        Served from the local copy when it covers the start of the range, otherwise from the backend
+        (events are not copied back: the local event series keeps duplicates). A failed backend read
+        falls back to the local copy.
+        """
+        covered = self._covered_from(measurement, symbol)
+        if covered is None or covered > parse_range_start(time_range_start):
+            try:
+                return self.backend.query_event_data(measurement, symbol, time_range_start, time_range_stop, where,
+                                                     strict=True)
+            except Exception as e:
+                logger.warning(f"Backend read of {symbol} '{measurement}' events failed; serving the local cache only: {e}")
+        return self.cache.query_event_data(measurement, symbol, time_range_start, time_range_stop, where)
+
+    def close(self):
+        self.cache.close()
+        self.backend.close()
+
+
+def create_storage(backend: str, local_path: str, influx_settings: Dict[str, Any]) -> Any:
+    """
+    Builds the configured storage backend.
+
+    Args:
+        backend (str): 'influxdb', 'local' or 'cached' (local read-through cache in front of InfluxDB).
+        local_path (str): Root directory of the local bar store.
+        influx_settings (Dict[str, Any]): url/token/org/bucket (and optional tiers) for DatabaseManager.
+
+    Raises:
+        ValueError: For an unknown backend or incomplete InfluxDB configuration.
+    """
+    if backend == 'local':
+        return LocalBarStore(local_path)
+    if backend not in ('influxdb', 'cached'):
+        raise ValueError(f"Unknown storage backend '{backend}'.")
+
+    from database_manager import DatabaseManager
+    influx = DatabaseManager(**influx_settings)
+    influx.ensure_retention_tiers()
+    if backend == 'cached':
+        return CachedDatabaseManager(influx, LocalBarStore(local_path))
+    return influx
@@ -0,0 +1,115 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+OHLCV_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+_UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000, 'M': 2_592_000_000}
+
+
+def timeframe_ms(timeframe: str) -> int:
+    """'4h' -> 14400000；月线按 30 天近似"""
+    match = re.fullmatch(r'(\d+)([mhdwM])', timeframe)
+    if not match:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(match.group(1)) * _UNIT_MS[match.group(2)]
+
+
+def grid_offset_ms(timeframe: str) -> int:
+    """K线网格相对 epoch 的偏移：周线从周一 00:00 UTC 开始（1970-01-01 为周四，偏移 4 天）"""
+    return 4 * 86_400_000 if timeframe.endswith('w') else 0
+
+
+@dataclass(frozen=True)
+class OHLCVArrays:
+    """
+    列式 K 线容器：timestamp 为 int64 毫秒，其余列为 float64。
+
+    各列通常是底层存储（DataFrame 列、共享内存、memmap）的视图，从 DatabaseManager
+    到 ChanAnalyzer / SignalDetector 全程不做行式复制。
+    """
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, key: Any) -> 'OHLCVArrays':
+        """切片返回新的视图容器，例如 arrays[-200:]"""
+        if not isinstance(key, slice):
+            raise TypeError("OHLCVArrays only supports slicing; use row(i) for a single bar")
+        return OHLCVArrays(*(getattr(self, f)[key] for f in OHLCV_FIELDS))
+
+    def row(self, i: int) -> Tuple[int, float, float, float, float, float]:
+        """单根K线 (timestamp, open, high, low, close, volume)"""
+        return (int(self.timestamp[i]), float(self.open[i]), float(self.high[i]),
+                float(self.low[i]), float(self.close[i]), float(self.volume[i]))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f).nbytes for f in OHLCV_FIELDS)
+
+    @classmethod
+    def from_dataframe(cls, df: Any) -> 'OHLCVArrays':
+        """从含 timestamp/open/high/low/close/volume 列的 DataFrame 构建（类型匹配时不复制）"""
+        return cls(df['timestamp'].to_numpy(dtype=np.int64, copy=False),
+                   *(df[f].to_numpy(dtype=np.float64, copy=False) for f in OHLCV_FIELDS[1:]))
+
+    @classmethod
+    def from_matrix(cls, data: np.ndarray) -> 'OHLCVArrays':
+        """从 (n, 6) 行式矩阵或 (6, n) 列式矩阵构建；列式矩阵的各列为视图"""
+        data = np.asarray(data)
+        if data.ndim != 2:
+            raise ValueError(f"Expected a 2-D OHLCV matrix, got shape {data.shape}")
+        columns = data if data.shape[0] == 6 and data.shape[1] != 6 else data.T
+        return cls(columns[0].astype(np.int64), *(np.asarray(columns[i], dtype=np.float64) for i in range(1, 6)))
+
+    @classmethod
+    def from_buffer(cls, buffer: Any, n_bars: int) -> 'OHLCVArrays':
+        """
+        从只读 buffer / memoryview 构建：布局为 n 个 int64 时间戳后接 5 列各 n 个 float64。
+        返回的各列直接引用该 buffer。
+        """
+        timestamp = np.frombuffer(buffer, dtype=np.int64, count=n_bars)
+        columns = np.frombuffer(buffer, dtype=np.float64, count=5 * n_bars, offset=8 * n_bars).reshape(5, n_bars)
+        return cls(timestamp, *columns)
+
+    def to_bytes(self) -> bytes:
+        """与 from_buffer 对应的紧凑二进制布局"""
+        return self.timestamp.astype(np.int64).tobytes() + np.vstack(
+            [getattr(self, f) for f in OHLCV_FIELDS[1:]]).astype(np.float64).tobytes()
+
+
+def empty_ohlcv() -> OHLCVArrays:
+    return OHLCVArrays(np.empty(0, dtype=np.int64), *(np.empty(0) for _ in range(5)))
+
+
+def as_columns(ohlcv: Any) -> OHLCVArrays:
+    """
+    将任意 OHLCV 输入统一为 OHLCVArrays：已是容器时原样返回，DataFrame / 矩阵转为列视图，
+    兼容旧的行列表格式（仅此时需要一次转换）。
+    """
+    if isinstance(ohlcv, OHLCVArrays):
+        return ohlcv
+    if hasattr(ohlcv, 'columns') and 'timestamp' in ohlcv.columns:
+        return OHLCVArrays.from_dataframe(ohlcv)
+    if len(ohlcv) == 0:
+        return empty_ohlcv()
+    return OHLCVArrays.from_matrix(np.asarray(ohlcv, dtype=np.float64))
+
+
+def merge_bars(history: Optional[OHLCVArrays], fresh: OHLCVArrays, keep: int) -> OHLCVArrays:
+    """追加新K线并替换重叠部分（如尚未收盘的最后一根），只保留最新的 keep 根"""
+    if history is None or len(history) == 0:
+        return fresh[-keep:]
+    if len(fresh) == 0:
+        return history
+    cut = int(np.searchsorted(history.timestamp, fresh.timestamp[0], side='left'))
+    merged = OHLCVArrays(*(np.concatenate([getattr(history, f)[:cut], getattr(fresh, f)]) for f in OHLCV_FIELDS))
+    return merged[-keep:]
@@ -0,0 +1,243 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from chan import ChanAnalyzer
+from indicators import compute_indicators
+from logging_config import logger
+from ohlcv import OHLCVArrays
+from signal_detector import SignalDetector
+
+# Default search space. Values mirror the constants hard-coded in SignalDetector /
+# ChanAnalyzer (RSI 70/30, 2x 19-bar volume, 0.05 squeeze, stroke gap 1) and in
+# eth-gd2.py (1.5x volume), plus neighbours on each side.
+DEFAULT_GRID: Dict[str, List[Any]] = {
+    'rsi_overbought': [65.0, 70.0, 75.0, 80.0],
+    'rsi_oversold': [20.0, 25.0, 30.0, 35.0],
+    'volume_lookback': [9, 19, 29],
+    'volume_multiplier': [1.5, 2.0, 2.5],
+    'bb_squeeze_threshold': [0.03, 0.05, 0.08],
+    'min_stroke_gap': [1, 2, 3],
+}
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+# Param-independent indicator rows placed next to the OHLCV columns in shared memory.
+SHARED_INDICATORS = ['macd', 'signal_line', 'macd_hist', 'rsi', 'upper_band', 'lower_band', 'bandwidth']
+SHARED_ROWS = OHLCV_COLUMNS + SHARED_INDICATORS
+
+# Per-worker state, populated once by _init_worker.
+_worker: Dict[str, Any] = {}
+
+
+def grid_combinations(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Expands a grid into the full cartesian product of parameter settings."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def random_combinations(grid: Dict[str, List[Any]], n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Draws up to n distinct random settings from the grid.
+
+    A [low, high] pair of floats is sampled uniformly; any other list is sampled as a set of choices.
+    """
+    rng = random.Random(seed)
+    seen, combos = set(), []
+    for _ in range(n * 20):
+        if len(combos) >= n:
+            break
+        combo = {}
+        for key, values in grid.items():
+            if len(values) == 2 and all(isinstance(v, float) for v in values):
+                combo[key] = round(rng.uniform(values[0], values[1]), 4)
+            else:
+                combo[key] = rng.choice(values)
+        signature = tuple(sorted(combo.items()))
+        if signature not in seen:
+            seen.add(signature)
+            combos.append(combo)
+    return combos
+
+
+def chan_events(ohlcv: np.ndarray, macd_hist: np.ndarray, min_stroke_gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs the Chan analysis once over the whole history and returns (bar_index, direction) arrays
+    for every buy/sell point. Only depends on min_stroke_gap, so it is computed once per value.
+    """
+    columns = OHLCVArrays.from_matrix(ohlcv)
+    analyzer = ChanAnalyzer(min_stroke_gap=min_stroke_gap)
+    _strokes, _segments, _centers, points = analyzer.analyze(columns, np.nan_to_num(macd_hist))
+    index = np.searchsorted(columns.timestamp, [p.time for p in points])
+    direction = np.array([1 if p.point_type.endswith('buy') else -1 for p in points], dtype=np.int8)
+    return index.astype(np.int64), direction
+
+
+def _init_worker(shm_name: str, n_bars: int, chan_cache: Dict[int, Tuple[np.ndarray, np.ndarray]], horizon: int):
+    """Attaches the shared OHLCV/indicator block once per worker process."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray((len(SHARED_ROWS), n_bars), dtype=np.float64, buffer=shm.buf)
+    _worker.update({
+        'shm': shm,
+        'columns': {name: block[i] for i, name in enumerate(SHARED_ROWS)},
+        'ohlcv': OHLCVArrays.from_matrix(block[:len(OHLCV_COLUMNS)]),
+        'chan': chan_cache,
+        'horizon': horizon,
+    })
+
+
+def _signal_events(params: Dict[str, Any]) -> np.ndarray:
+    """
+    Returns an int8 array with +1 (bullish), -1 (bearish) or 0 per bar, summing the votes of the
+    MACD, RSI, volume, Bollinger and Chan detectors under the given thresholds.
+    """
+    columns = _worker['columns']
+    detector = SignalDetector(**params)
+    votes = np.zeros(len(columns['close']), dtype=np.int16)
+    for series in (detector.macd_series(columns), detector.rsi_series(columns),
+                   detector.volume_series(_worker['ohlcv']), detector.bollinger_bands_series(columns)):
+        votes += series['bullish'].astype(np.int16) - series['bearish']
+
+    chan_index, chan_direction = _worker['chan'][int(params['min_stroke_gap'])]
+    np.add.at(votes, chan_index, chan_direction)
+
+    return np.sign(votes).astype(np.int8)
+
+
+def evaluate(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Scores one parameter setting by the signed forward return of the bars it fires on."""
+    close = _worker['columns']['close']
+    horizon = _worker['horizon']
+    events = _signal_events(params)[:-horizon]
+    forward = close[horizon:] / close[:-horizon] - 1.0
+    fired = events != 0
+    n_events = int(fired.sum())
+    result = dict(params)
+    if n_events == 0:
+        result.update(n_events=0, hit_rate=0.0, mean_return=0.0, score=float('-inf'))
+        return result
+    signed = forward[fired] * events[fired]
+    mean = float(signed.mean())
+    std = float(signed.std())
+    result.update(
+        n_events=n_events,
+        hit_rate=float((signed > 0).mean()),
+        mean_return=mean,
+        score=mean / std * np.sqrt(n_events) if std > 0 else 0.0,
+    )
+    return result
+
+
+def run_sweep(ohlcv: np.ndarray, combos: List[Dict[str, Any]], horizon: int = 12,
+              workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluates every parameter combination across a process pool and returns results ranked by score.
+
+    The OHLCV columns and all parameter-independent indicators are computed once and placed in a
+    single shared-memory block; workers attach to it instead of receiving pickled copies.
+    """
+    ohlcv = np.ascontiguousarray(ohlcv, dtype=np.float64)
+    n_bars = len(ohlcv)
+    indicators = compute_indicators(ohlcv)
+
+    gaps = sorted({int(c['min_stroke_gap']) for c in combos})
+    chan_cache = {gap: chan_events(ohlcv, indicators['macd_hist'], gap) for gap in gaps}
+    logger.info(f"Precomputed indicators and Chan points for {n_bars} bars (stroke gaps {gaps}).")
+
+    shm = shared_memory.SharedMemory(create=True, size=len(SHARED_ROWS) * n_bars * 8)
+    try:
+        block = np.ndarray((len(SHARED_ROWS), n_bars), dtype=np.float64, buffer=shm.buf)
+        block[:len(OHLCV_COLUMNS)] = ohlcv.T
+        for i, name in enumerate(SHARED_INDICATORS, start=len(OHLCV_COLUMNS)):
+            block[i] = indicators[name]
+
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, n_bars, chan_cache, horizon)) as pool:
+            results = list(pool.map(evaluate, combos, chunksize=chunksize))
+        del block
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results.sort(key=lambda r: r['score'], reverse=True)
+    for rank, result in enumerate(results, start=1):
+        result['rank'] = rank
+    return results
+
+
+def write_results(results: List[Dict[str, Any]], path: str):
+    """Writes the ranked results table as CSV."""
+    if not results:
+        return
+    fieldnames = ['rank'] + [k for k in results[0] if k != 'rank']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+    logger.info(f"Wrote {len(results)} ranked results to {path}.")
+
+
+def load_csv(path: str) -> np.ndarray:
+    """Loads OHLCV rows from a CSV file with a header of timestamp,open,high,low,close,volume."""
+    with open(path, encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+    data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    return data[:, [header.index(c) for c in OHLCV_COLUMNS]]
+
+
+def load_from_db(symbol: str, timeframe: str, start: str) -> np.ndarray:
+    """Loads OHLCV rows for one series from the bot's configured storage backend."""
+    from config import config
+    from local_store import create_storage
+
+    db_manager = create_storage(config.STORAGE_BACKEND, config.LOCAL_STORE_PATH, {
+        'url': config.INFLUXDB_URL, 'token': config.INFLUXDB_TOKEN,
+        'org': config.INFLUXDB_ORG, 'bucket': config.INFLUXDB_BUCKET, 'tiers': config.INFLUXDB_TIERS})
+    try:
+        df = db_manager.query_ohlcv_data(measurement=timeframe, symbol=symbol, time_range_start=start)
+    finally:
+        db_manager.close()
+    return df[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep for signal detector thresholds.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help="OHLCV CSV file (timestamp,open,high,low,close,volume).")
+    source.add_argument('--timeframe', help="Load this timeframe from the configured storage instead of a CSV.")
+    parser.add_argument('--symbol', default='ETH/USDT')
+    parser.add_argument('--start', default='-730d', help="Range start (Flux syntax) when loading from storage.")
+    parser.add_argument('--grid', help="JSON file mapping parameter names to candidate values.")
+    parser.add_argument('--random', type=int, default=0, help="Sample N random settings instead of the full grid.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--horizon', type=int, default=12, help="Forward-return horizon in bars.")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID)
+    if args.grid:
+        with open(args.grid, encoding='utf-8') as f:
+            grid.update(json.load(f))
+    combos = random_combinations(grid, args.random, args.seed) if args.random else grid_combinations(grid)
+
+    ohlcv = load_csv(args.csv) if args.csv else load_from_db(args.symbol, args.timeframe, args.start)
+    logger.info(f"Sweeping {len(combos)} parameter settings over {len(ohlcv)} bars...")
+    started = time.perf_counter()
+    results = run_sweep(ohlcv, combos, horizon=args.horizon, workers=args.workers)
+    logger.info(f"Sweep finished in {time.perf_counter() - started:.1f}s.")
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from detector_registry import IndicatorCache
+from logging_config import logger
+from ohlcv import OHLCV_FIELDS, OHLCVArrays, as_columns, merge_bars, timeframe_ms
+from sharding import last_closed_bar
+from signal_detector import Signal, SignalDetector
+
+# Third buy/sell points older than this many bars no longer add to a symbol's score.
+THIRD_POINT_FRESH_BARS = 10
+
+# Readable Chan point labels for the digest; the raw point types contain '_', which Telegram Markdown
+# parses as italics and rejects the whole message when unbalanced.
+POINT_LABELS = {f"{n}_{side}": f"{n} {side}" for n in ('1st', '2nd', '3rd') for side in ('buy', 'sell')}
+
+# pending(symbol, timeframe, last closed bar timestamp) -> whether this instance should analyse the series now.
+PendingFn = Callable[[str, str, int], bool]
+
+
+@dataclass
+class ScanResult:
+    """Ranking entry for one symbol: weighted signal score plus the freshest 3rd buy/sell point."""
+    symbol: str
+    score: float = 0.0
+    bullish: int = 0
+    bearish: int = 0
+    signals: Dict[str, List[Signal]] = field(default_factory=dict)
+    third_points: List[Tuple[str, str, int]] = field(default_factory=list)  # (timeframe, point_type, bars_ago)
+    # (timeframe, point_type) -> (stop, target, reward/risk) from the Chan center boundaries around the last close
+    levels: Dict[Tuple[str, str], Tuple[float, float, float]] = field(default_factory=dict)
+    closed_bars: Dict[str, int] = field(default_factory=dict)  # timeframe -> last closed bar analysed
+    error: Optional[str] = None
+
+
+def resolve_universe(exchange: Any, spec: str) -> List[str]:
+    """
+    Expands a symbol universe: 'all' means every active USDT-settled swap listed by the exchange,
+    anything else is a comma-separated list of symbols.
+    """
+    if spec.strip().lower() != 'all':
+        return [s.strip() for s in spec.split(',') if s.strip()]
+    markets = exchange.load_markets()
+    symbols = [m['symbol'] for m in markets.values()
+               if m.get('swap') and m.get('quote') == 'USDT' and m.get('active', True)]
+    logger.info(f"Resolved scanner universe to {len(symbols)} USDT swaps.")
+    return sorted(symbols)
+
+
+class MarketScanner:
+    """
+    Scans a whole symbol universe across the configured timeframes each cycle.
+
+    History per (symbol, timeframe) is kept in memory and seeded from the storage backend, so after
+    the first cycle only the bars since the last close are requested from the exchange. Fetches run
+    on a bounded thread pool; analysis runs as each symbol's timeframes complete, reusing the
+    detector's lazy indicator DAG.
+    """
+
+    def __init__(self, exchange: Any, db_manager: Any, detector: SignalDetector, timeframes: List[str],
+                 concurrency: int = 16, history_limit: int = 500, store: bool = True,
+                 pending: Optional[PendingFn] = None):
+        """
+        Args:
+            exchange: ccxt exchange instance (shared by the fetch threads; ccxt throttles it).
+            db_manager: Storage backend used to seed history and persist fetched bars.
+            detector (SignalDetector): Detector used for every symbol.
+            timeframes (List[str]): Timeframes analysed per symbol.
+            concurrency (int): Maximum concurrent exchange requests.
+            history_limit (int): Bars kept and analysed per series.
+            store (bool): Write fetched bars back to the storage backend.
+            pending (Optional[PendingFn]): When sharded, ShardCoordinator.pending; series whose last closed
+                bar was already committed (here or by another instance) are skipped. The caller commits
+                ScanResult.closed_bars once the digest has gone out.
+        """
+        self.exchange = exchange
+        self.db_manager = db_manager
+        self.detector = detector
+        self.timeframes = sorted(timeframes, key=timeframe_ms)
+        self.concurrency = concurrency
+        self.history_limit = history_limit
+        self.store = store
+        self.pending = pending
+        self._history: Dict[Tuple[str, str], OHLCVArrays] = {}
+        self._lock = threading.Lock()
+
+    # ---------- fetching ----------
+
+    def _seed(self, symbol: str, timeframe: str) -> Optional[OHLCVArrays]:
+        """Loads recent history for a series from the storage backend (first cycle only)."""
+        days = self.history_limit * timeframe_ms(timeframe) // 86_400_000 + 1
+        try:
+            arrays = self.db_manager.query_ohlcv_arrays(measurement=timeframe, symbol=symbol, time_range_start=f"-{days}d")
+        except Exception as e:
+            logger.warning(f"Could not seed {symbol} {timeframe} from storage: {e}")
+            return None
+        return arrays if len(arrays) else None
+
+    def refresh(self, symbol: str, timeframe: str) -> OHLCVArrays:
+        """Brings one series up to date, fetching only the bars after the last stored one."""
+        key = (symbol, timeframe)
+        with self._lock:
+            history = self._history.get(key)
+        if history is None and self.db_manager is not None:
+            history = self._seed(symbol, timeframe)
+
+        since, limit = None, self.history_limit
+        if history is not None and len(history):
+            last = int(history.timestamp[-1])
+            missing = (int(time.time() * 1000) - last) // timeframe_ms(timeframe) + 2
+            if missing < self.history_limit:
+                since, limit = last, int(missing)
+
+        rows = self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+        fresh = as_columns(rows)
+        if self.store and self.db_manager is not None and len(fresh):
+            df = pd.DataFrame(rows, columns=list(OHLCV_FIELDS))
+            self.db_manager.write_ohlcv_data(measurement=timeframe, data=df, symbol=symbol)
+
+        merged = merge_bars(history, fresh, self.history_limit)
+        with self._lock:
+            self._history[key] = merged
+        return merged
+
+    # ---------- analysis ----------
+
+    def analyze(self, symbol: str, frames: Dict[str, OHLCVArrays]) -> ScanResult:
+        """Runs the enabled detectors on every timeframe and scores the symbol."""
+        result = ScanResult(symbol)
+        for weight, timeframe in enumerate(self.timeframes, start=1):
+            ohlcv = frames.get(timeframe)
+            if ohlcv is None or len(ohlcv) < 100:
+                continue
+            if self.pending is not None:
+                bar = last_closed_bar(ohlcv.timestamp, timeframe)
+                if bar is None or not self.pending(symbol, timeframe, bar):
+                    continue
+                result.closed_bars[timeframe] = bar
+            context = self.detector.context(timeframe, ohlcv, symbol)
+            signals = self.detector.detect_all_signals(timeframe, context, ohlcv, symbol=symbol)
+            result.signals[timeframe] = signals
+            for signal in signals:
+                if signal.type == 'bullish':
+                    result.bullish += 1
+                    result.score += weight
+                elif signal.type == 'bearish':
+                    result.bearish += 1
+                    result.score -= weight
+
+            if 'chan' not in self.detector.enabled_for(timeframe):
+                continue
+            points = context['chan'][3]
+            for point in points:
+                if not point.point_type.startswith('3rd'):
+                    continue
+                bars_ago = len(ohlcv) - int(np.searchsorted(ohlcv.timestamp, point.time, side='right'))
+                if bars_ago > THIRD_POINT_FRESH_BARS:
+                    continue
+                result.third_points.append((timeframe, point.point_type, bars_ago))
+                self._add_levels(result, timeframe, point.point_type, context, float(ohlcv.close[-1]))
+                bonus = 2 * weight * (1 - bars_ago / (THIRD_POINT_FRESH_BARS + 1))
+                result.score += bonus if point.point_type.endswith('buy') else -bonus
+        return result
+
+    @staticmethod
+    def _add_levels(result: ScanResult, timeframe: str, point_type: str, context: Any, price: float):
+        """Stop at the nearest center boundary behind the last close, target at the nearest one ahead."""
+        direction = 'long' if point_type.endswith('buy') else 'short'
+        levels = context['center_index'].risk_reward([price], direction)
+        stop, target, ratio = (float(levels[k][0]) for k in ('stop', 'target', 'ratio'))
+        if ratio == ratio:  # NaN when there is no boundary on one side
+            result.levels[(timeframe, point_type)] = (stop, target, ratio)
+
+    def scan(self, symbols: List[str], shards: Optional[List[Tuple[str, str]]] = None) -> List[ScanResult]:
+        """
+        Refreshes and analyses every symbol, returning results ranked by absolute score.
+
+        A symbol is analysed as soon as all its timeframes have been fetched, so CPU work overlaps
+        with the remaining network requests. With `shards` only those (symbol, timeframe) series are
+        refreshed and scored; the other instances cover the rest.
+        """
+        started = time.perf_counter()
+        if shards is None:
+            shards = [(symbol, timeframe) for symbol in symbols for timeframe in self.timeframes]
+        else:
+            universe = set(symbols)
+            shards = [(symbol, timeframe) for symbol, timeframe in shards
+                      if symbol in universe and timeframe in self.timeframes]
+        # Keep every series' indicators warm between cycles instead of evicting at the default size.
+        needed = len(shards)
+        if self.detector.indicator_cache.max_series < needed:
+            self.detector.indicator_cache = IndicatorCache(max_series=needed)
+
+        pending: Dict[str, int] = {}
+        for symbol, _ in shards:
+            pending[symbol] = pending.get(symbol, 0) + 1
+        frames: Dict[str, Dict[str, OHLCVArrays]] = {symbol: {} for symbol in pending}
+        errors: Dict[str, str] = {}
+        results = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.refresh, symbol, timeframe): (symbol, timeframe)
+                       for symbol, timeframe in shards}
+            for future in as_completed(futures):
+                symbol, timeframe = futures[future]
+                try:
+                    frames[symbol][timeframe] = future.result()
+                except Exception as e:
+                    errors[symbol] = f"{timeframe}: {e}"
+                    logger.warning(f"Failed to fetch {symbol} {timeframe}: {e}")
+                pending[symbol] -= 1
+                if pending[symbol] == 0:
+                    try:
+                        result = self.analyze(symbol, frames.pop(symbol))
+                    except Exception as e:
+                        result = ScanResult(symbol, error=str(e))
+                        logger.error(f"Failed to analyse {symbol}: {e}", exc_info=True)
+                    result.error = result.error or errors.get(symbol)
+                    results.append(result)
+
+        results.sort(key=lambda r: (abs(r.score), len(r.third_points)), reverse=True)
+        logger.info(f"Scanned {len(pending)} symbols, {len(shards)} series "
+                    f"in {time.perf_counter() - started:.1f}s ({len(errors)} with fetch errors).")
+        if self.detector.chan_windows is not None:
+            logger.info(f"Chan windows hold {self.detector.chan_windows.total_bytes() / 2**20:.1f} MiB "
+                        f"across {len(self.detector.chan_windows.memory())} series.")
+        return results
+
+
+def format_digest(results: List[ScanResult], top_n: int = 20) -> str:
+    """One Telegram message summarising the strongest setups of the cycle."""
+    ranked = [r for r in results if r.score != 0 or r.third_points][:top_n]
+    if not ranked:
+        return ""
+    lines = [f"📡 Market Scan: top {len(ranked)} of {len(results)} symbols\n"]
+    for rank, result in enumerate(ranked, start=1):
+        arrow = '🟢' if result.score > 0 else '🔴'
+        lines.append(f"{rank}. {arrow} {result.symbol}  score {result.score:+.1f}  "
+                     f"(bull {result.bullish} / bear {result.bearish})")
+        for timeframe, point_type, bars_ago in result.third_points:
+            label = POINT_LABELS.get(point_type, point_type.replace('_', ' '))
+            line = f"   - {timeframe} {label} {bars_ago} bars ago"
+            if (timeframe, point_type) in result.levels:
+                stop, target, ratio = result.levels[(timeframe, point_type)]
+                line += f"  stop {stop:.6g} / target {target:.6g} (R:R {ratio:.1f})"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    """One-off scan that prints the digest, for trying a universe outside the scheduler."""
+    from config import config
+    from simple_data_processor import SimpleDataProcessor
+
+    parser = argparse.ArgumentParser(description="Scan a symbol universe and rank setups.")
+    parser.add_argument('--symbols', default=config.SCAN_SYMBOLS or 'all', help="'all' or a comma-separated list.")
+    parser.add_argument('--concurrency', type=int, default=config.SCAN_CONCURRENCY)
+    parser.add_argument('--top', type=int, default=config.SCAN_TOP_N)
+    args = parser.parse_args()
+
+    app_config = {
+        'exchange': {'name': config.EXCHANGE, 'apiKey': config.CCXT_API_KEY,
+                     'secret': config.CCXT_SECRET_KEY, 'proxy': config.CCXT_PROXY},
+        'symbol': config.SYMBOL,
+        'timeframes': list(config.TIMEFRAMES.keys()),
+    }
+    exchange = SimpleDataProcessor(app_config, None).exchange
+    scanner = MarketScanner(exchange, None, SignalDetector(enabled_detectors=config.ENABLED_DETECTORS),
+                            app_config['timeframes'], concurrency=args.concurrency,
+                            history_limit=config.SCAN_HISTORY_LIMIT, store=False)
+    results = scanner.scan(resolve_universe(exchange, args.symbols))
+    print(format_digest(results, args.top) or "No setups found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import abc
+import hashlib
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+from logging_config import logger
+from ohlcv import timeframe_ms
+
+Shard = Tuple[str, str]  # (symbol, timeframe)
+
+
+def shard_key(shard: Shard) -> str:
+    return f"{shard[0]}|{shard[1]}"
+
+
+def parse_shard_key(key: str) -> Shard:
+    symbol, _, timeframe = key.rpartition('|')
+    return symbol, timeframe
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def last_closed_bar(timestamps: Sequence[int], timeframe: str, now_ms: Optional[int] = None) -> Optional[int]:
+    """Open time of the newest bar in `timestamps` that has closed by `now_ms`; None if none has."""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    step = timeframe_ms(timeframe)
+    for ts in reversed(timestamps[-2:]):
+        if int(ts) + step <= now_ms:
+            return int(ts)
+    return None
+
+
+class LeaseBackend(abc.ABC):
+    """
+    Storage for instance heartbeats, shard leases and per-shard progress. Implementations must make
+    each method atomic across every instance that shares the backend.
+
+    Progress is two-phase: pending() tells whether a bar still needs processing, commit() records it
+    once the work (analysis and alerting) has succeeded. A failure in between leaves the bar pending,
+    so it is retried next cycle (at-least-once) instead of being lost.
+    """
+
+    @abc.abstractmethod
+    def heartbeat(self, owner: str, ttl: float) -> List[str]:
+        """Registers `owner` as alive for `ttl` seconds and returns all live owners, sorted."""
+
+    @abc.abstractmethod
+    def renew(self, owner: str, ttl: float) -> List[str]:
+        """Extends every unexpired lease held by `owner`; returns the shard keys it still holds."""
+
+    @abc.abstractmethod
+    def free_shards(self, keys: Iterable[str]) -> List[str]:
+        """The given shard keys that have no unexpired lease."""
+
+    @abc.abstractmethod
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Takes the lease if it is free, expired or already ours."""
+
+    @abc.abstractmethod
+    def release(self, keys: Iterable[str], owner: str):
+        """Drops the leases on `keys` that `owner` holds."""
+
+    @abc.abstractmethod
+    def pending(self, key: str, owner: str, bar: int) -> bool:
+        """True while `owner` holds the lease and no instance has committed this or a later bar."""
+
+    @abc.abstractmethod
+    def commit(self, key: str, owner: str, bar: int) -> bool:
+        """
+        Records that `bar` of the shard has been processed. Succeeds only while `owner` holds the lease
+        and no instance has committed this or a later bar, so progress never moves backwards across a
+        lease handover.
+        """
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """Lease backend on a SQLite file, for instances that share a host or a volume."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS members (owner TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS leases (shard TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS progress (shard TEXT PRIMARY KEY, last_bar INTEGER NOT NULL);
+            """)
+
+    def _transaction(self, statements):
+        """Runs statements(cursor) inside BEGIN IMMEDIATE so concurrent instances serialise."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, owner: str, ttl: float) -> List[str]:
+        now = time.time()
+
+        def run(cur):
+            cur.execute("INSERT INTO members VALUES (?, ?) ON CONFLICT(owner) DO UPDATE SET expires_at = excluded.expires_at",
+                        (owner, now + ttl))
+            cur.execute("DELETE FROM members WHERE expires_at < ?", (now,))
+            return [row[0] for row in cur.execute("SELECT owner FROM members ORDER BY owner")]
+        return self._transaction(run)
+
+    def renew(self, owner: str, ttl: float) -> List[str]:
+        now = time.time()
+
+        def run(cur):
+            cur.execute("UPDATE leases SET expires_at = ? WHERE owner = ? AND expires_at >= ?", (now + ttl, owner, now))
+            return [row[0] for row in cur.execute("SELECT shard FROM leases WHERE owner = ? AND expires_at >= ?", (owner, now))]
+        return self._transaction(run)
+
+    def free_shards(self, keys: Iterable[str]) -> List[str]:
+        keys = list(keys)
+        with self._lock:
+            held = {row[0] for row in self._conn.execute("SELECT shard FROM leases WHERE expires_at >= ?", (time.time(),))}
+        return [k for k in keys if k not in held]
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+
+        def run(cur):
+            cur.execute("""INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(shard) DO UPDATE
+                           SET owner = excluded.owner, expires_at = excluded.expires_at
+                           WHERE leases.owner = excluded.owner OR leases.expires_at < ?""", (key, owner, now + ttl, now))
+            return cur.rowcount > 0
+        return self._transaction(run)
+
+    def release(self, keys: Iterable[str], owner: str):
+        keys = list(keys)
+        self._transaction(lambda cur: cur.executemany("DELETE FROM leases WHERE shard = ? AND owner = ?",
+                                                      [(k, owner) for k in keys]))
+
+    def pending(self, key: str, owner: str, bar: int) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT owner, expires_at FROM leases WHERE shard = ?", (key,)).fetchone()
+            if row is None or row[0] != owner or row[1] < now:
+                return False
+            done = self._conn.execute("SELECT last_bar FROM progress WHERE shard = ?", (key,)).fetchone()
+        return done is None or done[0] < bar
+
+    def commit(self, key: str, owner: str, bar: int) -> bool:
+        now = time.time()
+
+        def run(cur):
+            row = cur.execute("SELECT owner, expires_at FROM leases WHERE shard = ?", (key,)).fetchone()
+            if row is None or row[0] != owner or row[1] < now:
+                return False
+            cur.execute("""INSERT INTO progress VALUES (?, ?) ON CONFLICT(shard) DO UPDATE
+                           SET last_bar = excluded.last_bar WHERE progress.last_bar < excluded.last_bar""", (key, bar))
+            return cur.rowcount > 0
+        return self._transaction(run)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_lease_backend(kind: str, path: str) -> LeaseBackend:
+    """Builds the configured lease backend ('sqlite'); other backends plug in here."""
+    if kind == 'sqlite':
+        return SQLiteLeaseBackend(path)
+    raise ValueError(f"Unknown shard lease backend '{kind}'.")
+
+
+class ShardCoordinator:
+    """
+    Partitions (symbol, timeframe) shards across bot instances through leases.
+
+    Every `heartbeat_interval` seconds an instance renews its membership and its leases, then
+    moves towards its fair share ceil(shards / live instances): it releases the excess when others
+    have joined and claims free or expired shards when an instance has died. Shards are preferred by
+    rendezvous hashing, so each instance tends to keep the same shards across rebalances.
+    """
+
+    def __init__(self, backend: LeaseBackend, instance_id: Optional[str] = None, lease_ttl: float = 30.0,
+                 heartbeat_interval: float = 10.0):
+        self.backend = backend
+        self.instance_id = instance_id or default_instance_id()
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self._shards: Set[str] = set()
+        self._owned: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def set_shards(self, shards: Iterable[Shard]):
+        """Declares the full shard set (identical on every instance); rebalances immediately."""
+        keys = {shard_key(s) for s in shards}
+        with self._lock:
+            changed = keys != self._shards
+            self._shards = keys
+        if changed:
+            self.rebalance()
+
+    def _preference(self, key: str) -> str:
+        return hashlib.sha1(f"{self.instance_id}|{key}".encode()).hexdigest()
+
+    def rebalance(self) -> List[Shard]:
+        live = self.backend.heartbeat(self.instance_id, self.lease_ttl)
+        owned = set(self.backend.renew(self.instance_id, self.lease_ttl))
+        with self._lock:
+            shards = set(self._shards)
+
+        stale = owned - shards
+        if stale:
+            self.backend.release(stale, self.instance_id)
+            owned -= stale
+        target = math.ceil(len(shards) / max(1, len(live)))
+        if len(owned) > target:
+            excess = sorted(owned, key=self._preference)[:len(owned) - target]
+            self.backend.release(excess, self.instance_id)
+            owned -= set(excess)
+            logger.info(f"[SHARDING] {self.instance_id} released {len(excess)} shard(s) for rebalancing.")
+        elif len(owned) < target:
+            free = sorted(self.backend.free_shards(shards - owned), key=self._preference, reverse=True)
+            acquired = 0
+            for key in free:
+                if len(owned) >= target:
+                    break
+                if self.backend.try_acquire(key, self.instance_id, self.lease_ttl):
+                    owned.add(key)
+                    acquired += 1
+            if acquired:
+                logger.info(f"[SHARDING] {self.instance_id} acquired {acquired} shard(s).")
+
+        with self._lock:
+            self._owned = owned
+        logger.debug(f"[SHARDING] {self.instance_id}: {len(owned)}/{len(shards)} shards, {len(live)} live instance(s).")
+        return self.owned()
+
+    def owned(self) -> List[Shard]:
+        with self._lock:
+            return sorted(parse_shard_key(k) for k in self._owned)
+
+    def owns(self, shard: Shard) -> bool:
+        with self._lock:
+            return shard_key(shard) in self._owned
+
+    def pending(self, symbol: str, timeframe: str, bar: int) -> bool:
+        """True if this instance should process (and alert on) `bar` of the shard; see LeaseBackend.pending."""
+        if not self.owns((symbol, timeframe)):
+            return False
+        return self.backend.pending(shard_key((symbol, timeframe)), self.instance_id, int(bar))
+
+    def commit(self, symbol: str, timeframe: str, bar: int) -> bool:
+        """Marks `bar` of the shard as processed once its analysis and alerts succeeded; see LeaseBackend.commit."""
+        committed = self.backend.commit(shard_key((symbol, timeframe)), self.instance_id, int(bar))
+        if not committed:
+            logger.warning(f"[SHARDING] {self.instance_id} could not commit {symbol} {timeframe} bar {bar} "
+                           f"(lease lost or already committed).")
+        return committed
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.rebalance()
+            except Exception as e:
+                logger.error(f"[SHARDING] Heartbeat failed for {self.instance_id}: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='shard-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self, release: bool = True):
+        """Stops heartbeating; releasing the leases lets the others take over without waiting for expiry."""
+        self._stop.set()
+        if release:
+            with self._lock:
+                owned, self._owned = set(self._owned), set()
+            self.backend.release(owned, self.instance_id)
@@ -1,8 +1,16 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+import numpy as np
 
 # 导入我们全新的缠论分析引擎
 from chan import ChanAnalyzer, BuySellPoint
+from logging_config import logger
+from ohlcv import as_columns
+from detector_registry import DETECTORS, AnalysisContext, IndicatorCache, register_detector
+
+# 作为信号输出的缠论买卖点类型 -> (信号方向, 名称)；末根K线检测与全历史序列共用
+CHAN_SIGNAL_POINTS = {'1st_buy': ('bullish', '一类买点'), '1st_sell': ('bearish', '一类卖点')}
 
 @dataclass
 class Signal:
@@ -14,68 +22,296 @@ class Signal:
 
 class SignalDetector:
     """信号检测器，现在集成了缠论分析"""
-    def __init__(self):
-        self.chan_analyzer = ChanAnalyzer()
+    def __init__(self, rsi_overbought: float = 70.0, rsi_oversold: float = 30.0,
+                 volume_lookback: int = 19, volume_multiplier: float = 2.0,
+                 bb_squeeze_threshold: float = 0.05, min_stroke_gap: int = 1,
+                 enabled_detectors: Optional[Dict[str, List[str]]] = None, chan_windows: Any = None,
+                 chan_levels: Any = None, derivatives: Any = None, funding_overheat: float = 0.001,
+                 funding_short_extreme: float = -0.0005, oi_surge: float = 0.30, orderbook: Any = None,
+                 orderflow_imbalance: float = 0.3, orderflow_stacks: int = 2, center_index: Any = None,
+                 cross_asset: Any = None, decouple_corr: float = 0.3, rs_breakout_rank: float = 0.9,
+                 journal: Any = None, derivatives_timeframe: Optional[str] = None):
+        """
+        Args:
+            rsi_overbought: RSI 超买阈值
+            rsi_oversold: RSI 超卖阈值
+            volume_lookback: 计算均量所用的前序K线数量（不含当前K线）
+            volume_multiplier: 当前成交量超过均量的倍数视为放量
+            bb_squeeze_threshold: 布林带带宽低于该值视为收口
+            min_stroke_gap: 传递给 ChanAnalyzer 的成笔最小间隔
+            enabled_detectors: 各周期启用的检测器名称，如 {'1h': ['macd', 'chan']}；
+                未列出的周期（或 None）启用全部已注册检测器，显式给出空列表（'1h='）则该周期不运行检测器
+            chan_windows: 可选的 ChanWindowRegistry；设置后缠论结构按 (symbol, timeframe) 有界滚动，
+                早期结构定稿后淘汰（见 chan_window.py）
+            chan_levels: 可选的 ChanLevelRegistry；设置后 'chan_levels' 多级别结构按 (symbol, timeframe)
+                增量更新（见 chan_levels.py），否则每次一次性构造
+            derivatives: 可选的 DerivativesIngestor；设置后 'derivatives' 节点提供按K线对齐的资金费率、
+                持仓量与多空比（见 derivatives.py），否则这些列全为 NaN
+            funding_overheat: 资金费率高于该值视为多头过热
+            funding_short_extreme: 资金费率低于该值视为空头极端
+            oi_surge: 持仓量单日增幅超过该值视为方向选择临近
+            orderbook: 可选的 OrderBookRecorder；设置后 'orderbook' 节点提供按K线聚合的盘口特征（见 orderbook.py）
+            orderflow_imbalance: 订单流堆积要求的平均买卖失衡（绝对值）
+            orderflow_stacks: 订单流堆积要求的同侧堆积档数
+            center_index: 可选的 CenterIndexRegistry；设置后 'center_index' 中枢区间索引按 (symbol, timeframe)
+                增量维护（见 center_index.py），否则每次一次性构造
+            cross_asset: 可选的 CrossAssetTracker；设置后 'cross_asset' 节点提供与基准品种的滚动相关系数、
+                beta 与相对强弱分位（见 cross_asset.py），否则这些列全为 NaN
+            decouple_corr: 与基准的滚动相关系数由上向下跌破该值视为脱钩
+            rs_breakout_rank: 相对强弱分位上穿该值视为强势突破，下穿 1 - 该值视为弱势跌破
+            journal: 可选的 SignalJournal；设置后 detect_all_signals 产生的信号与已计算的缠论买卖点
+                按 (symbol, timeframe, K线时间) 写入信号日志（见 signal_journal.py），未给出 symbol 时不记录
+            derivatives_timeframe: 未在 enabled_detectors 中列出的周期默认只在该周期启用 'derivatives' 检测器
+                （同一品种的衍生品数据各周期相同，避免每个周期重复告警）；None 时各周期都启用
+        """
+        self.rsi_overbought = rsi_overbought
+        self.rsi_oversold = rsi_oversold
+        self.volume_lookback = volume_lookback
+        self.volume_multiplier = volume_multiplier
+        self.bb_squeeze_threshold = bb_squeeze_threshold
+        self.chan_analyzer = ChanAnalyzer(min_stroke_gap=min_stroke_gap)
+        self.enabled_detectors = enabled_detectors or {}
+        self.indicator_cache = IndicatorCache()
+        self.chan_windows = chan_windows
+        self.chan_levels = chan_levels
+        self.derivatives = derivatives
+        self.funding_overheat = funding_overheat
+        self.funding_short_extreme = funding_short_extreme
+        self.oi_surge = oi_surge
+        self.orderbook = orderbook
+        self.orderflow_imbalance = orderflow_imbalance
+        self.orderflow_stacks = orderflow_stacks
+        self.center_index = center_index
+        self.cross_asset = cross_asset
+        self.decouple_corr = decouple_corr
+        self.rs_breakout_rank = rs_breakout_rank
+        self.journal = journal
+        self.derivatives_timeframe = derivatives_timeframe
 
-    def detect_all_signals(self, timeframe: str, indicators: Dict[str, Any], ohlcv: List[List[Any]]) -> List[Signal]:
-        """检测所有来源的信号，包括缠论信号"""
-        signals = []
-        signals.extend(self.detect_macd_signals(timeframe, indicators))
-        signals.extend(self.detect_rsi_signals(timeframe, indicators))
-        signals.extend(self.detect_volume_signals(timeframe, indicators, ohlcv))
-        signals.extend(self.detect_bollinger_bands_signals(timeframe, indicators))
-        
-        # 新增：调用缠论信号检测
-        signals.extend(self.detect_chan_signals(timeframe, indicators, ohlcv))
+    def enabled_for(self, timeframe: str) -> List[str]:
+        """返回该周期启用的检测器名称"""
+        names = self.enabled_detectors.get(timeframe)
+        if names is None:
+            names = [n for n in DETECTORS if n != 'derivatives' or self.derivatives_timeframe in (None, timeframe)]
+        unknown = [n for n in names if n not in DETECTORS]
+        if unknown:
+            raise ValueError(f"Unknown detectors for {timeframe}: {unknown}")
+        return names
+
+    def context(self, timeframe: str, ohlcv: List[List[Any]], symbol: str = '',
+                indicators: Optional[Dict[str, Any]] = None) -> AnalysisContext:
+        """为一组K线创建惰性求值上下文；indicators 中已有的键会直接使用而不再计算"""
+        return AnalysisContext(symbol, timeframe, ohlcv, cache=self.indicator_cache,
+                               chan_analyzer=self.chan_analyzer, overrides=indicators, chan_windows=self.chan_windows,
+                               chan_levels=self.chan_levels, derivatives=self.derivatives,
+                               orderbook=self.orderbook, center_index=self.center_index,
+                               cross_asset=self.cross_asset)
 
+    def detect_all_signals(self, timeframe: str, indicators: Optional[Dict[str, Any]], ohlcv: List[List[Any]],
+                           symbol: str = '') -> List[Signal]:
+        """
+        运行该周期启用的检测器，只计算它们声明依赖的指标与结构。每个检测器单独求值其依赖并运行，
+        某个节点或检测器出错（如缠论分析异常）只跳过该检测器并记录日志，不影响其它检测器。
+        """
+        context = indicators if isinstance(indicators, AnalysisContext) else self.context(timeframe, ohlcv, symbol, indicators)
+        specs = [DETECTORS[name] for name in self.enabled_for(timeframe)]
+
+        signals = []
+        for spec in specs:
+            try:
+                context.require(spec.requires)
+                signals.extend(spec.func(self, timeframe, context))
+            except Exception as e:
+                logger.error(f"Detector '{spec.name}' failed on {symbol or '?'} {timeframe}: {e}", exc_info=True)
+        if self.journal is not None and symbol:
+            self.journal.record(symbol, timeframe, signals, context)
         return signals
 
     def detect_chan_signals(self, timeframe: str, indicators: Dict[str, Any], ohlcv: List[List[Any]]) -> List[Signal]:
         """从缠论结构中检测买卖点信号"""
         chan_signals = []
         macd_hist = indicators.get('macd_hist', [])
-        if not macd_hist or not ohlcv:
+        if len(macd_hist) == 0 or len(ohlcv) == 0:
             return chan_signals
 
-        # 使用完整的分析流程
+        # 使用完整的分析流程（上下文中已有缠论结构时直接复用）；分析异常交由 detect_all_signals 隔离并记录
+        _strokes, _segments, _centers, buy_sell_points = self._chan_structures(indicators, ohlcv)
+        for point in buy_sell_points:
+            if point.point_type not in CHAN_SIGNAL_POINTS:
+                continue
+            signal_type, label = CHAN_SIGNAL_POINTS[point.point_type]
+            chan_signals.append(Signal(
+                name=f"{timeframe} 缠论{label}",
+                type=signal_type,
+                description=f"在 {point.time} 出现缠论第{label}，价格约为 {point.price:.2f}，由盘整背驰引发。",
+                source='Chan'
+            ))
+        return chan_signals
+
+    # ================== 全历史序列模式 ==================
+    # 每个 *_series 方法对整段输入做一次向量化计算，返回 {'bullish': mask, 'bearish': mask}
+    # 布尔数组（长度与输入一致）；末根K线的 detect_* 方法只读取其最后一个元素。
+
+    def detect_all_series(self, indicators: Dict[str, Any], ohlcv: List[List[Any]]) -> Dict[str, Dict[str, np.ndarray]]:
+        """一次性计算所有检测器在全历史上的信号序列，按来源分组"""
+        return {
+            'MACD': self.macd_series(indicators),
+            'RSI': self.rsi_series(indicators),
+            'Volume': self.volume_series(ohlcv),
+            'BBands': self.bollinger_bands_series(indicators),
+            'Chan': self.chan_series(indicators, ohlcv),
+            'Derivatives': self.derivatives_series(indicators),
+            'OrderFlow': self.orderflow_series(indicators),
+            'CrossAsset': self.cross_asset_series(indicators),
+        }
+
+    def macd_series(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """MACD 金叉/死叉序列：快慢线差值的符号变化"""
+        macd = np.asarray(indicators.get('macd', []), dtype=np.float64)
+        signal_line = np.asarray(indicators.get('signal_line', []), dtype=np.float64)
+        n = min(len(macd), len(signal_line))
+        diff = macd[len(macd) - n:] - signal_line[len(signal_line) - n:]
+        golden = np.zeros(n, dtype=bool)
+        dead = np.zeros(n, dtype=bool)
+        golden[1:] = (diff[:-1] < 0) & (diff[1:] > 0)
+        dead[1:] = (diff[:-1] > 0) & (diff[1:] < 0)
+        return {'bullish': golden, 'bearish': dead}
+
+    def rsi_series(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """RSI 超买/超卖阈值掩码"""
+        rsi = np.asarray(indicators.get('rsi', []), dtype=np.float64)
+        return {'bullish': rsi < self.rsi_oversold, 'bearish': rsi > self.rsi_overbought}
+
+    def volume_ratio_series(self, ohlcv: List[List[Any]]) -> np.ndarray:
+        """当前成交量与前 volume_lookback 根均量之比，历史不足处为 NaN"""
+        volume = as_columns(ohlcv).volume
+        lookback = self.volume_lookback
+        ratio = np.full(len(volume), np.nan)
+        if len(volume) < lookback + 1:
+            return ratio
+        csum = np.cumsum(np.insert(volume, 0, 0.0))
+        avg = (csum[lookback:-1] - csum[:-lookback - 1]) / lookback
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio[lookback:] = volume[lookback:] / avg
+        return ratio
+
+    def volume_series(self, ohlcv: List[List[Any]]) -> Dict[str, np.ndarray]:
+        """放量上涨/放量下跌序列"""
+        data = as_columns(ohlcv)
+        surge = self.volume_ratio_series(data) > self.volume_multiplier
+        rising = np.zeros(len(data), dtype=bool)
+        if len(data):
+            rising[1:] = data.close[1:] > data.close[:-1]
+        return {'bullish': surge & rising, 'bearish': surge & ~rising}
+
+    def bollinger_bands_series(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """布林带收口后突破序列：前一根带宽低于阈值，当前收盘突破上/下轨"""
+        bandwidth = np.asarray(indicators.get('bandwidth', []), dtype=np.float64)
+        close = np.asarray(indicators.get('close', []), dtype=np.float64)
+        upper = np.asarray(indicators.get('upper_band', []), dtype=np.float64)
+        lower = np.asarray(indicators.get('lower_band', []), dtype=np.float64)
+        n = len(bandwidth)
+        if not (len(close) == len(upper) == len(lower) == n):
+            return {'bullish': np.zeros(n, dtype=bool), 'bearish': np.zeros(n, dtype=bool)}
+        squeeze = np.zeros(n, dtype=bool)
+        squeeze[1:] = bandwidth[:-1] < self.bb_squeeze_threshold
+        return {'bullish': squeeze & (close > upper), 'bearish': squeeze & ~(close > upper) & (close < lower)}
+
+    def chan_series(self, indicators: Dict[str, Any], ohlcv: List[List[Any]]) -> Dict[str, np.ndarray]:
+        """
+        缠论买卖点序列：与 detect_chan_signals 相同的买卖点类型（CHAN_SIGNAL_POINTS）在其确认K线处为 True。
+
+        买卖点的时间是其所在段的终点，只有事后才能知道；段的终点要等下一笔走完（其终点分型右侧K线出现）
+        才确认，因此标记放在那根K线上，尚未确认的买卖点不标记，历史回放中不会用到未来数据。
+        """
+        data = as_columns(ohlcv)
+        bullish = np.zeros(len(data), dtype=bool)
+        bearish = np.zeros(len(data), dtype=bool)
+        macd_hist = indicators.get('macd_hist', [])
+        if len(macd_hist) == 0 or len(data) == 0:
+            return {'bullish': bullish, 'bearish': bearish}
         try:
-            _strokes, _segments, _centers, buy_sell_points = self.chan_analyzer.analyze(ohlcv, macd_hist)
-            
-            for point in buy_sell_points:
-                if point.point_type == '1st_buy':
-                    chan_signals.append(Signal(
-                        name=f"{timeframe} 缠论一类买点",
-                        type='bullish',
-                        description=f"在 {point.time} 出现缠论第一类买点，价格约为 {point.price:.2f}，由盘整背驰引发。",
-                        source='Chan'
-                    ))
-                elif point.point_type == '1st_sell':
-                    chan_signals.append(Signal(
-                        name=f"{timeframe} 缠论一类卖点",
-                        type='bearish',
-                        description=f"在 {point.time} 出现缠论第一类卖点，价格约为 {point.price:.2f}，由盘整背驰引发。",
-                        source='Chan'
-                    ))
+            strokes, _segments, _centers, points = self._chan_structures(indicators, ohlcv)
         except Exception as e:
-            # 在分析过程中可能会有各种异常，例如数据不足等，这里暂时只打印
-            print(f"Error during Chan analysis on {timeframe}: {e}")
+            logger.error(f"Error during Chan analysis: {e}", exc_info=True)
+            return {'bullish': bullish, 'bearish': bearish}
+        points = [p for p in points if p.point_type in CHAN_SIGNAL_POINTS]
+        if not points:
+            return {'bullish': bullish, 'bearish': bearish}
+        # 段终点之后的第一笔：起点分型不早于段终点
+        stroke_starts = np.array([s.start_fractal.kline.time for s in strokes])
+        following = np.searchsorted(stroke_starts, [p.time for p in points], side='left')
+        confirmed = np.array([strokes[i].end_fractal.kline.time if i < len(strokes) else data.timestamp[-1] + 1
+                              for i in following.tolist()])
+        index = np.searchsorted(data.timestamp, confirmed, side='right')
+        is_buy = np.array([CHAN_SIGNAL_POINTS[p.point_type][0] == 'bullish' for p in points], dtype=bool)
+        known = index < len(data)
+        bullish[index[is_buy & known]] = True
+        bearish[index[~is_buy & known]] = True
+        return {'bullish': bullish, 'bearish': bearish}
 
-        return chan_signals
+    def derivatives_series(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """资金费率极值序列：费率过高（多头过热）为看跌，过低（空头极端，轧空风险）为看涨；NaN 处为 False"""
+        funding = np.asarray(indicators.get('funding_rate', []), dtype=np.float64)
+        return {'bullish': funding < self.funding_short_extreme, 'bearish': funding > self.funding_overheat}
+
+    def orderflow_series(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """订单流堆积序列：买盘失衡且买侧出现多档堆积为看涨，卖侧对称为看跌；未记录盘口处为 False"""
+        imbalance = np.asarray(indicators.get('ob_imbalance', []), dtype=np.float64)
+        bid_stacks = np.asarray(indicators.get('ob_bid_stacks', []), dtype=np.float64)
+        ask_stacks = np.asarray(indicators.get('ob_ask_stacks', []), dtype=np.float64)
+        n = len(imbalance)
+        if not (len(bid_stacks) == len(ask_stacks) == n):
+            return {'bullish': np.zeros(n, dtype=bool), 'bearish': np.zeros(n, dtype=bool)}
+        return {'bullish': (imbalance > self.orderflow_imbalance) & (bid_stacks >= self.orderflow_stacks),
+                'bearish': (imbalance < -self.orderflow_imbalance) & (ask_stacks >= self.orderflow_stacks)}
+
+    def cross_asset_events(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """
+        跨品种事件序列：decouple 为与基准的相关系数自上而下跌破 decouple_corr，rs_breakout / rs_breakdown
+        为相对强弱分位上穿 rs_breakout_rank / 下穿 1 - rs_breakout_rank；NaN 处为 False
+        """
+        corr = np.asarray(indicators.get('xa_corr', []), dtype=np.float64)
+        rank = np.asarray(indicators.get('xa_rs_rank', []), dtype=np.float64)
+        n = len(corr)
+        events = {key: np.zeros(n, dtype=bool) for key in ('decouple', 'rs_breakout', 'rs_breakdown')}
+        if len(rank) != n or n < 2:
+            return events
+        events['decouple'][1:] = (corr[:-1] >= self.decouple_corr) & (corr[1:] < self.decouple_corr)
+        events['rs_breakout'][1:] = (rank[:-1] < self.rs_breakout_rank) & (rank[1:] >= self.rs_breakout_rank)
+        low = 1.0 - self.rs_breakout_rank
+        events['rs_breakdown'][1:] = (rank[:-1] > low) & (rank[1:] <= low)
+        return events
+
+    def cross_asset_series(self, indicators: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """跨品种信号序列：相对强弱突破或跑赢基准时脱钩为看涨，相对强弱跌破或跑输基准时脱钩为看跌"""
+        events = self.cross_asset_events(indicators)
+        rs = np.asarray(indicators.get('xa_rs', []), dtype=np.float64)
+        if len(rs) != len(events['decouple']):
+            rs = np.full(len(events['decouple']), np.nan)
+        return {'bullish': events['rs_breakout'] | (events['decouple'] & (rs > 0)),
+                'bearish': events['rs_breakdown'] | (events['decouple'] & (rs < 0))}
+
+    def _chan_structures(self, indicators: Dict[str, Any], ohlcv: List[List[Any]]):
+        """优先读取上下文中的 'chan' 结构，否则现场分析"""
+        if 'chan' in indicators:
+            return indicators['chan']
+        return self.chan_analyzer.analyze(ohlcv, indicators.get('macd_hist', []))
+
+    # ================== 末根K线信号 ==================
 
     def detect_macd_signals(self, timeframe: str, indicators: Dict[str, Any]) -> List[Signal]:
         """检测MACD信号"""
-        # ... (以下代码保持不变)
         signals = []
-        macd = indicators.get('macd', [])
-        signal_line = indicators.get('signal_line', [])
-        if len(macd) < 2 or len(signal_line) < 2:
+        series = self.macd_series(indicators)
+        if len(series['bullish']) < 2:
             return signals
 
         # 金叉
-        if macd[-2] < signal_line[-2] and macd[-1] > signal_line[-1]:
+        if series['bullish'][-1]:
             signals.append(Signal(name=f"{timeframe} MACD金叉", type='bullish', description="MACD快线上穿慢线", source='MACD'))
         # 死叉
-        if macd[-2] > signal_line[-2] and macd[-1] < signal_line[-1]:
+        if series['bearish'][-1]:
             signals.append(Signal(name=f"{timeframe} MACD死叉", type='bearish', description="MACD快线下穿慢线", source='MACD'))
         return signals
 
@@ -83,99 +319,140 @@ class SignalDetector:
         """检测RSI信号"""
         signals = []
         rsi = indicators.get('rsi', [])
-        if not rsi:
+        if len(rsi) == 0:
             return signals
-        
-        if rsi[-1] > 70:
+        series = self.rsi_series(indicators)
+
+        if series['bearish'][-1]:
             signals.append(Signal(name=f"{timeframe} RSI超买", type='bearish', description=f"RSI值为 {rsi[-1]:.2f}，进入超买区", source='RSI'))
-        if rsi[-1] < 30:
+        if series['bullish'][-1]:
             signals.append(Signal(name=f"{timeframe} RSI超卖", type='bullish', description=f"RSI值为 {rsi[-1]:.2f}，进入超卖区", source='RSI'))
         return signals
 
     def detect_volume_signals(self, timeframe: str, indicators: Dict[str, Any], ohlcv: List[List[Any]]) -> List[Signal]:
         """检测成交量信号"""
         signals = []
-        if len(ohlcv) < 20:
+        if len(ohlcv) < self.volume_lookback + 1:
             return signals
-        
-        volumes = [x[5] for x in ohlcv]
-        avg_volume = sum(volumes[-20:-1]) / 19
-        last_volume = volumes[-1]
-        last_close = ohlcv[-1][4]
-        prev_close = ohlcv[-2][4]
-
-        if last_volume > avg_volume * 2:
-            if last_close > prev_close:
-                signals.append(Signal(name=f"{timeframe} 放量上涨", type='bullish', description="成交量显著放大，价格上涨", source='Volume'))
-            else:
-                signals.append(Signal(name=f"{timeframe} 放量下跌", type='bearish', description="成交量显著放大，价格下跌", source='Volume'))
+        series = self.volume_series(ohlcv)
+
+        if series['bullish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 放量上涨", type='bullish', description="成交量显著放大，价格上涨", source='Volume'))
+        elif series['bearish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 放量下跌", type='bearish', description="成交量显著放大，价格下跌", source='Volume'))
         return signals
 
     def detect_bollinger_bands_signals(self, timeframe: str, indicators: Dict[str, Any]) -> List[Signal]:
         """检测布林带信号"""
         signals = []
-        bandwidth = indicators.get('bandwidth', [])
-        close_prices = indicators.get('close', [])
-        upper_band = indicators.get('upper_band', [])
-        lower_band = indicators.get('lower_band', [])
-
-        if len(bandwidth) < 2 or len(close_prices) < 1:
+        if len(indicators.get('bandwidth', [])) < 2 or len(indicators.get('close', [])) < 1:
             return signals
+        series = self.bollinger_bands_series(indicators)
 
         # 收口后突破
-        if bandwidth[-2] < 0.05: # 带宽小于5%视为收口
-            if close_prices[-1] > upper_band[-1]:
-                signals.append(Signal(name=f"{timeframe} 布林带收口后向上突破", type='bullish', description="价格在布林带收口后突破上轨", source='BBands'))
-            elif close_prices[-1] < lower_band[-1]:
-                signals.append(Signal(name=f"{timeframe} 布林带收口后向下突破", type='bearish', description="价格在布林带收口后突破下轨", source='BBands'))
+        if series['bullish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 布林带收口后向上突破", type='bullish', description="价格在布林带收口后突破上轨", source='BBands'))
+        elif series['bearish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 布林带收口后向下突破", type='bearish', description="价格在布林带收口后突破下轨", source='BBands'))
         return signals
 
-            
-        return signals
-        
-    def detect_rsi_signals(self, data: Dict[str, Any], timeframe: str) -> List[Signal]:
-        """检测RSI信号"""
-        signals = []
-        
-        # 检查RSI背离
-        if data['rsi'][-1] > 70 and data['close'][-1] < data['close'][-2]:
-            signals.append(Signal('RSI Bearish Divergence', 3, timeframe))
-        elif data['rsi'][-1] < 30 and data['close'][-1] > data['close'][-2]:
-            signals.append(Signal('RSI Bullish Divergence', 3, timeframe))
-            
-        return signals
-        
-    def detect_volume_signals(self, data: Dict[str, Any], timeframe: str) -> List[Signal]:
-        """检测成交量信号"""
+
+    def detect_derivatives_signals(self, timeframe: str, indicators: Dict[str, Any]) -> List[Signal]:
+        """检测资金费率与持仓量信号"""
         signals = []
-        
-        # 检查成交量突破
-        if data['volume'][-1] > 1.5 * data['volume_ma'][-1] and data['close'][-1] > data['close'][-2]:
-            signals.append(Signal('Volume Breakout', 2, timeframe))
-            
+        funding = indicators.get('funding_rate', [])
+        if len(funding) == 0:
+            return signals
+        series = self.derivatives_series(indicators)
+
+        if series['bearish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 资金费率过热", type='bearish', description=f"资金费率 {funding[-1]:.4%}，多头过热，回调风险增大", source='Derivatives'))
+        elif series['bullish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 资金费率极端为负", type='bullish', description=f"资金费率 {funding[-1]:.4%}，空头极端，警惕轧空反弹", source='Derivatives'))
+        oi_change = indicators.get('open_interest_change_1d', [])
+        if len(oi_change) and oi_change[-1] > self.oi_surge:
+            signals.append(Signal(name=f"{timeframe} 持仓量单日激增", type='neutral', description=f"持仓量24小时增加 {oi_change[-1]:.1%}，方向选择临近", source='Derivatives'))
         return signals
-        
-    def detect_bollinger_bands_signals(self, data: Dict[str, Any], timeframe: str) -> List[Signal]:
-        """检测布林带收口突破信号"""
+
+    def detect_orderflow_signals(self, timeframe: str, indicators: Dict[str, Any]) -> List[Signal]:
+        """检测订单流堆积信号"""
         signals = []
-        
-        # 检查布林带收口（带宽小于5%）后，价格突破上下轨
-        if len(data.get('bb_width', [])) > 1 and len(data.get('close', [])) > 1:
-            is_squeeze = data['bb_width'][-2] < 0.05
-            
-            if is_squeeze:
-                if data['close'][-1] > data['bb_upper'][-1]:
-                    signals.append(Signal('Bollinger Breakout Bullish', 2, timeframe))
-                elif data['close'][-1] < data['bb_lower'][-1]:
-                    signals.append(Signal('Bollinger Breakout Bearish', 2, timeframe))
-                    
+        imbalance = indicators.get('ob_imbalance', [])
+        if len(imbalance) == 0:
+            return signals
+        series = self.orderflow_series(indicators)
+
+        if series['bullish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 买盘订单流堆积", type='bullish', description=f"盘口买卖失衡 {imbalance[-1]:+.2f}，买侧 {indicators['ob_bid_stacks'][-1]:.0f} 档挂单堆积", source='OrderFlow'))
+        elif series['bearish'][-1]:
+            signals.append(Signal(name=f"{timeframe} 卖盘订单流堆积", type='bearish', description=f"盘口买卖失衡 {imbalance[-1]:+.2f}，卖侧 {indicators['ob_ask_stacks'][-1]:.0f} 档挂单堆积", source='OrderFlow'))
         return signals
-        
-    def detect_all_signals(self, data: Dict[str, Any], timeframe: str) -> List[Signal]:
-        """检测所有信号"""
+
+    def detect_cross_asset_signals(self, timeframe: str, indicators: Dict[str, Any]) -> List[Signal]:
+        """
+        检测与基准脱钩、相对强弱突破信号。跨品种特征只对齐到时间戳完全相同的已收盘K线，尚未收盘的
+        末根K线没有特征，因此在最后两根K线中带特征的最新一根（即最新已收盘K线）上判定
+        """
         signals = []
-        signals.extend(self.detect_macd_signals(data, timeframe))
-        signals.extend(self.detect_rsi_signals(data, timeframe))
-        signals.extend(self.detect_volume_signals(data, timeframe))
-        signals.extend(self.detect_bollinger_bands_signals(data, timeframe))
+        corr = np.asarray(indicators.get('xa_corr', []), dtype=np.float64)
+        rank_series = np.asarray(indicators.get('xa_rs_rank', []), dtype=np.float64)
+        if len(corr) < 2:
+            return signals
+        present = np.flatnonzero(~np.isnan(corr[-2:]) | ~np.isnan(rank_series[-2:]))
+        if len(present) == 0:
+            return signals
+        i = len(corr) - 2 + int(present[-1])
+        events = self.cross_asset_events(indicators)
+        rs, rank = indicators['xa_rs'][i], rank_series[i]
+
+        if events['decouple'][i]:
+            signal_type = 'bullish' if rs > 0 else 'bearish' if rs < 0 else 'neutral'
+            signals.append(Signal(name=f"{timeframe} 与基准脱钩", type=signal_type, description=f"与基准的滚动相关系数降至 {corr[i]:.2f}，窗口内相对基准 {rs:+.2%}（对数收益）", source='CrossAsset'))
+        if events['rs_breakout'][i]:
+            signals.append(Signal(name=f"{timeframe} 相对强弱突破", type='bullish', description=f"窗口收益在品种池中的分位升至 {rank:.0%}，相对基准 {rs:+.2%}", source='CrossAsset'))
+        elif events['rs_breakdown'][i]:
+            signals.append(Signal(name=f"{timeframe} 相对强弱跌破", type='bearish', description=f"窗口收益在品种池中的分位降至 {rank:.0%}，相对基准 {rs:+.2%}", source='CrossAsset'))
         return signals
+
+
+# ================== 内置检测器注册 ==================
+
+@register_detector('macd', requires=('macd',))
+def _macd_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_macd_signals(timeframe, context)
+
+
+@register_detector('rsi', requires=('rsi',))
+def _rsi_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_rsi_signals(timeframe, context)
+
+
+@register_detector('volume', requires=('ohlcv',))
+def _volume_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_volume_signals(timeframe, context, context['ohlcv'])
+
+
+@register_detector('bbands', requires=('bbands', 'price'))
+def _bbands_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_bollinger_bands_signals(timeframe, context)
+
+
+@register_detector('chan', requires=('chan',))
+def _chan_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_chan_signals(timeframe, context, context['ohlcv'])
+
+
+
+@register_detector('derivatives', requires=('derivatives',))
+def _derivatives_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_derivatives_signals(timeframe, context)
+
+
+@register_detector('orderflow', requires=('orderbook',))
+def _orderflow_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_orderflow_signals(timeframe, context)
+
+
+@register_detector('crossasset', requires=('cross_asset',))
+def _cross_asset_detector(detector: SignalDetector, timeframe: str, context: AnalysisContext) -> List[Signal]:
+    return detector.detect_cross_asset_signals(timeframe, context)
@@ -0,0 +1,216 @@
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from logging_config import logger
+from ohlcv import as_columns
+
+# Journal rows: the bar time as 'timestamp', string tags and float fields. Signals are recorded at the
+# bar they fired on with its close as the price; Chan buy/sell points at their own bar and price.
+JOURNAL_MEASUREMENT = 'signal_journal'
+JOURNAL_TAGS: Tuple[str, ...] = ('timeframe', 'kind', 'name', 'type', 'source')
+JOURNAL_FIELDS: Tuple[str, ...] = ('price', 'detected_at')
+
+EventKey = Tuple[str, str, str, str, int]  # (symbol, timeframe, kind, name, bar time)
+
+
+class SignalJournal:
+    """
+    Buffered, batched journal of every emitted Signal and Chan buy/sell point.
+
+    record() only appends to an in-memory buffer, so analysis never waits on storage. A background
+    thread writes the buffer to the storage backend (write_event_data: InfluxDB tags, or the local
+    store's coded column files) every `flush_interval` seconds, and sooner when record() signals that
+    `batch_size` rows are waiting, one write per symbol.
+    Events already journaled (same symbol, timeframe, kind, name and bar) are dropped before buffering,
+    so re-detecting the same open candle or the same Chan points each cycle costs nothing. query()
+    reads events back by symbol, time range and tags without re-running any analysis.
+    """
+
+    def __init__(self, db_manager: Any, measurement: str = JOURNAL_MEASUREMENT, batch_size: int = 500,
+                 flush_interval: float = 5.0, dedup_size: int = 100_000):
+        """
+        Args:
+            db_manager: Storage backend with write_event_data / query_event_data.
+            measurement (str): Event measurement the journal is stored under.
+            batch_size (int): Buffered rows that wake the background flusher early.
+            flush_interval (float): Seconds between background flushes.
+            dedup_size (int): Recently journaled event keys remembered for de-duplication.
+        """
+        self.db_manager = db_manager
+        self.measurement = measurement
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_size = dedup_size
+        self._buffer: Dict[str, List[Dict[str, Any]]] = {}
+        self._buffered = 0
+        self._seen: 'OrderedDict[EventKey, None]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'recorded': 0, 'duplicates': 0, 'written': 0, 'flushes': 0, 'requeued': 0}
+
+    # ---------- recording ----------
+
+    def record(self, symbol: str, timeframe: str, signals: Iterable[Any], context: Any) -> int:
+        """
+        Journals the signals one detect_all_signals() call emitted for the latest bar of `context`, plus
+        the Chan buy/sell points when the context computed Chan structures. Returns the new events.
+        """
+        bars = as_columns(context['ohlcv'])
+        if len(bars) == 0:
+            return 0
+        added = self.record_signals(symbol, timeframe, signals, int(bars.timestamp[-1]), float(bars.close[-1]))
+        if 'chan' in context.computed():
+            added += self.record_points(symbol, timeframe, context['chan'][3])
+        return added
+
+    def record_signals(self, symbol: str, timeframe: str, signals: Iterable[Any], bar_time: int, price: float) -> int:
+        """Journals Signals that fired on the bar opening at `bar_time`."""
+        return self._add(symbol, [
+            {'timestamp': bar_time, 'timeframe': timeframe, 'kind': 'signal', 'name': s.name, 'type': s.type,
+             'source': s.source, 'price': price} for s in signals])
+
+    def record_points(self, symbol: str, timeframe: str, points: Iterable[Any]) -> int:
+        """Journals Chan BuySellPoints at their own bar and price."""
+        return self._add(symbol, [
+            {'timestamp': int(p.time), 'timeframe': timeframe, 'kind': 'chan_point', 'name': p.point_type,
+             'type': 'bullish' if p.point_type.endswith('buy') else 'bearish', 'source': 'Chan',
+             'price': float(p.price)} for p in points])
+
+    def _add(self, symbol: str, rows: List[Dict[str, Any]]) -> int:
+        now = int(time.time() * 1000)
+        added = 0
+        with self._lock:
+            for row in rows:
+                key = (symbol, row['timeframe'], row['kind'], row['name'], row['timestamp'])
+                if key in self._seen:
+                    self._seen.move_to_end(key)
+                    self.stats['duplicates'] += 1
+                    continue
+                self._seen[key] = None
+                if len(self._seen) > self.dedup_size:
+                    self._seen.popitem(last=False)
+                row['detected_at'] = now
+                self._buffer.setdefault(symbol, []).append(row)
+                added += 1
+            self._buffered += added
+            self.stats['recorded'] += added
+            full = self._buffered >= self.batch_size
+        if full:
+            self._wake.set()
+        return added
+
+    # ---------- writing ----------
+
+    def flush(self) -> int:
+        """
+        Writes the buffered events, one batch per symbol; returns the rows written. When a write fails,
+        that symbol's rows and those not attempted yet go back to the front of the buffer (their keys stay
+        in the de-duplication set, since they are still pending) and the error is re-raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                buffer, self._buffer, self._buffered = self._buffer, {}, 0
+            written = 0
+            pending = list(buffer.items())
+            try:
+                while pending:
+                    symbol, rows = pending[0]
+                    frame = pd.DataFrame(rows, columns=['timestamp', *JOURNAL_TAGS, *JOURNAL_FIELDS])
+                    self.db_manager.write_event_data(self.measurement, frame, symbol, JOURNAL_TAGS)
+                    pending.pop(0)
+                    written += len(rows)
+            finally:
+                if pending:
+                    self._requeue(pending)
+                if written:
+                    self.stats['written'] += written
+                    self.stats['flushes'] += 1
+            return written
+
+    def _requeue(self, pending: List[Tuple[str, List[Dict[str, Any]]]]):
+        with self._lock:
+            for symbol, rows in pending:
+                self._buffer[symbol] = rows + self._buffer.get(symbol, [])
+                self._buffered += len(rows)
+            self.stats['requeued'] += sum(len(rows) for _, rows in pending)
+
+    def run(self):
+        while True:
+            stopping = self._stop.is_set()  # one more flush after stop() for rows added meanwhile
+            if not stopping:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                if stopping:
+                    logger.error(f"Signal journal flush failed at shutdown; {self._buffered} events were not written: {e}")
+                else:
+                    logger.error(f"Signal journal flush failed; {self._buffered} events kept for the next flush: {e}")
+            if stopping:
+                break
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, name='signal-journal', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 30.0):
+        """Stops the background flusher after it has written whatever is still buffered."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            self.flush()
+
+    # ---------- reading ----------
+
+    def query(self, symbol: str, time_range_start: str = "-7d", time_range_stop: Optional[str] = None,
+              **where: str) -> pd.DataFrame:
+        """
+        Journaled events of one symbol, sorted by bar time, optionally filtered on tags, e.g.
+        query('ETH/USDT', '-7d', timeframe='1h', kind='chan_point', type='bullish').
+        """
+        unknown = [tag for tag in where if tag not in JOURNAL_TAGS]
+        if unknown:
+            raise ValueError(f"Unknown journal tags: {unknown}")
+        return self.db_manager.query_event_data(self.measurement, symbol, time_range_start, time_range_stop, where)
+
+
+def main():
+    """Prints journaled events, e.g. `python signal_journal.py ETH/USDT --since -7d --type bullish`."""
+    from config import config
+    from local_store import create_storage
+
+    parser = argparse.ArgumentParser(description="Query the signal and Chan point journal.")
+    parser.add_argument('symbol', nargs='?', default=config.SYMBOL)
+    parser.add_argument('--since', default='-7d', help="Flux-style range start, e.g. -7d or 2024-01-01T00:00:00Z")
+    parser.add_argument('--until', default=None, help="optional range stop")
+    for tag in JOURNAL_TAGS:
+        parser.add_argument(f'--{tag}', default=None)
+    args = parser.parse_args()
+
+    storage = create_storage(backend=config.STORAGE_BACKEND, local_path=config.LOCAL_STORE_PATH,
+                             influx_settings={'url': config.INFLUXDB_URL, 'token': config.INFLUXDB_TOKEN,
+                                              'org': config.INFLUXDB_ORG, 'bucket': config.INFLUXDB_BUCKET,
+                                              'tiers': config.INFLUXDB_TIERS})
+    where = {tag: getattr(args, tag) for tag in JOURNAL_TAGS if getattr(args, tag)}
+    events = SignalJournal(storage).query(args.symbol, args.since, args.until, **where)
+    if events.empty:
+        print("No journaled events.")
+        return
+    events['time'] = pd.to_datetime(events['timestamp'], unit='ms')
+    print(events[['time', *JOURNAL_TAGS, 'price']].to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
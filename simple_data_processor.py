@@ -1,22 +1,31 @@
-import ccxt
-import pandas as pd
-from typing import Dict
+from typing import Any, Dict, List, Optional
 from logging_config import logger
-from database_manager import DatabaseManager
 
 class SimpleDataProcessor:
     """Purely responsible for fetching data from the exchange and storing it in InfluxDB."""
 
-    def __init__(self, config: Dict, db_manager: DatabaseManager):
-        """Initializes the data processor with exchange configuration and a database manager instance."""
-        self.exchange = self._init_exchange(config['exchange'])
+    def __init__(self, config: Dict, db_manager: Any, exchange: Optional[Any] = None):
+        """Initializes the data processor with exchange configuration and a storage backend
+        (DatabaseManager, LocalBarStore or CachedDatabaseManager). A ready exchange object with the
+        ccxt fetch_ohlcv interface (e.g. loadtest.FakeExchange) can be injected instead."""
+        self._exchange = exchange
+        self._exchange_config = config['exchange']
         self.symbol = config['symbol']
         self.timeframes = config['timeframes']
         self.db_manager = db_manager
         logger.info("SimpleDataProcessor initialized.")
 
-    def _init_exchange(self, exchange_config: Dict) -> ccxt.Exchange:
+    @property
+    def exchange(self) -> Any:
+        """The exchange, created on first use so that processes which never fetch skip importing ccxt."""
+        if self._exchange is None:
+            self._exchange = self._init_exchange(self._exchange_config)
+        return self._exchange
+
+    def _init_exchange(self, exchange_config: Dict) -> 'ccxt.Exchange':
         """Initializes the ccxt exchange instance, using API keys only if they are provided."""
+        # Imported here: the ccxt package loads every exchange module (~0.4s, ~30MB) when imported.
+        import ccxt
         exchange_class = getattr(ccxt, exchange_config['name'])
 
         ccxt_params = {
@@ -42,9 +51,9 @@ class SimpleDataProcessor:
         logger.info(f"CCXT exchange '{exchange_config['name']}' initialized successfully.")
         return exchange
 
-    def fetch_and_store_ohlcv_data(self):
-        """Fetches OHLCV data for all configured timeframes and stores it in InfluxDB."""
-        for timeframe in self.timeframes:
+    def fetch_and_store_ohlcv_data(self, timeframes: Optional[List[str]] = None):
+        """Fetches OHLCV data for the given (default: all configured) timeframes and stores it in InfluxDB."""
+        for timeframe in timeframes if timeframes is not None else self.timeframes:
             try:
                 logger.info(f"Fetching OHLCV data for {self.symbol} with timeframe {timeframe}...")
                 # Fetch a reasonable number of recent candles to ensure data continuity
@@ -54,6 +63,7 @@ class SimpleDataProcessor:
                     logger.warning(f"No data returned for {self.symbol} with timeframe {timeframe}.")
                     continue
                 
+                import pandas as pd
                 df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
                 
                 # The database manager handles the data writing
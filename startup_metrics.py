@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is then omitted
+    resource = None
+
+# Modules whose import dominates startup; the report shows which of them each phase had loaded.
+HEAVY_MODULES = ('ccxt', 'pandas', 'influxdb_client', 'telegram', 'aiohttp', 'flask', 'numba')
+
+
+def process_age() -> Optional[float]:
+    """Seconds since the OS started this process (Linux /proc), so interpreter startup is included."""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def rss_mb() -> Tuple[Optional[float], Optional[float]]:
+    """(current, peak) resident set size in MiB, where the platform reports them."""
+    current = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        peak_raw = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak_raw / 2**20 if sys.platform == 'darwin' else peak_raw / 1024
+    return current, peak
+
+
+class StartupProfile:
+    """
+    Timeline of named startup phases for one process: time since process start, current and peak
+    RSS, and which heavy modules were imported by then. Times count from process start where /proc
+    is available, so interpreter startup and module imports are included wherever it is created.
+    """
+
+    def __init__(self):
+        age = process_age()
+        self._origin = time.perf_counter() - (age if age is not None else 0.0)
+        self.phases: List[Dict[str, Any]] = []
+
+    def mark(self, phase: str):
+        current, peak = rss_mb()
+        self.phases.append({
+            'phase': phase,
+            'seconds': round(time.perf_counter() - self._origin, 3),
+            'rss_mb': round(current, 1) if current is not None else None,
+            'peak_rss_mb': round(peak, 1) if peak is not None else None,
+            'heavy_modules': [m for m in HEAVY_MODULES if m in sys.modules],
+        })
+
+    def report(self) -> Dict[str, Any]:
+        return {'pid': os.getpid(), 'modules_loaded': len(sys.modules), 'phases': self.phases}
+
+    def dump(self) -> str:
+        return json.dumps(self.report(), indent=2)
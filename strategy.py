@@ -1,31 +1,48 @@
 from dataclasses import dataclass
-from typing import List, Dict
-from .config import config
-from .signal import Signal
+from typing import List, Dict, Optional
+from config import config
+from center_index import CenterIndex
+from signal_detector import Signal
 
 class Strategy:
-    def __init__(self, signals: List[Signal], timeframe: str):
+    def __init__(self, signals: List[Signal], timeframe: str, entry_price: Optional[float] = None,
+                 direction: str = 'long', center_index: Optional[CenterIndex] = None):
         self.signals = signals
         self.timeframe = timeframe
+        self.entry_price = entry_price
+        self.direction = direction
+        self.center_index = center_index
+        self.stop_loss: Optional[float] = None
+        self.take_profit: Optional[float] = None
         self.position_size = self.calculate_position_size()
         self.risk_reward_ratio = self.calculate_risk_reward()
-        
+
     def calculate_position_size(self) -> float:
         """Calculate position size based on signal strength"""
         signal_count = len(self.signals)
-        
+
         if signal_count >= config.MIN_SIGNALS_FOR_HEAVY_POSITION:
             return config.POSITION_SIZES['heavy'][0]
         elif signal_count >= 2:
             return config.POSITION_SIZES['medium'][0]
         else:
             return config.POSITION_SIZES['light'][0]
-            
+
     def calculate_risk_reward(self) -> float:
-        """Calculate risk/reward ratio"""
-        # This is a placeholder - actual implementation would require more context
-        return 3.0  # Minimum required ratio
-        
+        """
+        Calculate the risk/reward ratio from the Chan center boundaries around the entry: a long stops at
+        the nearest ZG/ZD below and targets the nearest one above (a short the reverse). Without an entry
+        price, a center index or a boundary on both sides the ratio is 0.0, so the strategy is not valid.
+        """
+        if self.entry_price is None or self.center_index is None:
+            return 0.0
+        levels = self.center_index.risk_reward([self.entry_price], self.direction)
+        stop, target, ratio = levels['stop'][0], levels['target'][0], levels['ratio'][0]
+        if ratio != ratio:  # NaN: no boundary on one side
+            return 0.0
+        self.stop_loss, self.take_profit = float(stop), float(target)
+        return float(ratio)
+
     def is_valid(self) -> bool:
         """Check if strategy meets minimum requirements"""
         return self.risk_reward_ratio >= config.MIN_RISK_REWARD_RATIO
@@ -33,10 +50,11 @@ class Strategy:
 class StrategyGenerator:
     def __init__(self):
         self.strategies = []
-        
-    def generate_strategy(self, signals: List[Signal], timeframe: str) -> Optional[Strategy]:
+
+    def generate_strategy(self, signals: List[Signal], timeframe: str, entry_price: Optional[float] = None,
+                          direction: str = 'long', center_index: Optional[CenterIndex] = None) -> Optional[Strategy]:
         """Generate a trading strategy based on signals"""
-        strategy = Strategy(signals, timeframe)
+        strategy = Strategy(signals, timeframe, entry_price, direction, center_index)
         if strategy.is_valid():
             return strategy
         return None
@@ -0,0 +1,239 @@
+import json
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from logging_config import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+_OFFSET = struct.Struct('<Q')
+
+
+class StrategyLog:
+    """
+    Append-only strategy record log shared by the generator (bot.py) and the notifier process.
+
+    Records are JSON lines in `<path>.log`; `<path>.idx` holds one fixed-width byte offset per record
+    and is written only after the record itself, so a reader never sees a partial record. Each record is
+    read from its own offset up to its newline, so bytes left behind by a writer that crashed between
+    the two writes (data written, offset not) are never part of any record. The record
+    count is the index size divided by 8 and record n is one seek away, so appends and reads cost the
+    same no matter how long the log is. Writers serialise on an flock of the index file.
+
+    Opening the log repairs what a crash can leave behind: a partially written offset is cut off the
+    index, and complete records after the last indexed one get their offsets back from the newlines.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.002):
+        """
+        Args:
+            path (str): Base path; `<path>.log` and `<path>.idx` are created next to it.
+            poll_interval (float): How often a blocking read re-checks the index size, in seconds.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._data = open(f"{path}.log", 'a+b')
+        self._index = open(f"{path}.idx", 'a+b')
+        self._lock = threading.Lock()
+        self._recover()
+
+    def _recover(self):
+        """Truncates the index to whole offsets and re-indexes complete records written after the last one."""
+        if fcntl is not None:
+            fcntl.flock(self._index.fileno(), fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._index.fileno()).st_size
+            if size % _OFFSET.size:
+                logger.warning(f"Strategy log index '{self.path}.idx' ends in a partial offset; truncating it.")
+                os.ftruncate(self._index.fileno(), size - size % _OFFSET.size)
+            seq = len(self)
+            start = 0
+            if seq:
+                start = _OFFSET.unpack(os.pread(self._index.fileno(), _OFFSET.size, (seq - 1) * _OFFSET.size))[0]
+            tail = os.pread(self._data.fileno(), max(os.fstat(self._data.fileno()).st_size - start, 0), start)
+            # Skip the last indexed record itself; every complete line after it is a candidate.
+            pos = tail.find(b'\n') + 1 if seq else 0
+            offsets = []
+            end = tail.find(b'\n', pos) if pos or not seq else -1
+            while end >= 0:
+                try:
+                    record = json.loads(tail[pos:end])
+                except ValueError:
+                    break
+                # Only records written as the next sequence number; anything else is orphaned bytes.
+                if not isinstance(record, dict) or record.get('seq') != seq + len(offsets):
+                    break
+                offsets.append(start + pos)
+                pos = end + 1
+                end = tail.find(b'\n', pos)
+            if offsets:
+                logger.warning(f"Re-indexed {len(offsets)} strategy record(s) missing from '{self.path}.idx'.")
+                self._index.write(b''.join(_OFFSET.pack(o) for o in offsets))
+                self._index.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._index.fileno(), fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return os.fstat(self._index.fileno()).st_size // _OFFSET.size
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Appends one record and returns its sequence number (0-based)."""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._index.fileno(), fcntl.LOCK_EX)
+            try:
+                seq = len(self)
+                body = json.dumps(dict(record, seq=seq, ts=int(time.time() * 1000)), ensure_ascii=False,
+                                  separators=(',', ':')).encode() + b'\n'
+                self._data.seek(0, os.SEEK_END)
+                offset = self._data.tell()
+                self._data.write(body)
+                self._data.flush()
+                self._index.write(_OFFSET.pack(offset))
+                self._index.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._index.fileno(), fcntl.LOCK_UN)
+        return seq
+
+    def read(self, seq: int, max_records: int = 100) -> List[Dict[str, Any]]:
+        """Records seq, seq + 1, ... (at most max_records) that are fully written."""
+        count = min(len(self) - seq, max_records)
+        if count <= 0:
+            return []
+        raw = os.pread(self._index.fileno(), (count + 1) * _OFFSET.size, seq * _OFFSET.size)
+        offsets = [_OFFSET.unpack_from(raw, i * _OFFSET.size)[0] for i in range(len(raw) // _OFFSET.size)]
+        if len(offsets) == count:
+            # No later record yet: the last one ends at its newline before the current end of the data file.
+            offsets.append(os.fstat(self._data.fileno()).st_size)
+        start = offsets[0]
+        chunk = os.pread(self._data.fileno(), offsets[count] - start, start)
+        records = []
+        for i in range(count):
+            # A record runs from its own offset to its newline; anything after that is orphaned bytes.
+            body = chunk[offsets[i] - start:offsets[i + 1] - start]
+            records.append(json.loads(body[:body.index(b'\n')]))
+        return records
+
+    def wait(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Blocks until record `seq` exists; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self) <= seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+
+class StrategyConsumer:
+    """
+    Reads a StrategyLog from a persisted offset. The offset is committed (atomically, via rename)
+    after the handler returns, so each record is handled once; a crash between handling and commit
+    redelivers that one record, which carries its `seq` for the handler to recognise. A record the
+    handler keeps failing on is retried `max_attempts` times, then appended to `<path>.<name>.dead`
+    and skipped, so one poison record cannot block the channel.
+    """
+
+    def __init__(self, log: StrategyLog, name: str, max_attempts: int = 5):
+        self.log = log
+        self.name = name
+        self.max_attempts = max_attempts
+        self.offset_path = f"{log.path}.{name}.offset"
+        self.dead_letter_path = f"{log.path}.{name}.dead"
+        self.offset = self._load_offset()
+        self._failures = 0  # consecutive failures of the record at self.offset
+
+    def _load_offset(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def commit(self, offset: int):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.offset_path)
+        self.offset = offset
+        self._failures = 0
+
+    def dead_letter(self, record: Dict[str, Any], error: Exception):
+        """Sets a record aside with its error and commits past it."""
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(record, error=str(error)), ensure_ascii=False) + '\n')
+        logger.error(f"[{self.name}] Gave up on strategy record {record.get('seq')} after {self._failures} attempts; "
+                     f"moved to {self.dead_letter_path}.")
+        self.commit(record['seq'] + 1)
+
+    def poll(self, timeout: Optional[float] = None, max_records: int = 100) -> List[Dict[str, Any]]:
+        """Waits up to `timeout` for records after the committed offset (without committing them)."""
+        if not self.log.wait(self.offset, timeout):
+            return []
+        return self.log.read(self.offset, max_records)
+
+    def run(self, handler: Callable[[Dict[str, Any]], Any], stop: Optional[threading.Event] = None,
+            timeout: float = 1.0):
+        """Feeds every new record to `handler`, committing after each one, until `stop` is set."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            for record in self.poll(timeout):
+                try:
+                    handler(record)
+                except Exception as e:
+                    self._failures += 1
+                    logger.error(f"[{self.name}] Failed to handle strategy record {record.get('seq')} "
+                                 f"(attempt {self._failures}/{self.max_attempts}): {e}", exc_info=True)
+                    if self._failures >= self.max_attempts:
+                        self.dead_letter(record, e)
+                        continue
+                    # Keep the offset so the record is retried rather than lost.
+                    stop.wait(timeout)
+                    break
+                self.commit(record['seq'] + 1)
+
+
+def export_xlsx(log: StrategyLog, path: str) -> bool:
+    """Regenerates the Excel view of the whole log (optional; needs pandas with openpyxl)."""
+    import pandas as pd
+    rows = []
+    for seq in range(0, len(log), 1000):
+        rows.extend(log.read(seq, 1000))
+    frame = pd.DataFrame([{'seq': r['seq'], 'time': pd.to_datetime(r['ts'], unit='ms'), 'symbol': r.get('symbol'),
+                           'message': r.get('message')} for r in rows])
+    tmp = f"{path}.tmp.xlsx"
+    try:
+        frame.to_excel(tmp, index=False)
+    except ImportError as e:
+        logger.warning(f"Skipping xlsx export, Excel writer not installed: {e}")
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def run_xlsx_export(log: StrategyLog, path: str, interval: float, stop: Optional[threading.Event] = None):
+    """Re-exports the workbook every `interval` seconds when new records were appended."""
+    stop = stop or threading.Event()
+    exported = -1
+    while not stop.wait(interval):
+        if len(log) != exported:
+            try:
+                if export_xlsx(log, path):
+                    exported = len(log)
+            except Exception as e:
+                logger.error(f"xlsx export failed: {e}", exc_info=True)
@@ -1,22 +1,34 @@
 import logging
-from typing import Dict, Any
+import sys
+import threading
+from dataclasses import asdict, is_dataclass
+from typing import Dict, Any, Optional
+from strategy_channel import StrategyConsumer, StrategyLog, run_xlsx_export
 from telegram_notifier import TelegramNotifier
 
+# sysexits.h: configuration error. supervisord.conf lists it in exitcodes so it is not restarted.
+EX_CONFIG = 78
+
 class StrategyNotifier:
     """
     Handles the formatting of signals into human-readable messages and 
     sends them via the Telegram notifier.
     """
-    def __init__(self, telegram_config: Dict[str, Any]):
+    def __init__(self, telegram_config: Dict[str, Any], channel: Optional[StrategyLog] = None):
         """
         Initializes the StrategyNotifier with Telegram configuration.
 
         Args:
-            telegram_config (Dict[str, Any]): A dictionary containing 'token' and 'chat_id'.
+            telegram_config (Dict[str, Any]): A dictionary containing 'token' and 'chat_id'
+                (and optionally 'base_url' for a non-default Bot API endpoint).
+            channel (Optional[StrategyLog]): When set, notify() appends the formatted strategy to this
+                log and the notifier process (main() below) delivers it, instead of sending inline.
         """
+        self.channel = channel
         self.telegram_notifier = TelegramNotifier(
             token=telegram_config.get('token'),
-            chat_id=telegram_config.get('chat_id')
+            chat_id=telegram_config.get('chat_id'),
+            base_url=telegram_config.get('base_url')
         )
         logging.info("StrategyNotifier initialized.")
 
@@ -28,18 +40,35 @@ class StrategyNotifier:
             signals (Dict[str, Any]): The dictionary of detected signals from SignalDetector.
             symbol (str): The trading symbol (e.g., 'ETH/USDT') for which signals were detected.
         """
-        if not self.telegram_notifier.is_configured():
-            logging.warning("Telegram notifier is not configured. Skipping notification.")
-            return
-
         message = self._format_message(signals, symbol)
         if message:
-            logging.info(f"Sending notification for {symbol}...")
-            self.telegram_notifier.send_message(message)
-            logging.info("Notification sent successfully.")
+            self.publish(message, symbol, self._signal_records(signals))
         else:
             logging.info(f"No significant signals detected for {symbol}. No notification will be sent.")
 
+    def publish(self, message: str, symbol: str, signals: Optional[Dict[str, Any]] = None):
+        """
+        Delivers an already formatted message: appended to the strategy channel when one is
+        configured, otherwise sent straight to Telegram.
+
+        Args:
+            message (str): The message text.
+            symbol (str): Symbol the message is about ('*' for market-wide digests).
+            signals (Optional[Dict[str, Any]]): JSON-friendly signal details stored with the record.
+        """
+        if self.channel is not None:
+            seq = self.channel.append({'symbol': symbol, 'message': message, 'signals': signals or {}})
+            logging.info(f"Strategy for {symbol} published to the channel as record {seq}.")
+            return
+
+        if not self.telegram_notifier.is_configured():
+            logging.warning("Telegram notifier is not configured. Skipping notification.")
+            return
+
+        logging.info(f"Sending notification for {symbol}...")
+        self.telegram_notifier.send_message(message)
+        logging.info("Notification sent successfully.")
+
     def _format_message(self, signals: Dict[str, Any], symbol: str) -> str:
         """
         Creates a formatted message from the signals dictionary.
@@ -57,15 +86,55 @@ class StrategyNotifier:
         message_parts = [f"🔔 Trading Signal Alert for {symbol} 🔔\n"]
         has_signal = False
         for timeframe, signal_details in sorted(signals.items()):
-            if signal_details:
-                has_signal = True
+            if not signal_details:
+                continue
+            has_signal = True
+            message_parts.append(f"📈 Timeframe: {timeframe}")
+            if isinstance(signal_details, dict):
                 recommendation = signal_details.get('recommendation', 'Hold')
                 confidence = signal_details.get('confidence', 'N/A')
-                message_parts.append(f"📈 Timeframe: {timeframe}")
                 message_parts.append(f"   - Action: {recommendation}")
                 message_parts.append(f"   - Confidence: {confidence}\n")
+            else:
+                # SignalDetector returns a list of Signal objects per timeframe.
+                for signal in signal_details:
+                    message_parts.append(f"   - [{signal.type}] {signal.name}")
+                message_parts.append("")
         
         if not has_signal:
             return ""
             
-        return "\n".join(message_parts)
\ No newline at end of file
+        return "\n".join(message_parts)
+
+    @staticmethod
+    def _signal_records(signals: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-friendly copy of the signals for the strategy channel."""
+        return {timeframe: [asdict(s) if is_dataclass(s) else s for s in details] if isinstance(details, list) else details
+                for timeframe, details in signals.items() if details}
+
+    def deliver(self, record: Dict[str, Any]):
+        """Sends one strategy channel record; raises so the consumer retries it if Telegram fails."""
+        if not self.telegram_notifier.send_message(record['message']):
+            raise RuntimeError(f"Telegram delivery failed for strategy record {record['seq']}")
+
+
+def main():
+    """Notifier process: delivers every strategy channel record to Telegram exactly once, in order."""
+    from config import config
+    if not config.STRATEGY_CHANNEL_PATH:
+        # A configuration error, not a crash: exit with EX_CONFIG, which supervisord does not restart.
+        logging.critical("STRATEGY_CHANNEL_PATH is not set; there is no strategy channel to consume.")
+        sys.exit(EX_CONFIG)
+    log = StrategyLog(config.STRATEGY_CHANNEL_PATH)
+    notifier = StrategyNotifier({'token': config.TELEGRAM_BOT_TOKEN, 'chat_id': config.TELEGRAM_CHAT_ID,
+                                 'base_url': config.TELEGRAM_API_URL})
+    if config.STRATEGY_XLSX_EXPORT:
+        threading.Thread(target=run_xlsx_export, name='xlsx-export', daemon=True,
+                         args=(log, config.STRATEGY_XLSX_EXPORT, config.STRATEGY_XLSX_EXPORT_SECONDS)).start()
+    consumer = StrategyConsumer(log, 'telegram')
+    logging.info(f"Consuming strategy channel {config.STRATEGY_CHANNEL_PATH} from record {consumer.offset}.")
+    consumer.run(notifier.deliver)
+
+
+if __name__ == "__main__":
+    main()
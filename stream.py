@@ -0,0 +1,616 @@
+import abc
+import asyncio
+import functools
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import pandas as pd
+
+from logging_config import logger
+from ohlcv import OHLCV_FIELDS, OHLCVArrays, as_columns, empty_ohlcv, merge_bars, timeframe_ms
+from bar_aggregator import ClosedBarCallback, TradeBarAggregator
+from orderbook import OrderBookRecorder
+
+BINANCE_FUTURES_STREAM_URL = 'wss://fstream.binance.com/stream'
+# Binance accepts at most 200 streams per combined-stream connection.
+MAX_STREAMS_PER_CONNECTION = 200
+
+SeriesKey = Tuple[str, str]  # (symbol, timeframe)
+BarCallback = Callable[[str, str, OHLCVArrays], Any]
+
+
+def market_id(symbol: str) -> str:
+    """'ETH/USDT' -> 'ethusdt' (swap symbols such as 'ETH/USDT:USDT' drop the settle suffix)."""
+    return symbol.split(':')[0].replace('/', '').lower()
+
+
+def stream_name(symbol: str, timeframe: str) -> str:
+    """'ETH/USDT', '1h' -> 'ethusdt@kline_1h'"""
+    return f"{market_id(symbol)}@kline_{timeframe}"
+
+
+class CandleBook:
+    """
+    In-memory bar state per (symbol, timeframe): the closed history (bounded to `history_limit` bars)
+    plus the currently open candle, updated tick by tick from the stream.
+    """
+
+    def __init__(self, history_limit: int = 500):
+        self.history_limit = history_limit
+        self.closed: Dict[SeriesKey, OHLCVArrays] = {}
+        self.open_bar: Dict[SeriesKey, Tuple[float, ...]] = {}
+
+    def last_closed(self, key: SeriesKey) -> Optional[int]:
+        history = self.closed.get(key)
+        return int(history.timestamp[-1]) if history is not None and len(history) else None
+
+    def add_closed(self, key: SeriesKey, rows: Any) -> OHLCVArrays:
+        """Merges closed bars (rows or OHLCVArrays) into the history; returns only the ones that were new."""
+        fresh = as_columns(rows)
+        last = self.last_closed(key)
+        if last is not None:
+            fresh = fresh[int((fresh.timestamp <= last).sum()):]
+        if len(fresh):
+            self.closed[key] = merge_bars(self.closed.get(key), fresh, self.history_limit)
+            if key in self.open_bar and self.open_bar[key][0] <= fresh.timestamp[-1]:
+                del self.open_bar[key]
+        return fresh
+
+    def set_open(self, key: SeriesKey, row: Tuple[float, ...]):
+        self.open_bar[key] = row
+
+    def snapshot(self, key: SeriesKey, include_open: bool = False) -> OHLCVArrays:
+        """Closed history, optionally with the open candle appended as the last bar."""
+        history = self.closed.get(key) or empty_ohlcv()
+        if include_open and key in self.open_bar:
+            return merge_bars(history, as_columns([self.open_bar[key]]), self.history_limit)
+        return history
+
+
+class StreamClient(abc.ABC):
+    """
+    Shared connection handling for Binance combined streams: chunks the stream names over as many
+    connections as needed, reconnects each with jittered exponential backoff and calls
+    `on_connected` (for gap backfill) after every (re)connect before consuming messages, and
+    `on_disconnected` whenever a connection drops.
+
+    Subclasses that run analysis callbacks take an optional shared `executor`; the bot passes the same
+    single-thread executor to every streamer so the shared SignalDetector never runs concurrently.
+    """
+
+    kind = 'stream'
+
+    def __init__(self, url: str, max_backoff: float = 60.0):
+        self.url = url
+        self.max_backoff = max_backoff
+        self.stats = {'messages': 0, 'reconnects': 0}
+        self._sockets = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        self._tasks = set()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Schedules a background task and keeps a reference until it finishes, so it is not garbage-collected."""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @abc.abstractmethod
+    def stream_names(self) -> List[str]:
+        """All stream names this client subscribes to."""
+
+    @abc.abstractmethod
+    def handle_message(self, payload: Dict[str, Any]):
+        """Applies one combined-stream message; runs on the event loop."""
+
+    async def on_connected(self, streams: List[str]):
+        """Called after every (re)connect; subclasses backfill what they missed."""
+
+    def on_disconnected(self, streams: List[str]):
+        """Called whenever the connection carrying `streams` drops (or fails to connect)."""
+
+    async def _run_connection(self, streams: List[str]):
+        backoff = 1.0
+        url = f"{self.url}?streams={'/'.join(streams)}"
+        while not self._stopping:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, heartbeat=30, receive_timeout=90) as ws:
+                        self._sockets.add(ws)
+                        logger.info(f"{self.kind.capitalize()} stream connected ({len(streams)} streams).")
+                        await self.on_connected(streams)
+                        backoff = 1.0
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self.handle_message(json.loads(msg.data))
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                logger.warning(f"{self.kind.capitalize()} stream error: {e}")
+            finally:
+                self._sockets = {s for s in self._sockets if not s.closed}
+                self.on_disconnected(streams)
+            if self._stopping:
+                break
+            self.stats['reconnects'] += 1
+            delay = backoff * (0.5 + random.random() / 2)
+            logger.info(f"{self.kind.capitalize()} stream disconnected; reconnecting in {delay:.1f}s with REST gap backfill.")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _run_connections(self):
+        names = self.stream_names()
+        chunks = [names[i:i + MAX_STREAMS_PER_CONNECTION] for i in range(0, len(names), MAX_STREAMS_PER_CONNECTION)]
+        logger.info(f"Starting {self.kind} streaming for {len(names)} streams over {len(chunks)} connection(s).")
+        self._loop = asyncio.get_running_loop()
+        await asyncio.gather(*(self._run_connection(chunk) for chunk in chunks))
+
+    def stop(self):
+        """Stops all connections; safe to call from any thread."""
+        self._stopping = True
+        if self._loop is not None:
+            for ws in list(self._sockets):
+                asyncio.run_coroutine_threadsafe(ws.close(), self._loop)
+
+
+class KlineStreamer(StreamClient):
+    """
+    Streaming ingestion: subscribes to exchange kline WebSocket streams, keeps the open candle per
+    series in memory and calls `on_close` as soon as a candle closes (optionally `on_update` at a
+    throttled rate while it is still open).
+
+    Each connection reconnects with exponential backoff; after every (re)connect the series it
+    carries are backfilled over REST from the last closed bar, so a disconnect never leaves a gap.
+    Callbacks run on a single worker thread so analysis never blocks the socket and never runs
+    concurrently for the shared detector.
+    """
+
+    kind = 'kline'
+
+    def __init__(self, exchange: Any, db_manager: Any, symbols: List[str], timeframes: List[str],
+                 on_close: BarCallback, on_update: Optional[BarCallback] = None,
+                 url: str = BINANCE_FUTURES_STREAM_URL, intrabar_interval: float = 0.0,
+                 history_limit: int = 500, max_backoff: float = 60.0, executor: Optional[ThreadPoolExecutor] = None):
+        """
+        Args:
+            exchange: ccxt exchange (or loadtest.FakeExchange) used for REST backfill.
+            db_manager: Storage backend; seeds history on start and receives every closed bar. May be None.
+            symbols (List[str]): Symbols to stream.
+            timeframes (List[str]): Kline intervals per symbol.
+            on_close (BarCallback): Called with (symbol, timeframe, closed history) when a candle closes.
+            on_update (Optional[BarCallback]): Called with history + open candle for intra-candle evaluation.
+            url (str): Combined-stream WebSocket endpoint.
+            intrabar_interval (float): Minimum seconds between on_update calls per series; 0 disables them.
+            history_limit (int): Closed bars kept per series.
+            max_backoff (float): Upper bound of the reconnect delay in seconds.
+            executor (Optional[ThreadPoolExecutor]): Shared single-thread analysis executor; one is created
+                (and shut down by run()) when omitted.
+        """
+        super().__init__(url, max_backoff)
+        self.exchange = exchange
+        self.db_manager = db_manager
+        self.on_close = on_close
+        self.on_update = on_update
+        self.intrabar_interval = intrabar_interval
+        self.book = CandleBook(history_limit)
+        self.series: Dict[str, SeriesKey] = {stream_name(s, tf): (s, tf) for s in symbols for tf in timeframes}
+        self.stats.update({'closed_bars': 0, 'backfilled_bars': 0, 'rest_requests': 0})
+        self._owns_worker = executor is None
+        self._worker = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream-analysis')
+        self._last_update: Dict[SeriesKey, float] = {}
+        self._update_pending: Dict[SeriesKey, bool] = {}
+        # Series with a gap backfill in flight -> closing rows received meanwhile, merged once it is done.
+        self._held: Dict[SeriesKey, List[Tuple[float, ...]]] = {}
+
+    def stream_names(self) -> List[str]:
+        return list(self.series)
+
+    # ---------- REST seeding / backfill ----------
+
+    # Blocking I/O runs on the default executor; the CandleBook is only ever mutated on the event loop
+    # (by handle_message and _backfill), so it needs no lock.
+
+    def _query_seed(self, key: SeriesKey) -> Optional[OHLCVArrays]:
+        symbol, timeframe = key
+        days = self.book.history_limit * timeframe_ms(timeframe) // 86_400_000 + 1
+        try:
+            arrays = self.db_manager.query_ohlcv_arrays(measurement=timeframe, symbol=symbol, time_range_start=f"-{days}d")
+        except Exception as e:
+            logger.warning(f"Could not seed {symbol} {timeframe} from storage: {e}")
+            return None
+        return arrays
+
+    async def _backfill(self, key: SeriesKey) -> OHLCVArrays:
+        """Fetches bars since the last closed one in the executor, merges them on the loop; returns the newly closed bars."""
+        loop = asyncio.get_running_loop()
+        symbol, timeframe = key
+        if self.db_manager is not None and key not in self.book.closed:
+            arrays = await loop.run_in_executor(None, self._query_seed, key)
+            if arrays is not None and len(arrays) and key not in self.book.closed:
+                # Only bars that have certainly closed; the last stored one may have been written while open.
+                self.book.add_closed(key, arrays[:-1])
+        last = self.book.last_closed(key)
+        self.stats['rest_requests'] += 1
+        rows = await loop.run_in_executor(
+            None, functools.partial(self.exchange.fetch_ohlcv, symbol, timeframe, since=last, limit=self.book.history_limit))
+        if not rows:
+            return empty_ohlcv()
+        bars = as_columns(rows)
+        # A response that reaches the present ends with the still-open candle.
+        n_closed = len(bars)
+        if len(bars) < self.book.history_limit or bars.timestamp[-1] + timeframe_ms(timeframe) > time.time() * 1000:
+            n_closed -= 1
+        if n_closed < len(bars):
+            self.book.set_open(key, bars.row(n_closed))
+        fresh = self.book.add_closed(key, bars[:n_closed])
+        if len(fresh):
+            self._worker.submit(self._persist, key, fresh)
+        return fresh
+
+    def _persist(self, key: SeriesKey, bars: OHLCVArrays):
+        if self.db_manager is None or len(bars) == 0:
+            return
+        symbol, timeframe = key
+        df = pd.DataFrame({f: getattr(bars, f) for f in OHLCV_FIELDS})
+        try:
+            self.db_manager.write_ohlcv_data(measurement=timeframe, data=df, symbol=symbol)
+        except Exception as e:
+            logger.error(f"Failed to persist streamed bars for {symbol} {timeframe}: {e}")
+
+    async def _backfill_all(self, streams: List[str], concurrency: int = 8):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def backfill(key: SeriesKey):
+            async with semaphore:
+                try:
+                    fresh = await self._backfill(key)
+                except Exception as e:
+                    logger.warning(f"REST backfill failed for {key[0]} {key[1]}: {e}")
+                    return
+            if len(fresh):
+                self.stats['backfilled_bars'] += len(fresh)
+                # Analyse once on the newest closed bar rather than once per missed bar.
+                self._dispatch(self.on_close, key, self.book.snapshot(key))
+
+        await asyncio.gather(*(backfill(self.series[name]) for name in streams))
+
+    # ---------- WebSocket ----------
+
+    def _dispatch(self, callback: Optional[BarCallback], key: SeriesKey, ohlcv: OHLCVArrays):
+        if callback is None:
+            return
+        def report(future):
+            if future.exception() is not None:
+                logger.error(f"Stream callback failed for {key[0]} {key[1]}: {future.exception()}")
+
+        self._worker.submit(callback, key[0], key[1], ohlcv).add_done_callback(report)
+
+    def _dispatch_update(self, key: SeriesKey):
+        """Throttled intra-candle evaluation; skipped while the previous one for the series is still queued."""
+        now = time.monotonic()
+        if self._update_pending.get(key) or now - self._last_update.get(key, 0.0) < self.intrabar_interval:
+            return
+        self._last_update[key] = now
+        self._update_pending[key] = True
+
+        def run(symbol: str, timeframe: str, ohlcv: OHLCVArrays):
+            try:
+                self.on_update(symbol, timeframe, ohlcv)
+            finally:
+                self._update_pending[key] = False
+
+        self._dispatch(run, key, self.book.snapshot(key, include_open=True))
+
+    def handle_message(self, payload: Dict[str, Any]):
+        """Applies one combined-stream kline message."""
+        data = payload.get('data', payload)
+        kline = data.get('k')
+        if kline is None:
+            return
+        key = self.series.get(payload.get('stream') or stream_name(data['s'], kline['i']))
+        if key is None:
+            return
+        self.stats['messages'] += 1
+        row = (int(kline['t']), float(kline['o']), float(kline['h']), float(kline['l']),
+               float(kline['c']), float(kline['v']))
+        if not kline.get('x'):
+            self.book.set_open(key, row)
+            if self.on_update is not None and self.intrabar_interval > 0:
+                self._dispatch_update(key)
+            return
+        if key in self._held:
+            self._held[key].append(row)
+            return
+        last = self.book.last_closed(key)
+        if last is not None and row[0] - last > timeframe_ms(key[1]):
+            # Missed closes (e.g. messages dropped under load): refill the hole over REST, holding
+            # this and any later closing rows of the series until the backfill has merged.
+            self._held[key] = [row]
+            self._spawn(self._backfill_gap(key))
+            return
+        self._add_closed(key, [row])
+
+    def _add_closed(self, key: SeriesKey, rows: List[Tuple[float, ...]]):
+        fresh = self.book.add_closed(key, rows)
+        if len(fresh):
+            self.stats['closed_bars'] += len(fresh)
+            self._worker.submit(self._persist, key, fresh)
+            self._dispatch(self.on_close, key, self.book.snapshot(key))
+
+    async def _backfill_gap(self, key: SeriesKey):
+        """One REST backfill per series at a time; the closing rows held meanwhile are closed bars and go in after it."""
+        try:
+            await self._backfill_all([stream_name(*key)])
+        finally:
+            self._add_closed(key, self._held.pop(key))
+
+    async def on_connected(self, streams: List[str]):
+        await self._backfill_all(streams)
+
+    async def run(self):
+        """Runs every connection until stop() is called."""
+        try:
+            await self._run_connections()
+        finally:
+            if self._owns_worker:
+                self._worker.shutdown(wait=True)
+
+
+class TradeStreamer(StreamClient):
+    """
+    Consumes aggTrade streams and builds bars for every timeframe from the trades themselves
+    (see TradeBarAggregator). Trades are buffered per symbol and applied in batches every
+    `batch_interval` seconds; closed bars go to `on_close` on the analysis executor.
+
+    After a reconnect the missed trades are fetched over REST (ccxt fetch_trades) when an exchange
+    is given, so the bars spanning the disconnect stay complete. While a symbol's connection is down
+    and until its catch-up finishes, neither its buffered trades nor the wall clock advance its
+    aggregator, so no bar closes before the missed trades are in. Trades are de-duplicated by their
+    aggregate trade id, since the REST catch-up overlaps the live trades buffered meanwhile.
+    """
+
+    kind = 'trade'
+
+    def __init__(self, symbols: List[str], timeframes: List[str], on_close: ClosedBarCallback,
+                 exchange: Any = None, url: str = BINANCE_FUTURES_STREAM_URL, batch_interval: float = 0.1,
+                 lateness_ms: int = 2_000, max_backoff: float = 60.0,
+                 clock: Callable[[], int] = lambda: int(time.time() * 1000),
+                 executor: Optional[ThreadPoolExecutor] = None, backfill_pages: int = 100):
+        """
+        Args:
+            symbols (List[str]): Symbols to stream.
+            timeframes (List[str]): Timeframes built from the trades.
+            on_close (ClosedBarCallback): Receives (symbol, timeframe, closed bars); e.g. bar_aggregator.storage_sink.
+            exchange: Optional ccxt exchange for REST trade backfill after reconnects.
+            url (str): Combined-stream WebSocket endpoint.
+            batch_interval (float): Seconds between batch applications (and quiet-bar closes).
+            lateness_ms (int): Late/out-of-order tolerance of the aggregators.
+            max_backoff (float): Upper bound of the reconnect delay in seconds.
+            clock: Epoch-ms clock used to close bars when no trades arrive.
+            executor (Optional[ThreadPoolExecutor]): Shared single-thread analysis executor; one is created
+                (and shut down by run()) when omitted.
+            backfill_pages (int): Upper bound of REST pages (1000 trades each) fetched per catch-up.
+        """
+        super().__init__(url, max_backoff)
+        self.exchange = exchange
+        self.batch_interval = batch_interval
+        self.clock = clock
+        self.backfill_pages = backfill_pages
+        self._owns_worker = executor is None
+        self._worker = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='trade-bars')
+
+        def dispatch(symbol: str, timeframe: str, bars: OHLCVArrays):
+            self._worker.submit(on_close, symbol, timeframe, bars)
+
+        self.aggregators: Dict[str, TradeBarAggregator] = {
+            f"{market_id(s)}@aggTrade": TradeBarAggregator(s, timeframes, lateness_ms, dispatch) for s in symbols}
+        # Per stream: timestamps, prices, sizes and aggregate trade ids (-1 when unknown).
+        self._buffers: Dict[str, Tuple[List[int], List[float], List[float], List[int]]] = {
+            name: ([], [], [], []) for name in self.aggregators}
+        self._last_id: Dict[str, int] = {name: -1 for name in self.aggregators}  # highest id applied
+        self._paused = set()  # streams whose connection is down or whose catch-up is still running
+        self.stats.update({'trades': 0, 'backfilled_trades': 0, 'duplicate_trades': 0, 'truncated_backfills': 0})
+
+    def stream_names(self) -> List[str]:
+        return list(self.aggregators)
+
+    def handle_message(self, payload: Dict[str, Any]):
+        name = payload.get('stream', '')
+        buffer = self._buffers.get(name)
+        data = payload.get('data', payload)
+        if buffer is None or 'T' not in data:
+            return
+        self.stats['messages'] += 1
+        trade_id = int(data.get('a', -1))
+        if 0 <= trade_id <= self._last_id[name]:
+            self.stats['duplicate_trades'] += 1
+            return
+        buffer[0].append(int(data['T']))
+        buffer[1].append(float(data['p']))
+        buffer[2].append(float(data['q']))
+        buffer[3].append(trade_id)
+
+    def flush(self):
+        """Applies all buffered trades and closes bars that ended while the market was quiet."""
+        now_ms = self.clock()
+        for name, aggregator in self.aggregators.items():
+            if name in self._paused:
+                continue
+            ts, px, qty, ids = self._buffers[name]
+            if ts:
+                self._buffers[name] = ([], [], [], [])
+                self.stats['trades'] += len(ts)
+                self._last_id[name] = max(self._last_id[name], max(ids))
+                aggregator.add_trades(ts, px, qty)
+            if aggregator.max_ts is not None:
+                aggregator.advance(max(now_ms, aggregator.max_ts))
+
+    def _fetch_missed(self, symbol: str, since: int, until: Optional[int]) -> List[Dict[str, Any]]:
+        """Trades from `since` until the first buffered live trade (`until`) or the present."""
+        trades = []
+        for _ in range(self.backfill_pages):
+            page = self.exchange.fetch_trades(symbol, since=since, limit=1000)
+            trades.extend(page)
+            if len(page) < 1000 or (until is not None and int(page[-1]['timestamp']) >= until):
+                return trades
+            since = int(page[-1]['timestamp'])
+        self.stats['truncated_backfills'] += 1
+        logger.warning(f"Trade backfill for {symbol} stopped after {self.backfill_pages} pages at "
+                       f"{since}; bars up to the live stream may be incomplete.")
+        return trades
+
+    def on_disconnected(self, streams: List[str]):
+        self._paused.update(streams)
+
+    async def on_connected(self, streams: List[str]):
+        loop = asyncio.get_running_loop()
+        for name in streams:
+            aggregator = self.aggregators[name]
+            if self.exchange is None or aggregator.max_ts is None:
+                self._paused.discard(name)
+                continue
+            ts = self._buffers[name][0]
+            try:
+                trades = await loop.run_in_executor(
+                    None, self._fetch_missed, aggregator.symbol, aggregator.max_ts, min(ts) if ts else None)
+            except Exception as e:
+                logger.warning(f"REST trade backfill failed for {aggregator.symbol}: {e}")
+                trades = []
+            # Buffers are only touched on the event loop thread; the next flush sorts them in.
+            ts, px, qty, ids = self._buffers[name]
+            seen = set(ids)
+            seen.discard(-1)
+            added = 0
+            for t in trades:
+                trade_id = int(t['id']) if t.get('id') is not None else -1
+                if trade_id >= 0 and (trade_id <= self._last_id[name] or trade_id in seen):
+                    self.stats['duplicate_trades'] += 1
+                    continue
+                seen.add(trade_id)
+                ts.append(int(t['timestamp']))
+                px.append(float(t['price']))
+                qty.append(float(t['amount']))
+                ids.append(trade_id)
+                added += 1
+            self.stats['backfilled_trades'] += added
+            self._paused.discard(name)
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            await asyncio.sleep(self.batch_interval)
+            self.flush()
+
+    async def run(self):
+        """Runs every connection and the batch flusher until stop() is called."""
+        try:
+            await asyncio.gather(self._run_connections(), self._flush_loop())
+        finally:
+            self._paused.clear()
+            self.flush()
+            if self._owns_worker:
+                self._worker.shutdown(wait=True)
+
+
+class DepthStreamer(StreamClient):
+    """
+    Consumes diff-depth streams (<symbol>@depth@100ms) into an OrderBookRecorder. After every
+    (re)connect, and whenever a symbol's update sequence breaks, the book is re-seeded from a REST
+    snapshot; updates received meanwhile are buffered by the recorder and replayed onto it. As long as
+    a symbol stays unsynced (the snapshot request failed, or its replay broke the sequence again) the
+    snapshot is retried with jittered exponential backoff. Every `sample_interval` seconds the recorder
+    samples its book features and flushes its files.
+    """
+
+    kind = 'depth'
+
+    def __init__(self, exchange: Any, recorder: OrderBookRecorder, url: str = BINANCE_FUTURES_STREAM_URL,
+                 speed: str = '100ms', snapshot_limit: int = 1000, sample_interval: float = 1.0,
+                 max_backoff: float = 60.0):
+        """
+        Args:
+            exchange: ccxt exchange (or orderbook.SyntheticDepthFeed) answering fetch_order_book.
+            recorder (OrderBookRecorder): Receives the snapshots and updates of its symbols.
+            url (str): Combined-stream WebSocket endpoint.
+            speed (str): Update speed of the depth stream ('100ms', '250ms' or '500ms').
+            snapshot_limit (int): Levels per side requested in REST snapshots.
+            sample_interval (float): Seconds between feature samples / file flushes.
+            max_backoff (float): Upper bound of the reconnect delay in seconds.
+        """
+        super().__init__(url, max_backoff)
+        self.exchange = exchange
+        self.recorder = recorder
+        self.snapshot_limit = snapshot_limit
+        self.sample_interval = sample_interval
+        self.symbols: Dict[str, str] = {f"{market_id(s)}@depth@{speed}": s for s in recorder.symbols}
+        self.stats.update({'snapshots': 0, 'snapshot_retries': 0})
+        self._resyncing = set()
+
+    def stream_names(self) -> List[str]:
+        return list(self.symbols)
+
+    def handle_message(self, payload: Dict[str, Any]):
+        symbol = self.symbols.get(payload.get('stream', ''))
+        data = payload.get('data', payload)
+        if symbol is None or data.get('e') != 'depthUpdate':
+            return
+        self.stats['messages'] += 1
+        synced = self.recorder.on_depth(symbol, data) and self.recorder.synced.get(symbol)
+        if not synced and symbol not in self._resyncing:
+            self._spawn(self._resync([symbol]))
+
+    async def _resync(self, symbols: List[str], concurrency: int = 8):
+        """Snapshots each symbol until its book is synced, backing off between failed attempts."""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def snapshot(symbol: str):
+            if symbol in self._resyncing:
+                return
+            self._resyncing.add(symbol)
+            backoff = 1.0
+            try:
+                while not self._stopping:
+                    try:
+                        async with semaphore:
+                            book = await loop.run_in_executor(
+                                None, self.exchange.fetch_order_book, symbol, self.snapshot_limit)
+                        self.stats['snapshots'] += 1
+                        if self.recorder.load_snapshot(symbol, book):
+                            return
+                        logger.warning(f"Order book snapshot of {symbol} did not line up with the buffered updates.")
+                    except Exception as e:
+                        logger.warning(f"Order book snapshot failed for {symbol}: {e}")
+                    self.stats['snapshot_retries'] += 1
+                    await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+                    backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                self._resyncing.discard(symbol)
+
+        await asyncio.gather(*(snapshot(s) for s in symbols))
+
+    async def on_connected(self, streams: List[str]):
+        symbols = [self.symbols[name] for name in streams]
+        for symbol in symbols:
+            self.recorder.synced[symbol] = False
+        # In the background: updates are buffered by the recorder meanwhile, and a symbol whose snapshot
+        # keeps failing must not hold up the messages of the others on this connection.
+        self._spawn(self._resync(symbols))
+
+    async def _sample_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            await asyncio.sleep(self.sample_interval)
+            self.recorder.sample()
+            await loop.run_in_executor(None, self.recorder.flush)
+
+    async def run(self):
+        """Runs every connection and the sampler until stop() is called."""
+        try:
+            await asyncio.gather(self._run_connections(), self._sample_loop())
+        finally:
+            self.recorder.flush()
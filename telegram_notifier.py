@@ -1,24 +1,25 @@
 import logging
 import asyncio
 from typing import Optional
-from telegram import Bot
-from telegram.error import TelegramError
 
 class TelegramNotifier:
     """
     A wrapper to send messages via the python-telegram-bot library.
     """
-    def __init__(self, token: Optional[str], chat_id: Optional[str]):
+    def __init__(self, token: Optional[str], chat_id: Optional[str], base_url: Optional[str] = None):
         """
         Initializes the TelegramNotifier.
 
         Args:
             token (Optional[str]): The Telegram Bot token.
             chat_id (Optional[str]): The Telegram chat ID to send messages to.
+            base_url (Optional[str]): Bot API base URL; defaults to api.telegram.org. Point it at a local
+                stub (see loadtest.py) to run without the live API.
         """
         self.token = token
         self.chat_id = chat_id
-        self.bot = Bot(token=self.token) if self.token else None
+        self.base_url = base_url
+        self._bot = None
         if self.is_configured():
             logging.info("TelegramNotifier initialized and configured.")
         else:
@@ -31,7 +32,16 @@ class TelegramNotifier:
         Returns:
             bool: True if both token and chat_id are set, False otherwise.
         """
-        return bool(self.bot and self.chat_id)
+        return bool(self.token and self.chat_id)
+
+    @property
+    def bot(self):
+        """The python-telegram-bot client, imported and created on the first message."""
+        if self._bot is None and self.token:
+            from telegram import Bot
+            bot_kwargs = {'base_url': self.base_url} if self.base_url else {}
+            self._bot = Bot(token=self.token, **bot_kwargs)
+        return self._bot
 
     def send_message(self, message: str) -> bool:
         """
@@ -59,6 +69,7 @@ class TelegramNotifier:
         """
         The actual async method to send a message.
         """
+        from telegram.error import TelegramError
         try:
             await self.bot.send_message(
                 chat_id=self.chat_id,
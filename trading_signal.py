@@ -1,5 +1,5 @@
 import pandas as pd
-from typing import List
+from typing import Dict, List
 from dataclasses import dataclass
 
 class Signal:
@@ -12,14 +12,37 @@ class SignalDetector:
     def __init__(self):
         self.signals = []
         
+    # ---------- 全历史序列模式：一次向量化计算整段信号，末根信号只读取最后一个值 ----------
+
+    def macd_series(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
+        """MACD 金叉/死叉序列（快慢线差值符号变化）"""
+        diff = df['macd'] - df['macdsignal']
+        prev = diff.shift(1)
+        return {'bullish': (diff > 0) & (prev <= 0), 'bearish': (diff < 0) & (prev >= 0)}
+
+    def rsi_series(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
+        """RSI 超买回落/超卖回升序列"""
+        change = df['close'].diff()
+        return {'bullish': (df['rsi'] < 30) & (change > 0), 'bearish': (df['rsi'] > 70) & (change < 0)}
+
+    def volume_series(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
+        """放量上涨序列（成交量 > 1.5 倍均量且收盘上涨）"""
+        surge = df['volume'] > 1.5 * df['volume_ma']
+        return {'bullish': surge & (df['close'].diff() > 0)}
+
+    def detect_all_series(self, df: pd.DataFrame) -> Dict[str, Dict[str, pd.Series]]:
+        """一次性计算所有信号序列"""
+        return {'MACD': self.macd_series(df), 'RSI': self.rsi_series(df), 'Volume': self.volume_series(df)}
+
     def detect_macd_signals(self, df: pd.DataFrame, timeframe: str) -> List[Signal]:
         """检测MACD信号"""
         signals = []
+        series = self.macd_series(df)
         
         # 检查MACD金叉
-        if df['macd'].iloc[-1] > df['macdsignal'].iloc[-1] and df['macd'].iloc[-2] <= df['macdsignal'].iloc[-2]:
+        if series['bullish'].iloc[-1]:
             signals.append(Signal('MACD Bullish', 2, timeframe))
-        elif df['macd'].iloc[-1] < df['macdsignal'].iloc[-1] and df['macd'].iloc[-2] >= df['macdsignal'].iloc[-2]:
+        elif series['bearish'].iloc[-1]:
             signals.append(Signal('MACD Bearish', 2, timeframe))
             
         return signals
@@ -27,11 +50,12 @@ class SignalDetector:
     def detect_rsi_signals(self, df: pd.DataFrame, timeframe: str) -> List[Signal]:
         """检测RSI信号"""
         signals = []
+        series = self.rsi_series(df)
         
         # 检查RSI背离
-        if df['rsi'].iloc[-1] > 70 and df['close'].iloc[-1] < df['close'].iloc[-2]:
+        if series['bearish'].iloc[-1]:
             signals.append(Signal('RSI Bearish Divergence', 3, timeframe))
-        elif df['rsi'].iloc[-1] < 30 and df['close'].iloc[-1] > df['close'].iloc[-2]:
+        elif series['bullish'].iloc[-1]:
             signals.append(Signal('RSI Bullish Divergence', 3, timeframe))
             
         return signals
@@ -41,7 +65,7 @@ class SignalDetector:
         signals = []
         
         # 检查成交量突破
-        if df['volume'].iloc[-1] > 1.5 * df['volume_ma'].iloc[-1] and df['close'].iloc[-1] > df['close'].iloc[-2]:
+        if self.volume_series(df)['bullish'].iloc[-1]:
             signals.append(Signal('Volume Breakout', 2, timeframe))
             
         return signals